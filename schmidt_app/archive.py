@@ -0,0 +1,188 @@
+# schmidt_app/archive.py
+"""
+Archivage des vieux ClickEvent (commande archive_events) et relecture.
+
+Les clics plus anciens que la rétention sont écrits, par paquets de clés
+primaires, dans des segments JSON Lines compressés, un jeu par mois :
+
+    <ANALYTICS_ARCHIVE_DIR>/events-2026-01.0001.jsonl.gz
+    <ANALYTICS_ARCHIVE_DIR>/manifest.json
+
+puis supprimés de la base par petits lots (verrou d'écriture bref). Seuls
+les clics déjà agrégés (id <= RollupState.last_event_id) sont archivés :
+les statistiques ne changent pas.
+
+Reprise : le manifeste est écrit avant toute suppression et garde le
+critère de la passe (`pending`) ; une passe interrompue est terminée au
+lancement suivant, rien n'est archivé deux fois.
+
+Relecture (lecture seule, pour un rapport ponctuel) :
+
+    from schmidt_app import archive
+    Counter(e["section"] for e in archive.iter_events(month_from="2026-01"))
+"""
+import gzip
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import ClickEvent
+from .rollups import state
+
+FIELDS = ("id", "session_id", "created_at", "section", "color_id", "action", "meta")
+MANIFEST = "manifest.json"
+READ_CHUNK = 5000
+DELETE_BATCH = 1000
+
+
+def archive_dir() -> Path:
+    return Path(getattr(settings, "ANALYTICS_ARCHIVE_DIR", settings.BASE_DIR / "archives" / "events"))
+
+
+def load_manifest(directory: Path) -> dict:
+    try:
+        return json.loads((directory / MANIFEST).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {"segments": [], "pending": None}
+
+
+def _save_manifest(directory: Path, manifest: dict):
+    tmp = directory / f"{MANIFEST}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, cls=DjangoJSONEncoder)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, directory / MANIFEST)
+
+
+class _Segment:
+    """Un fichier events-AAAA-MM.NNNN.jsonl.gz en cours d'écriture (nom .tmp jusqu'à close)."""
+
+    def __init__(self, directory: Path, month: str, seq: int):
+        self.name = f"events-{month}.{seq:04d}.jsonl.gz"
+        self.path = directory / self.name
+        self.tmp = directory / f"{self.name}.tmp"
+        self.meta = {"file": self.name, "month": month, "rows": 0, "first_id": None, "last_id": None}
+        self._raw = open(self.tmp, "wb")
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode="wb", mtime=0)
+        self._encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def write(self, row: dict):
+        row["created_at"] = row["created_at"].isoformat()  # microsecondes conservées
+        self._gz.write((self._encoder.encode(row) + "\n").encode("utf-8"))
+        self.meta["rows"] += 1
+        self.meta["first_id"] = self.meta["first_id"] or row["id"]
+        self.meta["last_id"] = row["id"]
+
+    def close(self) -> dict:
+        self._gz.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+        os.replace(self.tmp, self.path)
+        self.meta["bytes"] = self.path.stat().st_size
+        return self.meta
+
+    def abort(self):
+        self._gz.close()
+        self._raw.close()
+        self.tmp.unlink(missing_ok=True)
+
+
+def _selection(cutoff, upper_id):
+    return ClickEvent.objects.filter(pk__lte=upper_id, created_at__lt=cutoff)
+
+
+def archive(cutoff, directory: Path = None, read_chunk=READ_CHUNK, delete_batch=DELETE_BATCH,
+            dry=False, log=print) -> dict:
+    """
+    Archive puis supprime les clics créés avant `cutoff` (et déjà agrégés).
+    Retourne {"archived": n, "deleted": n, "segments": n}.
+    """
+    directory = Path(directory or archive_dir())
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(directory)
+    stats = {"archived": 0, "deleted": 0, "segments": 0}
+
+    if manifest.get("pending"):  # passe précédente interrompue avant la fin des suppressions
+        log("Reprise des suppressions d'une passe interrompue…")
+        stats["deleted"] += _finish(directory, manifest, delete_batch)
+
+    upper_id = state().last_event_id
+    qs = _selection(cutoff, upper_id)
+    if dry:
+        stats["archived"] = qs.count()
+        return stats
+
+    seqs = {}
+    for seg in manifest["segments"]:
+        seqs[seg["month"]] = max(seqs.get(seg["month"], 0), int(seg["file"].rsplit(".", 3)[1]))
+    open_segments = {}
+    last = 0
+    try:
+        while True:
+            rows = list(qs.filter(pk__gt=last).order_by("pk").values(*FIELDS)[:read_chunk])
+            if not rows:
+                break
+            for row in rows:
+                month = timezone.localtime(row["created_at"]).strftime("%Y-%m")
+                segment = open_segments.get(month)
+                if segment is None:
+                    seqs[month] = seqs.get(month, 0) + 1
+                    segment = open_segments[month] = _Segment(directory, month, seqs[month])
+                segment.write(row)
+            last = rows[-1]["id"]
+            stats["archived"] += len(rows)
+    except BaseException:
+        for segment in open_segments.values():
+            segment.abort()
+        raise
+
+    if not open_segments:
+        return stats
+    for segment in open_segments.values():
+        manifest["segments"].append(segment.close())
+        log(f"  {segment.name} : {segment.meta['rows']} clic(s)")
+    stats["segments"] = len(open_segments)
+    # les fichiers sont sur disque : on peut supprimer (critère gardé pour la reprise)
+    manifest["pending"] = {"cutoff": cutoff.isoformat(), "upper_id": upper_id}
+    _save_manifest(directory, manifest)
+    stats["deleted"] += _finish(directory, manifest, delete_batch)
+    return stats
+
+
+def _finish(directory: Path, manifest: dict, delete_batch: int) -> int:
+    """Supprime les clics archivés par lots de delete_batch ids (un DELETE court par lot)."""
+    pending = manifest["pending"]
+    qs = _selection(datetime.fromisoformat(pending["cutoff"]), pending["upper_id"])
+    deleted = 0
+    while True:
+        ids = list(qs.order_by("pk").values_list("pk", flat=True)[:delete_batch])
+        if not ids:
+            break
+        deleted += ClickEvent.objects.filter(pk__in=ids).delete()[0]
+    manifest["pending"] = None
+    _save_manifest(directory, manifest)
+    return deleted
+
+
+# ---------- Relecture ----------
+def iter_events(directory: Path = None, month_from: str = None, month_to: str = None):
+    """
+    Clics archivés (dicts, created_at en datetime), mois "AAAA-MM" inclus,
+    dans l'ordre du manifeste. Lecture seule, aucune base sollicitée.
+    """
+    directory = Path(directory or archive_dir())
+    for seg in load_manifest(directory)["segments"]:
+        if (month_from and seg["month"] < month_from) or (month_to and seg["month"] > month_to):
+            continue
+        with gzip.open(directory / seg["file"], "rt", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                row["created_at"] = datetime.fromisoformat(row["created_at"])
+                yield row
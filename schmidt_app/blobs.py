@@ -0,0 +1,53 @@
+# schmidt_app/blobs.py
+"""
+Stockage adressé par contenu (optionnel, settings.MEDIA_CONTENT_ADDRESSED).
+
+Chaque fichier est rangé sous son SHA-256 :
+    blobs/ab/cd/abcd…ef.jpg
+Deux images identiques (réimport, même photo sur deux couleurs) partagent
+le même fichier et les mêmes déclinaisons ; ColorImage.sha256 garde le hash.
+La suppression n'a lieu que lorsque plus aucune ColorImage ne référence
+le fichier (imaging.release_file, appelé par signals.py). store() doit être
+suivi de l'insertion de la ColorImage sous le verrou d'écriture de la base
+(transaction.atomic) : release_file prend le même, la vérification et la
+suppression ne peuvent donc pas s'intercaler entre les deux.
+"""
+import hashlib
+import posixpath
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+BLOBS_DIR = "blobs"
+
+
+def enabled() -> bool:
+    return getattr(settings, "MEDIA_CONTENT_ADDRESSED", False)
+
+
+def file_sha256(file) -> str:
+    h = hashlib.sha256()
+    for chunk in file.chunks():  # chunks() repart du début du fichier
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def blob_name(sha256: str, filename: str) -> str:
+    ext = posixpath.splitext(filename)[1].lower()
+    return posixpath.join(BLOBS_DIR, sha256[:2], sha256[2:4], f"{sha256}{ext}")
+
+
+def store(file, filename: str, sha256: str = None):
+    """
+    Écrit `file` sous son hash (calculé si non fourni) s'il n'existe pas déjà.
+    Retourne (nom dans le storage, sha256).
+    """
+    sha256 = sha256 or file_sha256(file)
+    name = blob_name(sha256, filename)
+    if not default_storage.exists(name):
+        file.seek(0)
+        saved = default_storage.save(name, file)
+        if saved != name:
+            # écrit en parallèle par une autre requête : même contenu, on garde le nom canonique
+            default_storage.delete(saved)
+    return name, sha256
@@ -0,0 +1,291 @@
+# schmidt_app/catalog.py
+"""
+Snapshot versionné du catalogue (sections > groupes > couleurs).
+
+- La révision est stockée en base (CatalogRevision, pk=1) et incrémentée
+  à chaque écriture (signaux + vues qui font des .update() en masse).
+- Chaque worker garde en mémoire les données calculées pour UNE révision ;
+  dès que la révision en base change, elles sont reconstruites au prochain
+  accès. Pas besoin de cache partagé : une seule requête (SELECT value)
+  suffit pour savoir si la copie locale est à jour.
+- Le bundle /api/catalog/ (JSON + variantes gzip/brotli) suit le même
+  cycle de vie : calculé au plus une fois par révision.
+- Les planches de vignettes (sprites.py) ne sont jamais générées pendant
+  une requête : seules les planches déjà écrites sont utilisées. Chaque
+  bump_revision() met en file (jobs.py) une régénération, qui incrémente
+  la révision une fois faite ; en attendant, les bulles gardent leurs <img>.
+"""
+import gzip
+import json
+import threading
+
+from django.core.files.storage import default_storage
+from django.db.models import F
+
+from . import sprites
+from .imaging import srcset
+from .models import CatalogRevision, ColorGroup, Color, ColorImage, Job, JobStatus, Section
+
+try:  # optionnel : pip install brotli
+    import brotli
+except ImportError:
+    brotli = None
+
+REVISION_PK = 1
+
+_lock = threading.RLock()  # un builder peut lire un autre cache (sprites)
+# nom -> (révision, valeur)
+_cache = {}
+
+
+# ---------- Révision ----------
+def current_revision() -> int:
+    value = (
+        CatalogRevision.objects
+        .filter(pk=REVISION_PK)
+        .values_list("value", flat=True)
+        .first()
+    )
+    return value or 0
+
+
+def bump_revision(rebuild_sprites: bool = True):
+    """
+    Invalide les snapshots de tous les workers et, sauf rebuild_sprites=False
+    (la tâche de génération elle-même), met les planches à régénérer.
+    """
+    updated = CatalogRevision.objects.filter(pk=REVISION_PK).update(value=F("value") + 1)
+    if not updated:
+        _rev, created = CatalogRevision.objects.get_or_create(pk=REVISION_PK, defaults={"value": 1})
+        if not created:
+            CatalogRevision.objects.filter(pk=REVISION_PK).update(value=F("value") + 1)
+    if rebuild_sprites:
+        _schedule_sprites()
+
+
+def cached(name: str, builder):
+    """
+    Retourne builder(revision) mémorisé pour la révision courante.
+    Le builder n'est appelé qu'une fois par révision et par worker.
+    """
+    revision = current_revision()
+    hit = _cache.get(name)
+    if hit is not None and hit[0] == revision:
+        return hit[1]
+    with _lock:
+        hit = _cache.get(name)
+        if hit is not None and hit[0] == revision:
+            return hit[1]
+        value = builder(revision)
+        _cache[name] = (revision, value)
+        return value
+
+
+# ---------- Snapshot ----------
+def build_snapshot(revision: int) -> dict:
+    """
+    Construit le catalogue complet en 3 requêtes, quelle que soit sa taille
+    (4 avec la lecture de révision de get_snapshot) : couleurs jointes à leur
+    image de présentation (champs dénormalisés presentation_image /
+    gallery_count), révision du cache des planches (get_sprite_sheets, qui
+    relit en plus les présentations une fois par révision), puis groupes.
+    """
+    colors_by_group = {}
+    for c in (
+        Color.objects
+        .filter(group__isnull=False)
+        .order_by("position", "name")
+        .values(
+            "id", "group_id", "name", "slug", "position", "gallery_count",
+            "presentation_image__image", "presentation_image__alt",
+            "presentation_image__width", "presentation_image__variants",
+        )
+    ):
+        image = c.pop("presentation_image__image")
+        alt = c.pop("presentation_image__alt")
+        width = c.pop("presentation_image__width")
+        variants = c.pop("presentation_image__variants")
+        c["presentation"] = None
+        if image:
+            url = default_storage.url(image)
+            c["presentation"] = {
+                "url": url,
+                "alt": alt or "",
+                "srcset": srcset(variants, "jpeg", url, width),
+                "srcset_webp": srcset(variants, "webp"),
+            }
+        colors_by_group.setdefault(c.pop("group_id"), []).append(c)
+
+    sheets = get_sprite_sheets()
+    groups_by_section = {code: [] for code, _label in Section.choices}
+    for g in (
+        ColorGroup.objects
+        .order_by("position", "name")
+        .values("id", "name", "slug", "position", "section")
+    ):
+        g["colors"] = colors_by_group.get(g["id"], [])
+        sheet = sheets.get(g["section"])
+        for c in g["colors"]:
+            c["sprite"] = sprites.css_position(sheet, c["id"]) if sheet else None
+        groups_by_section.setdefault(g["section"], []).append(g)
+
+    return {
+        "revision": revision,
+        "sections": [
+            {"code": code, "label": label, "groups": groups_by_section[code]}
+            for code, label in Section.choices
+        ],
+    }
+
+
+def get_snapshot() -> dict:
+    return cached("snapshot", build_snapshot)
+
+
+# ---------- Sprites ----------
+def _build_sprite_sheets(revision: int) -> dict:
+    try:
+        return sprites.ready_sheets()[0]
+    except OSError:
+        # storage indisponible : les bulles gardent leurs <img> individuelles
+        return {}
+
+
+def _schedule_sprites():
+    """Un seul job en attente suffit ; un job déjà en cours a pu lire l'ancien catalogue."""
+    from . import jobs  # jobs importe catalog
+    if not Job.objects.filter(kind="build_sprites", status=JobStatus.PENDING).exists():
+        jobs.enqueue("build_sprites")
+
+
+def get_sprite_sheets() -> dict:
+    """
+    {section: métadonnées de planche} des planches prêtes, relu une fois par
+    révision ; une section sans planche à jour garde ses <img>.
+    """
+    return cached("sprites", _build_sprite_sheets)
+
+
+# ---------- Bundle /api/catalog/ ----------
+def _image_payload(img: dict) -> dict:
+    url = default_storage.url(img["image"])
+    return {
+        "id": img["id"],
+        "url": url,
+        "is_presentation": img["is_presentation"],
+        "position": img["position"],
+        "alt": img["alt"] or "",
+        "width": img["width"],
+        "height": img["height"],
+        "srcset": srcset(img["variants"], "jpeg", url, img["width"]),
+        "srcset_webp": srcset(img["variants"], "webp"),
+    }
+
+
+def build_bundle_payload(revision: int) -> dict:
+    """
+    Catalogue complet (4 sections > groupes > couleurs > galerie) en 3 requêtes.
+    Mêmes clés que serializers.group_dict / color_dict (+ "gallery"),
+    mais URLs relatives : le payload est partagé par tous les hôtes.
+    """
+    images_by_color = {}
+    for img in (
+        ColorImage.objects
+        .order_by("color_id", "position", "id")
+        .values(
+            "id", "color_id", "image", "is_presentation", "position", "alt",
+            "width", "height", "variants",
+        )
+    ):
+        images_by_color.setdefault(img["color_id"], []).append(img)
+
+    colors_by_group = {}
+    for c in (
+        Color.objects
+        .filter(group__isnull=False)
+        .order_by("position", "name")
+        .values("id", "group_id", "group__slug", "name", "slug", "position", "presentation_image_id")
+    ):
+        images = images_by_color.get(c["id"], [])
+        pres = next((i for i in images if i["id"] == c["presentation_image_id"]), None)
+        gallery = [_image_payload(i) for i in images if not i["is_presentation"]]
+        colors_by_group.setdefault(c["group_id"], []).append({
+            "id": c["id"],
+            "name": c["name"],
+            "slug": c["slug"],
+            "position": c["position"],
+            "group_slug": c["group__slug"],
+            "presentation": _image_payload(pres) if pres else None,
+            "gallery_count": len(gallery),
+            "gallery": gallery,
+        })
+
+    sheets = get_sprite_sheets()
+    sections = {
+        code: {"label": label, "sprite": _sheet_payload(sheets.get(code)), "groups": []}
+        for code, label in Section.choices
+    }
+    for g in (
+        ColorGroup.objects
+        .order_by("position", "name")
+        .values("id", "name", "slug", "position", "section")
+    ):
+        if g["section"] not in sections:
+            continue
+        g["colors"] = colors_by_group.get(g["id"], [])
+        sheet = sheets.get(g["section"])
+        for c in g["colors"]:
+            # coordonnées en pixels de la tuile dans la planche de la section
+            xy = sheet["positions"].get(str(c["id"])) if sheet else None
+            c["sprite"] = {"x": xy[0], "y": xy[1]} if xy else None
+        sections[g["section"]]["groups"].append(g)
+
+    return {"revision": revision, "sections": sections}
+
+
+def _sheet_payload(sheet):
+    if not sheet:
+        return None
+    return {k: sheet[k] for k in ("url", "width", "height", "tile", "columns", "rows")}
+
+
+class CatalogBundle:
+    """
+    Octets JSON d'une révision + variantes compressées calculées à la demande
+    (une seule fois par encodage et par worker).
+    """
+
+    def __init__(self, revision: int, payload: dict):
+        self.revision = revision
+        self.etag = f'"catalog-{revision}"'
+        self._variants = {
+            "identity": json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        }
+        self._lock = threading.Lock()  # une seule compression par encodage, même sous requêtes concurrentes
+
+    def body(self, encoding: str = "identity") -> bytes:
+        data = self._variants.get(encoding)
+        if data is None:
+            with self._lock:
+                data = self._variants.get(encoding)
+                if data is None:
+                    data = _COMPRESSORS[encoding](self._variants["identity"])
+                    self._variants[encoding] = data
+        return data
+
+
+def _gzip(data: bytes) -> bytes:
+    # mtime=0 : octets identiques d'un worker à l'autre pour une même révision
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+_COMPRESSORS = {"gzip": _gzip}
+if brotli is not None:
+    _COMPRESSORS["br"] = lambda data: brotli.compress(data, quality=11)
+
+# ordre de préférence si le client accepte plusieurs encodages
+SUPPORTED_ENCODINGS = [e for e in ("br", "gzip") if e in _COMPRESSORS]
+
+
+def get_bundle() -> CatalogBundle:
+    return cached("bundle", lambda revision: CatalogBundle(revision, build_bundle_payload(revision)))
@@ -0,0 +1,153 @@
+# schmidt_app/counters.py
+"""
+Compteurs de clics en écriture différée (Color.clicks, UsageSession.clicks_count).
+
+Chaque clic ajoute +1 dans un tampon en mémoire du processus ; un thread
+les applique toutes les COUNTERS_FLUSH_INTERVAL secondes, une transaction
+par modèle (UPDATE … F(champ) + CASE pk WHEN … THEN n END, par CASE_BATCH
+ids), chacun dans sa base (Color : "default", UsageSession : "analytics",
+cf. routers.py). Plus de verrou d'écriture SQLite par clic.
+
+- arrêt propre (atexit) : le thread est attendu, puis le reste est écrit ;
+- échec d'écriture (base verrouillée…) : les incréments restent en tampon ;
+- pending() : ce qui n'est pas encore écrit (affiché par perf_stats) ;
+- COUNTERS_FLUSH_INTERVAL = 0 : écriture immédiate (tests, dev).
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connections, router, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .ordering import CASE_BATCH
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 2.0  # secondes, si COUNTERS_FLUSH_INTERVAL n'est pas défini
+SHUTDOWN_WAIT = 10.0  # secondes accordées au flush en cours du thread à l'arrêt
+
+
+def _targets():
+    from .models import Color, UsageSession
+    return {"color": (Color, "clicks"), "session": (UsageSession, "clicks_count")}
+
+
+def increments(counts, field):
+    """F(field) + CASE pk WHEN … THEN n END : un seul UPDATE pour le lot."""
+    return F(field) + Case(
+        *[When(pk=pk, then=Value(n)) for pk, n in counts.items()],
+        default=Value(0), output_field=IntegerField(),
+    )
+
+
+def apply(kind: str, per_pk):
+    """Écrit Counter(pk -> n) pour un modèle : un UPDATE par CASE_BATCH ids, tout ou rien."""
+    model, field = _targets()[kind]
+    pks = list(per_pk)
+    # tout ou rien : en cas d'échec, flush() remet le lot entier en tampon
+    with transaction.atomic(using=router.db_for_write(model)):
+        for start in range(0, len(pks), CASE_BATCH):
+            batch = {pk: per_pk[pk] for pk in pks[start:start + CASE_BATCH]}
+            model.objects.filter(pk__in=list(batch)).update(**{field: increments(batch, field)})
+
+
+class CounterBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {"color": Counter(), "session": Counter()}
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+
+    @property
+    def interval(self) -> float:
+        return getattr(settings, "COUNTERS_FLUSH_INTERVAL", FLUSH_INTERVAL)
+
+    def add(self, color_counts=None, session_counts=None):
+        if not self.interval:
+            for kind, per_pk in (("color", color_counts), ("session", session_counts)):
+                if per_pk:
+                    apply(kind, per_pk)
+            return
+        with self._lock:
+            self._pending["color"].update(color_counts or {})
+            self._pending["session"].update(session_counts or {})
+        self._ensure_flusher()
+
+    def pending(self) -> dict:
+        """Incréments en attente dans ce processus."""
+        with self._lock:
+            return {
+                "colors": len(self._pending["color"]),
+                "sessions": len(self._pending["session"]),
+                "clicks": sum(self._pending["session"].values()),
+            }
+
+    def flush(self) -> int:
+        """Écrit le tampon ; retourne le nombre de lignes écrites."""
+        with self._lock:
+            batch = self._pending
+            self._pending = {"color": Counter(), "session": Counter()}
+        rows = 0
+        for kind, per_pk in batch.items():
+            if not per_pk:
+                continue
+            try:
+                apply(kind, per_pk)
+            except DatabaseError:
+                # une base par modèle : seul ce qui a échoué est remis en tampon
+                logger.exception("compteurs %s non écrits (%s lignes), nouvel essai au prochain flush",
+                                 kind, len(per_pk))
+                with self._lock:
+                    self._pending[kind].update(per_pk)
+                continue
+            rows += len(per_pk)
+        return rows
+
+    def _ensure_flusher(self):
+        # après un fork (workers gunicorn), le thread du parent n'existe plus
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="counters-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+            connections.close_all()  # connexions de ce thread uniquement
+
+    def shutdown(self):
+        """atexit : arrête le thread, attend son flush en cours, puis écrit le reste."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid() and thread is not threading.current_thread():
+            thread.join(SHUTDOWN_WAIT)
+        self.flush()
+        left = self.pending()
+        if left["colors"] or left["sessions"]:
+            logger.error("compteurs non écrits à l'arrêt : %s", left)
+
+
+buffer = CounterBuffer()
+atexit.register(buffer.shutdown)
+
+
+def add(color_counts=None, session_counts=None):
+    buffer.add(color_counts, session_counts)
+
+
+def flush() -> int:
+    return buffer.flush()
+
+
+def pending() -> dict:
+    return buffer.pending()
@@ -0,0 +1,208 @@
+# schmidt_app/imaging.py
+"""
+Déclinaisons redimensionnées des images (srcset).
+
+Pour chaque ColorImage on produit, à partir de l'original, des versions
+de largeur DERIVATIVE_WIDTHS en JPEG et WebP, stockées à côté de la galerie :
+    colors/<slug>/derived/<nom>-<ext>-<largeur>.<jpg|webp>
+(l'extension de l'original fait partie du nom : photo.jpg et photo.png
+d'une même couleur ont chacune leurs déclinaisons)
+Les noms sont mémorisés dans ColorImage.variants :
+    {"160": {"jpeg": "...", "webp": "..."}, "480": {...}, ...}
+On n'agrandit jamais : une largeur supérieure à l'original est ignorée.
+
+Les noms dérivent de celui de l'original : des images qui partagent le même
+fichier (stockage par hash, blobs.py) partagent aussi leurs déclinaisons.
+"""
+import io
+import json
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from .models import ColorImage
+
+DERIVATIVE_WIDTHS = (160, 480, 1280)
+FORMATS = {
+    # format -> (extension, options Pillow)
+    "jpeg": ("jpg", {"quality": 82, "optimize": True, "progressive": True}),
+    "webp": ("webp", {"quality": 80, "method": 4}),
+}
+
+
+def derivative_name(name: str, width: int, fmt: str) -> str:
+    folder, filename = posixpath.split(name)
+    stem, ext = posixpath.splitext(filename)
+    if ext:
+        stem = f"{stem}-{ext[1:].lower()}"
+    # colors/<slug>/gallery/x.jpg -> colors/<slug>/derived/x-jpg-480.webp
+    parent = posixpath.dirname(folder) if posixpath.basename(folder) == "gallery" else folder
+    return posixpath.join(parent, "derived", f"{stem}-{width}.{FORMATS[fmt][0]}")
+
+
+def _open_rgb(f) -> Image.Image:
+    im = Image.open(f)
+    im = ImageOps.exif_transpose(im)  # photos de téléphone : orientation EXIF
+    im.load()
+    if im.mode not in ("RGB", "L"):
+        background = Image.new("RGB", im.size, (255, 255, 255))
+        im = im.convert("RGBA")
+        background.paste(im, mask=im.split()[-1])
+        im = background
+    return im.convert("RGB")
+
+
+def render_derivatives(name: str, variants: dict = None, force: bool = False,
+                       reuse_existing: bool = False, source=None):
+    """
+    Produit les déclinaisons manquantes de l'original `name` (sans accès base).
+    source : fichier déjà ouvert / en mémoire (évite de relire le storage).
+    reuse_existing : une déclinaison déjà présente dans le storage est gardée
+    telle quelle (fichiers adressés par contenu).
+    Retourne (variants, largeur, hauteur) de l'original.
+    """
+    storage = default_storage
+    variants = {} if force else dict(variants or {})
+    missing = [
+        (w, fmt) for w in DERIVATIVE_WIDTHS for fmt in FORMATS
+        if force or not (variants.get(str(w)) or {}).get(fmt)
+    ]
+    if source is not None:
+        original = _open_rgb(source)
+    else:
+        with storage.open(name, "rb") as f:
+            original = _open_rgb(f)
+
+    for width, fmt in missing:
+        if width >= original.width:
+            continue
+        target = derivative_name(name, width, fmt)
+        if reuse_existing and not force and storage.exists(target):
+            # fichier adressé par contenu : déclinaison identique déjà produite
+            variants.setdefault(str(width), {})[fmt] = target
+            continue
+        ratio = width / original.width
+        resized = original.resize((width, max(1, round(original.height * ratio))), Image.LANCZOS)
+        buf = io.BytesIO()
+        resized.save(buf, format=fmt.upper(), **FORMATS[fmt][1])
+        if storage.exists(target):
+            storage.delete(target)
+        saved = storage.save(target, ContentFile(buf.getvalue()))
+        variants.setdefault(str(width), {})[fmt] = saved
+    return variants, original.width, original.height
+
+
+def build_derivatives(img: ColorImage, force: bool = False) -> dict:
+    """
+    Génère (ou complète) les déclinaisons d'une image et met à jour
+    img.variants en base via .update() (pas de signal post_save).
+    """
+    if not (img.image and img.image.name):
+        return {}
+    if not force and not img.variants and img.pk:
+        # même fichier déjà traité pour une autre image : rien à recalculer
+        sibling = (
+            ColorImage.objects
+            .filter(image=img.image.name, width__isnull=False)
+            .exclude(pk=img.pk).exclude(variants={})
+            .values("variants", "width", "height")
+            .first()
+        )
+        if sibling:
+            img.variants, img.width, img.height = sibling["variants"], sibling["width"], sibling["height"]
+            ColorImage.objects.filter(pk=img.pk).update(**sibling)
+            return img.variants
+
+    if not force and img.width and all(
+        (img.variants or {}).get(str(w), {}).get(fmt) for w in DERIVATIVE_WIDTHS for fmt in FORMATS
+    ):
+        return img.variants
+
+    img.variants, img.width, img.height = render_derivatives(
+        img.image.name, img.variants, force=force, reuse_existing=bool(img.sha256),
+    )
+    if img.pk:
+        ColorImage.objects.filter(pk=img.pk).update(
+            variants=img.variants, width=img.width, height=img.height,
+        )
+    return img.variants
+
+
+def variant_names(variants: dict) -> set:
+    return {name for formats in (variants or {}).values() for name in formats.values() if name}
+
+
+def referenced_variants(names) -> set:
+    """Parmi `names`, les déclinaisons encore citées dans le variants d'une ColorImage."""
+    names = set(names)
+    if not names:
+        return set()
+    query = Q()
+    for name in names:
+        # texte JSON en base : non-ASCII échappé (\u00e9) selon le backend
+        for form in {name, json.dumps(name)[1:-1]}:
+            query |= Q(variants__icontains=form)
+    used = set()
+    for variants in ColorImage.objects.filter(query).values_list("variants", flat=True):
+        used |= variant_names(variants) & names
+    return used
+
+
+def delete_derivatives(img: ColorImage):
+    """Supprime les déclinaisons de img (déjà retirée de la base) qu'aucune ColorImage ne cite plus."""
+    storage = default_storage
+    names = variant_names(img.variants)
+    for name in names - referenced_variants(names):
+        if storage.exists(name):
+            storage.delete(name)
+
+
+def release_file(name: str, variants: dict) -> bool:
+    """
+    Supprime un original et ses déclinaisons s'ils ne sont plus référencés
+    par aucune ColorImage (fichiers partagés en stockage par hash). Chaque
+    déclinaison est vérifiée à part : elle peut être citée par une image
+    dont l'original porte un autre nom.
+
+    Vérification et suppression se font sous le verrou d'écriture de la base
+    (transaction IMMEDIATE, settings.SQLITE_OPTIONS) : un blobs.store() suivi
+    de l'insertion de sa ColorImage (même verrou, cf. ColorImage.save et
+    Importer._write) passe entièrement avant ou après, jamais entre les deux.
+    """
+    if not name:
+        return False
+    with transaction.atomic():
+        if ColorImage.objects.filter(image=name).exists():
+            return False
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        delete_derivatives(ColorImage(image=name, variants=variants))
+    return True
+
+
+def srcset(variants: dict, fmt: str = "jpeg", original_url: str = "", original_width: int = None) -> str:
+    """
+    « /media/..-160.jpg 160w, /media/..-480.jpg 480w, /media/x.jpg 2400w ».
+    L'original (largeur connue) complète le srcset JPEG au-delà des déclinaisons.
+    """
+    parts = []
+    for width in sorted((variants or {}), key=int):
+        name = variants[width].get(fmt)
+        if name:
+            parts.append(f"{default_storage.url(name)} {width}w")
+    if parts and fmt == "jpeg" and original_url and original_width:
+        parts.append(f"{original_url} {original_width}w")
+    return ", ".join(parts)
+
+
+def image_srcsets(img: ColorImage, original_url: str = None) -> dict:
+    """Champs srcset exposés par l'API et les templates."""
+    url = original_url if original_url is not None else img.image.url
+    return {
+        "srcset": srcset(img.variants, "jpeg", url, img.width),
+        "srcset_webp": srcset(img.variants, "webp"),
+    }
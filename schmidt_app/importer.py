@@ -0,0 +1,808 @@
+# schmidt_app/importer.py
+"""
+Moteur de `manage.py import_couleurs`.
+
+    scan      : parcours de couleurs/<section>/…/<leaf>/ -> liste de Leaf, sur
+                disque (DirSource) ou dans une archive zip / tar (ArchiveSource)
+    catalogue : groupes et couleurs résolus en 2 lectures, créés par bulk_create
+    fichiers  : lecture, SHA-256, copie dans le storage et déclinaisons srcset,
+                dans un pool de processus (--jobs N) ; aucun accès base
+    base      : par paquets de CHUNK_LEAVES leaves, une transaction avec
+                bulk_create / bulk_update (ColorImage, ImportedFile, Color)
+
+Chaque paquet est validé séparément (le verrou d'écriture SQLite n'est tenu
+que le temps d'un paquet) puis noté dans un fichier de reprise (Checkpoint) :
+après un échec, `--resume` repart du premier leaf non validé. Les fichiers
+copiés par un paquet annulé sont supprimés s'ils ne sont pas référencés.
+
+Les écritures groupées ne déclenchent pas les signaux : file_url, stats
+dénormalisées des couleurs, index de recherche et révision du catalogue
+sont donc tenus à jour ici explicitement.
+
+L'ordre fixé au dashboard est conservé : seules les couleurs et les images
+nouvelles reçoivent une position (ordre du disque dans une galerie vide, à
+la suite sinon) ; un réimport sans changement n'écrit rien.
+
+Une archive n'est jamais extraite : les membres sont lus un à un en mémoire
+puis écrits dans le storage. Un zip est lu directement par les processus du
+pool ; un tar (flux compressé, sans accès direct) est lu par le processus
+principal dans l'ordre des membres.
+"""
+import hashlib
+import io
+import json
+import os
+import posixpath
+import tarfile
+import time
+import zipfile
+from collections import Counter, defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import List
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Max
+from django.utils.text import slugify
+
+from . import blobs, search
+from .catalog import bump_revision
+from .imaging import release_file, render_derivatives
+from .jobs import init_worker
+from .models import (
+    Section, ColorGroup, Color, ColorImage, ImageStatus, ImportedFile, SlugAllocator,
+)
+from .ordering import POSITION_GAP
+
+SECTIONS_MAP = {
+    "facades": Section.FACADES,
+    "ambiances": Section.AMBIANCES,
+    "pieces": Section.ESPACES,               # "pieces" => Section.ESPACES
+    "plans_de_travail": Section.PLANS,       # "plans_de_travail" => Section.PLANS
+}
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+
+CHUNK_LEAVES = 50  # leaves par transaction
+
+
+def pretty_name(s: str) -> str:
+    s = s.replace("_", " ").replace("-", " ").strip()
+    # Garde les majuscules si l’entrée est déjà propre, sinon Title Case.
+    return s if any(c.isupper() for c in s) else s.title()
+
+
+def list_images(p: Path) -> List[Path]:
+    files = [f for f in sorted(p.iterdir()) if f.is_file() and f.suffix.lower() in IMAGE_EXTS]
+    return files
+
+
+def find_leaf_dirs_with_images(section_root: Path, walk=os.walk) -> List[Path]:
+    """
+    Retourne les dossiers "leaf" (contenant des images) sous section_root.
+    Si un dossier contient des images, on l'utilise tel quel, même s'il a des sous-dossiers.
+    `walk` : os.walk ou ArchiveSource.walk (même interface).
+    """
+    leaves: List[Path] = []
+    for root, dirs, files in walk(section_root):
+        rp = Path(root)
+        if any(Path(root, f).suffix.lower() in IMAGE_EXTS for f in files):
+            leaves.append(rp)
+            # on ne descend pas plus bas: ce dossier est déjà un leaf logique pour une couleur
+            dirs[:] = []
+    return sorted(leaves)
+
+
+@dataclass
+class Leaf:
+    section_key: str
+    section: str
+    group_name: str
+    color_name: str
+    position: int
+    rel: str                # chemin relatif à la base, séparateur /
+    files: List[Path]
+    group: ColorGroup = None
+    color: Color = None
+    created: bool = False
+
+
+def scan(base: Path, section_dirs, source=None) -> List[Leaf]:
+    source = source or DirSource(base)
+    leaves = []
+    for section_dir in sorted(section_dirs):
+        leaf_dirs = find_leaf_dirs_with_images(section_dir, source.walk)
+        leaves += build_leaves(base, section_dir, leaf_dirs, source.list_images)
+    return leaves
+
+
+def build_leaves(base: Path, section_dir: Path, leaf_dirs, list_files) -> List[Leaf]:
+    """
+    Leaf de chaque dossier de leaf_dirs (ordre = position des couleurs).
+    list_files(dossier) -> images, ou None pour ne pas lister (position seule).
+    """
+    leaves = []
+    # Positionnement "basique": l'ordre des leaves pour Color, et index de l'image pour ColorImage
+    for color_pos, leaf in enumerate(leaf_dirs, start=1):
+        images = list_files(leaf)
+        if images is not None and not images:
+            continue
+        # leaf = <base>/<section>/<...optional...>/<leaf-name> ; directement sous
+        # <section>/ (pas de parent de groupe) -> groupe "Divers"
+        is_parent_section = leaf.parent == section_dir
+        leaves.append(Leaf(
+            section_key=section_dir.name,
+            section=SECTIONS_MAP[section_dir.name],
+            group_name="Divers" if is_parent_section else pretty_name(leaf.parent.name),
+            color_name=pretty_name(leaf.name),
+            position=color_pos,
+            rel=leaf.relative_to(base).as_posix(),
+            files=images or [],
+        ))
+    return leaves
+
+
+# ---------- Sources ----------
+class DirSource:
+    """Arborescence couleurs/ sur disque."""
+
+    def __init__(self, base: Path):
+        self.base = base
+        self.walk = os.walk
+        self.list_images = list_images
+
+    def section_dirs(self) -> List[Path]:
+        return [d for d in self.base.iterdir() if d.is_dir()]
+
+    def stat(self, path: Path):
+        st = path.stat()
+        return st.st_size, st.st_mtime_ns
+
+    def read_order(self, path: Path) -> int:
+        return 0  # accès direct : l'ordre des leaves est conservé
+
+    def task_fields(self, path: Path) -> dict:
+        return {"path": str(path)}
+
+    def close(self):
+        pass
+
+
+class ArchiveSource:
+    """
+    Archive .zip / .tar(.gz|.bz2|.xz) vue comme une arborescence couleurs/.
+    Les chemins sont virtuels (<archive>/<section>/…) ; si toutes les sections
+    sont sous un dossier racine unique (couleurs/…), il est ignoré.
+    """
+
+    def __init__(self, archive: Path):
+        self.archive = Path(archive)
+        self.base = self.archive
+        self._tar = None
+        self.members = {}   # chemin relatif -> (nom du membre, taille, mtime_ns, rang)
+        if zipfile.is_zipfile(self.archive):
+            with zipfile.ZipFile(self.archive) as zf:
+                for rank, info in enumerate(zf.infolist()):
+                    if not info.is_dir():
+                        mtime = time.mktime(info.date_time + (0, 0, -1))
+                        self._add(info.filename, info.file_size, int(mtime * 1e9), rank)
+        else:
+            # lecture séquentielle du flux (r:* = gz / bz2 / xz / non compressé)
+            self._tar = tarfile.open(self.archive, "r:*")
+            for rank, member in enumerate(self._tar.getmembers()):
+                if member.isfile():
+                    self._add(member.name, member.size, int(member.mtime * 1e9), rank)
+            self._by_name = {m.name: m for m in self._tar.getmembers()}
+
+        tops = {rel.split("/", 1)[0] for rel in self.members}
+        if len(tops) == 1 and not tops & SECTIONS_MAP.keys():
+            strip = len(tops.pop()) + 1
+            self.members = {rel[strip:]: m for rel, m in self.members.items() if len(rel) > strip}
+
+        self._tree = defaultdict(lambda: (set(), []))  # dossier -> (sous-dossiers, fichiers)
+        for rel in sorted(self.members):
+            parts = rel.split("/")
+            for depth in range(len(parts) - 1):
+                self._tree["/".join(parts[:depth])][0].add(parts[depth])
+            self._tree["/".join(parts[:-1])][1].append(parts[-1])
+
+    def _add(self, name, size, mtime_ns, rank):
+        parts = PurePosixPath(name).parts
+        if not parts or parts[0] == "/" or ".." in parts or parts[0] == "__MACOSX":
+            return  # chemins hors arborescence et métadonnées macOS ignorés
+        if parts[0] == ".":
+            parts = parts[1:]
+        self.members["/".join(parts)] = (name, size, mtime_ns, rank)
+
+    def _rel(self, path) -> str:
+        rel = Path(path).relative_to(self.base).as_posix()
+        return "" if rel == "." else rel
+
+    def section_dirs(self) -> List[Path]:
+        return [self.base / name for name in sorted(self._tree[""][0])]
+
+    def walk(self, top):
+        """Équivalent d'os.walk (descendant, `dirs` modifiable pour élaguer)."""
+        stack = [Path(top)]
+        while stack:
+            root = stack.pop()
+            subdirs, files = self._tree.get(self._rel(root), ((), ()))
+            dirs = sorted(subdirs)
+            yield str(root), dirs, list(files)
+            stack.extend(root / name for name in reversed(dirs))
+
+    def list_images(self, p: Path) -> List[Path]:
+        files = self._tree.get(self._rel(p), ((), ()))[1]
+        return [p / f for f in sorted(files) if posixpath.splitext(f)[1].lower() in IMAGE_EXTS]
+
+    def stat(self, path: Path):
+        _, size, mtime_ns, _ = self.members[self._rel(path)]
+        return size, mtime_ns
+
+    def read_order(self, path: Path) -> int:
+        # zip : accès direct ; tar : rang du membre dans le flux
+        return 0 if self._tar is None else self.members[self._rel(path)][3]
+
+    def task_fields(self, path: Path) -> dict:
+        name = self.members[self._rel(path)][0]
+        if self._tar is None:
+            return {"path": name, "archive": str(self.archive)}  # lu par le worker
+        with self._tar.extractfile(self._by_name[name]) as f:
+            return {"path": name, "data": f.read()}
+
+    def close(self):
+        if self._tar is not None:
+            self._tar.close()
+        zf = _zip_files.pop(str(self.archive), None)  # ouvert par process_file (--jobs 1)
+        if zf is not None:
+            zf.close()
+
+
+_zip_files = {}  # archives ouvertes, par processus
+
+
+def _read_member(archive: str, name: str) -> bytes:
+    zf = _zip_files.get(archive)
+    if zf is None:
+        zf = _zip_files[archive] = zipfile.ZipFile(archive)
+    return zf.read(name)
+
+
+# ---------- Traitement d'un fichier (processus du pool) ----------
+@dataclass
+class FileTask:
+    path: str                      # fichier, ou nom du membre d'archive
+    rel: str
+    dest_dir: str                  # colors/<slug>/gallery (stockage classique)
+    content_addressed: bool
+    known: tuple = ()              # hash déjà en base : ni copie ni déclinaisons
+    archive: str = ""              # zip à lire dans le worker
+    data: bytes = None             # contenu déjà lu (membre de tar)
+
+
+def process_file(task: FileTask) -> dict:
+    """Lecture, hash, copie et déclinaisons d'un fichier source. Aucun accès base."""
+    t0 = time.perf_counter()
+    if task.data is not None:
+        data = task.data
+    elif task.archive:
+        data = _read_member(task.archive, task.path)
+    else:
+        with open(task.path, "rb") as f:
+            data = f.read()
+    sha256 = hashlib.sha256(data).hexdigest()
+    t1 = time.perf_counter()
+    result = {"rel": task.rel, "sha256": sha256, "known": sha256 in task.known,
+              "timings": {"hash": t1 - t0}}
+    if result["known"]:
+        return result
+
+    filename = os.path.basename(task.path)
+    if task.content_addressed:
+        name, _ = blobs.store(ContentFile(data), filename, sha256)
+    else:
+        name = default_storage.save(posixpath.join(task.dest_dir, filename), ContentFile(data))
+    t2 = time.perf_counter()
+    try:
+        variants, width, height = render_derivatives(
+            name, source=io.BytesIO(data), reuse_existing=task.content_addressed,
+        )
+        error = ""
+    except OSError as e:  # illisible par Pillow : l'original reste servi tel quel
+        variants, width, height, error = {}, None, None, str(e)
+    t3 = time.perf_counter()
+    result.update(
+        name=name, variants=variants, width=width, height=height, error=error,
+        timings={"hash": t1 - t0, "copy": t2 - t1, "decode": t3 - t2},
+    )
+    return result
+
+
+class _InlineExecutor:
+    """--jobs 1 : même interface que le pool, exécution dans le processus courant."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:  # comme le pool : l'erreur ressort à future.result()
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+# ---------- Reprise ----------
+class ImportChunkError(Exception):
+    """Un paquet de leaves a échoué (annulé en base, fichiers copiés supprimés)."""
+
+
+class Checkpoint:
+    """
+    Fichier JSON des leaves déjà validés, réécrit (atomiquement) après chaque
+    paquet. `signature` (base, options) doit être identique pour reprendre.
+    """
+
+    def __init__(self, path: Path, signature: dict, done=()):
+        self.path = Path(path)
+        self.signature = signature
+        self.done = set(done)
+
+    @classmethod
+    def load(cls, path: Path, signature: dict) -> "Checkpoint":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("signature") != signature:
+            raise ValueError(
+                f"reprise impossible : import lancé avec d'autres options ({data.get('signature')})"
+            )
+        return cls(path, signature, data.get("done", ()))
+
+    def save(self):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"signature": self.signature, "done": sorted(self.done)}, f)
+        os.replace(tmp, self.path)
+
+    def delete(self):
+        for path in (self.path, self.path.with_name(self.path.name + ".tmp")):
+            if path.exists():
+                path.unlink()
+
+
+# ---------- Import ----------
+@dataclass
+class _FilePlan:
+    leaf: Leaf
+    index: int
+    path: Path
+    rel: str
+    size: int
+    mtime_ns: int
+    entry: ImportedFile = None     # manifeste (--incremental)
+    future: Future = None          # None : inchangé (taille + mtime), rien à lire
+
+
+class Importer:
+    """
+    Un passage d'import. log(message, style=None) reçoit les lignes à afficher.
+    stats : compteurs ; timings : secondes par phase (hash/copy/decode cumulés
+    sur tous les processus).
+    """
+
+    def __init__(self, base: Path, log, jobs=1, incremental=False, clear=False, dry=False,
+                 checkpoint: Checkpoint = None, chunk_size=CHUNK_LEAVES, source=None):
+        self.base = base
+        self.source = source or DirSource(base)
+        self.log = log
+        self.jobs = max(1, jobs)
+        self.checkpoint = checkpoint
+        self.chunk_size = max(1, chunk_size)
+        self.incremental = incremental
+        self.clear = clear
+        self.dry = dry
+        self.content_addressed = blobs.enabled()
+        self.stats = Counter()
+        self.timings = Counter()
+        self.manifest = {}
+        self._logged_section = None
+
+    def run(self, section_dirs) -> List[Leaf]:
+        started = time.perf_counter()
+        t = time.perf_counter()
+        leaves = scan(self.base, section_dirs, self.source)
+        if self.incremental:
+            # manifeste complet en une requête ; les entrées restantes à la fin = fichiers disparus
+            self.manifest = {e.path: e for e in ImportedFile.objects.select_related("image")}
+        done = self.checkpoint.done if self.checkpoint else set()
+        if done:
+            # --resume : leaves validés lors du passage interrompu
+            skipped = [leaf for leaf in leaves if leaf.rel in done]
+            leaves = [leaf for leaf in leaves if leaf.rel not in done]
+            skipped_rels = {leaf.rel for leaf in skipped}
+            self.manifest = {p: e for p, e in self.manifest.items() if e.leaf not in skipped_rels}
+            self.stats["resumed"] = len(skipped)
+            self.log(f"Reprise : {len(skipped)} leaf(s) déjà importé(s) ignoré(s)", "NOTICE")
+        self.timings["scan"] += time.perf_counter() - t
+
+        t = time.perf_counter()
+        self.resolve_catalog(leaves)
+        self.timings["db"] += time.perf_counter() - t
+
+        if self.dry:
+            for leaf in leaves:
+                self._log_leaf(leaf, len(leaf.files))
+                for idx, path in enumerate(leaf.files):
+                    self.log(f"     - {'[P] ' if idx == 0 else ''}{path.name}")
+        else:
+            self._import_files(leaves)
+            if self.incremental:
+                self._remove_missing({d.name for d in section_dirs})
+            if not self.incremental or self.changed or self.stats["resumed"]:
+                bump_revision()
+            if self.checkpoint:
+                self.checkpoint.delete()  # import complet : plus rien à reprendre
+        self.timings["total"] = time.perf_counter() - started
+        return leaves
+
+    def sync(self, sections: dict, dirty, removed=()) -> List[Leaf]:
+        """
+        --watch : resynchronise les leaves `dirty` (dossiers) et retire les images
+        des leaves `removed` (chemins relatifs) ; `sections` {dossier de section:
+        leaves connus} donne la position des couleurs nouvelles, seuls les leaves
+        `dirty` sont listés. L'ordre des couleurs et galeries existantes (fixé
+        au dashboard) n'est jamais réécrit : un événement dans un leaf ne touche
+        que ses fichiers ajoutés, modifiés ou supprimés.
+        """
+        started = time.perf_counter()
+        t = time.perf_counter()
+        leaves = []
+        for section_dir, leaf_dirs in sections.items():
+            leaves += build_leaves(
+                self.base, section_dir, leaf_dirs,
+                lambda p: self.source.list_images(p) if p in dirty else None,
+            )
+        synced = [leaf for leaf in leaves if leaf.files]
+        self.manifest = {
+            e.path: e for e in ImportedFile.objects.select_related("image")
+            .filter(leaf__in=[leaf.rel for leaf in synced] + list(removed))
+        }
+        self.timings["scan"] += time.perf_counter() - t
+
+        t = time.perf_counter()
+        self.resolve_catalog(leaves)  # positions de toute la section, sans lister les fichiers
+        self.timings["db"] += time.perf_counter() - t
+        self._import_files(synced)
+        self._remove_missing({d.name for d in sections})
+        if self.changed:
+            bump_revision()
+        self.timings["total"] = time.perf_counter() - started
+        return synced
+
+    @property
+    def changed(self) -> bool:
+        s = self.stats
+        return bool(s["added"] or s["updated"] or s["removed"] or s["colors"])
+
+    # ----- Groupes / couleurs -----
+    def resolve_catalog(self, leaves):
+        """Groupes et couleurs des leaves : 2 lectures, créations par bulk_create."""
+        groups = {
+            (g.name, g.section): g
+            for g in ColorGroup.objects.filter(name__in={leaf.group_name for leaf in leaves})
+        }
+        missing = sorted({(leaf.group_name, leaf.section) for leaf in leaves} - groups.keys())
+        new_groups = []
+        if missing:
+            group_slugs = SlugAllocator(ColorGroup.objects.values_list("slug", flat=True))
+            for name, section in missing:
+                group = ColorGroup(
+                    name=name, section=section, position=0,
+                    slug=group_slugs.allocate(slugify(name) or "groupe"),
+                )
+                groups[(name, section)] = group
+                new_groups.append(group)
+
+        colors, slugs = {}, defaultdict(SlugAllocator)
+        for color in Color.objects.filter(group__in=[g for g in groups.values() if g.pk]):
+            colors[(color.group_id, color.name.lower())] = color
+            slugs[color.group_id].taken.add(color.slug)
+
+        # couleurs existantes : position inchangée (l'ordre a pu être fixé au dashboard)
+        new_colors = []
+        for leaf in leaves:
+            leaf.group = groups[(leaf.group_name, leaf.section)]
+            group_key = leaf.group.pk or id(leaf.group)
+            color = colors.get((group_key, leaf.color_name.lower()))
+            if color is None:
+                color = Color(
+                    group=leaf.group, name=leaf.color_name, position=leaf.position,
+                    slug=slugs[group_key].allocate(slugify(leaf.color_name) or "couleur"),
+                )
+                colors[(group_key, leaf.color_name.lower())] = color
+                new_colors.append(color)
+                leaf.created = True
+            leaf.color = color
+
+        if self.dry or not (new_groups or new_colors):
+            return
+        with transaction.atomic():
+            ColorGroup.objects.bulk_create(new_groups)
+            for color in new_colors:
+                color.group_id = color.group.pk
+            Color.objects.bulk_create(new_colors)
+            for group in new_groups:
+                search.index_group(group)
+        self.stats["colors"] += len(new_colors)
+
+    # ----- Fichiers -----
+    def _import_files(self, leaves):
+        executor = _InlineExecutor()
+        if self.jobs > 1:
+            connections.close_all()  # rien d'ouvert au moment du fork
+            executor = ProcessPoolExecutor(max_workers=self.jobs, initializer=init_worker)
+        # tar : ordre des membres, pour lire le flux sans retour en arrière
+        leaves = sorted(leaves, key=lambda leaf: min(map(self.source.read_order, leaf.files)))
+        previous = planned = None
+        try:
+            # les processus traitent le paquet suivant pendant l'écriture du précédent
+            for i in range(0, len(leaves), self.chunk_size):
+                chunk = leaves[i:i + self.chunk_size]
+                planned = (chunk, *self._plan(chunk, executor))
+                if previous:
+                    self._apply(*previous)
+                previous, planned = planned, None
+            if previous:
+                self._apply(*previous)
+        except BaseException:
+            # paquet déjà lancé dans le pool : annulé, ses copies supprimées
+            executor.shutdown(wait=True, cancel_futures=True)
+            for pending in (previous, planned):
+                if pending:
+                    self._discard(self._collect(pending[1])[0].values())
+            if self.stats["chunks"]:
+                bump_revision()  # paquets déjà validés : visibles dans le bundle
+            raise
+        finally:
+            executor.shutdown(wait=True)
+
+    def _plan(self, chunk, executor):
+        """Retourne (plans, orphelines) ; les fichiers à lire partent dans le pool."""
+        t = time.perf_counter()
+        orphans = self._orphan_images(chunk) if self.incremental else {}
+        plans = []
+        for leaf in chunk:
+            for idx, path in enumerate(leaf.files):
+                rel = path.relative_to(self.base).as_posix()
+                plan = _FilePlan(leaf, idx, path, rel, *self.source.stat(path))
+                plan.entry = self.manifest.pop(rel, None)
+                plans.append(plan)
+        self.timings["scan"] += time.perf_counter() - t
+
+        for plan in sorted(plans, key=lambda plan: self.source.read_order(plan.path)):
+            entry = plan.entry
+            if entry is not None and (entry.size, entry.mtime_ns) == (plan.size, plan.mtime_ns):
+                continue  # inchangé : pas relu
+            color = plan.leaf.color
+            known = (entry.sha256,) if entry is not None else tuple(orphans.get(color.pk, ()))
+            t = time.perf_counter()
+            fields = self.source.task_fields(plan.path)
+            self.timings["hash"] += time.perf_counter() - t  # lecture d'un membre de tar
+            plan.future = executor.submit(process_file, FileTask(
+                rel=plan.rel, dest_dir=f"colors/{color.slug}/gallery",
+                content_addressed=self.content_addressed, known=known, **fields,
+            ))
+        return plans, orphans
+
+    def _orphan_images(self, chunk) -> dict:
+        """
+        --incremental : images des couleurs du paquet absentes du manifeste (import
+        antérieur au manifeste), {color_id: {sha256: image}} -> rattachées plutôt que dupliquées.
+        """
+        orphans = defaultdict(dict)
+        images = ColorImage.objects.filter(
+            color__in=[leaf.color for leaf in chunk], import_source__isnull=True,
+        )
+        for img in images:
+            sha256 = img.sha256
+            if not sha256:
+                try:
+                    with img.image.storage.open(img.image.name, "rb") as f:
+                        sha256 = blobs.file_sha256(f)
+                except OSError:
+                    continue
+            orphans[img.color_id].setdefault(sha256, img)
+        return orphans
+
+    def _collect(self, plans):
+        """Résultats du pool pour un paquet : ({rel: résultat}, première erreur)."""
+        results, error = {}, None
+        for plan in plans:
+            if plan.future is None:
+                continue
+            try:
+                results[plan.rel] = plan.future.result()
+            except Exception as e:
+                error = error or ImportChunkError(f"{plan.rel}: {e!r}")
+        return results, error
+
+    def _discard(self, results):
+        """Copies (et déclinaisons) d'un paquet annulé, si aucune image ne les référence."""
+        for result in results:
+            if result.get("name"):
+                release_file(result["name"], result.get("variants") or {})
+
+    def _apply(self, chunk, plans, orphans):
+        results, error = self._collect(plans)
+        if error is not None:
+            self._discard(results.values())
+            plans.clear()  # déjà nettoyé
+            raise error
+        for result in results.values():
+            for phase, seconds in result["timings"].items():
+                self.timings[phase] += seconds
+        try:
+            self._write(chunk, plans, orphans, results)
+        except BaseException:
+            self._discard(results.values())
+            plans.clear()
+            raise
+        self.stats["chunks"] += 1
+        if self.checkpoint:
+            self.checkpoint.done.update(leaf.rel for leaf in chunk)
+            self.checkpoint.save()
+
+    def _write(self, chunk, plans, orphans, results):
+
+        t = time.perf_counter()
+        # dernière position des galeries déjà en base : les nouvelles images s'y
+        # ajoutent à la fin, sans toucher l'ordre existant (dashboard)
+        last_position = {} if self.clear else dict(
+            ColorImage.objects.filter(color__in=[leaf.color for leaf in chunk if leaf.color.pk])
+            .values("color_id").annotate(last=Max("position")).values_list("color_id", "last")
+        )
+        new_images, new_entries, changed, touched_entries = [], [], [], []
+        released, stored = [], []
+        for plan in plans:
+            leaf, idx = plan.leaf, plan.index
+            result = results.get(plan.rel)
+            stat_fields = {"size": plan.size, "mtime_ns": plan.mtime_ns}
+
+            if result is None:                                     # inchangé
+                self.stats["unchanged"] += 1
+                continue
+            if result.get("error"):
+                self.stats["failed"] += 1
+                self.log(f"     ! déclinaisons impossibles pour {plan.path.name}: {result['error']}", "WARNING")
+
+            if result["known"] and plan.entry is not None:         # touché, même contenu
+                self.stats["unchanged"] += 1
+                plan.entry.size, plan.entry.mtime_ns = plan.size, plan.mtime_ns
+                touched_entries.append(plan.entry)
+                continue
+            if result["known"]:                                    # image antérieure au manifeste
+                self.stats["adopted"] += 1
+                img = orphans[leaf.color.pk].pop(result["sha256"])
+                new_entries.append(ImportedFile(
+                    path=plan.rel, leaf=leaf.rel, image=img, sha256=result["sha256"], **stat_fields,
+                ))
+                continue
+
+            fields = {
+                "image": result["name"],
+                "file_url": default_storage.url(result["name"]),
+                "sha256": result["sha256"] if self.content_addressed else "",
+                "width": result["width"],
+                "height": result["height"],
+                "variants": result["variants"],
+                "status": ImageStatus.READY,
+            }
+            if plan.entry is not None:                             # contenu modifié
+                self.stats["updated"] += 1
+                self.log(f"     ~ {plan.path.name}")
+                img = plan.entry.image
+                released.append((img.image.name, dict(img.variants or {})))
+                for name, value in fields.items():
+                    setattr(img, name, value)
+                changed.append(img)
+                stored.append((img, plan))
+                plan.entry.size, plan.entry.mtime_ns = plan.size, plan.mtime_ns
+                plan.entry.sha256 = result["sha256"]
+                touched_entries.append(plan.entry)
+                continue
+
+            self.stats["added"] += 1                               # nouveau fichier
+            last = last_position.get(leaf.color.pk)
+            if last is None:          # galerie vide : ordre du disque, 1er fichier en présentation
+                is_presentation, position = idx == 0, idx + 1
+            else:                     # galerie existante : à la suite
+                is_presentation, position = False, last + POSITION_GAP
+                last_position[leaf.color.pk] = position
+            img = ColorImage(
+                color=leaf.color, is_presentation=is_presentation, position=position,
+                alt=f"{leaf.color.name} – {leaf.group.name}", **fields,
+            )
+            new_images.append(img)
+            stored.append((img, plan))
+            if self.incremental:
+                new_entries.append(ImportedFile(
+                    path=plan.rel, leaf=leaf.rel, image=img, sha256=result["sha256"], **stat_fields,
+                ))
+
+        for leaf in chunk:
+            count = sum(1 for p in plans if p.leaf is leaf and (p.future is not None or p.entry is None))
+            if not self.incremental or count or leaf.created:
+                self._log_leaf(leaf, len(leaf.files))
+
+        if not (new_images or changed or new_entries or touched_entries or self.clear):
+            self.timings["db"] += time.perf_counter() - t
+            return  # paquet inchangé : aucune écriture
+        with transaction.atomic():
+            self._restore_blobs(stored)
+            if self.clear:
+                ColorImage.objects.filter(color__in=[leaf.color for leaf in chunk]).delete()
+            ColorImage.objects.bulk_create(new_images, batch_size=500)
+            ColorImage.objects.bulk_update(
+                changed, ["image", "file_url", "sha256", "width", "height", "variants", "status"],
+                batch_size=500,
+            )
+            # une seule présentation par couleur (ColorImage.save le fait image par image)
+            presenting = [img for img in new_images if img.is_presentation]
+            if presenting:
+                ColorImage.objects.filter(
+                    color_id__in={img.color_id for img in presenting}, is_presentation=True,
+                ).exclude(pk__in=[img.pk for img in presenting]).update(is_presentation=False)
+            ImportedFile.objects.bulk_create(new_entries, batch_size=500)
+            ImportedFile.objects.bulk_update(
+                touched_entries, ["size", "mtime_ns", "sha256"], batch_size=500,
+            )
+            color_ids = {leaf.color.pk for leaf in chunk}
+            Color.refresh_image_stats_bulk(color_ids)
+            if new_images or changed or self.clear:
+                search.index_colors(color_ids)  # textes alternatifs des nouvelles images
+            for name, variants in released:
+                transaction.on_commit(lambda n=name, v=variants: release_file(n, v))
+        self.timings["db"] += time.perf_counter() - t
+
+    def _restore_blobs(self, stored):
+        """
+        Stockage par hash : un worker a pu réutiliser un blob déjà présent
+        qu'un release_file (autre processus) a supprimé depuis. Appelé sous
+        le verrou d'écriture, avant l'insertion : un blob absent est recopié
+        depuis la source, avec ses déclinaisons.
+        """
+        if not self.content_addressed:
+            return
+        for img, plan in stored:
+            if default_storage.exists(img.image.name):
+                continue
+            result = process_file(FileTask(
+                rel=plan.rel, dest_dir="", content_addressed=True, **self.source.task_fields(plan.path),
+            ))
+            img.image = result["name"]
+            img.file_url = default_storage.url(result["name"])
+            img.variants, img.width, img.height = result["variants"], result["width"], result["height"]
+
+    def _remove_missing(self, scanned_sections):
+        gone = [e for e in self.manifest.values() if e.path.split("/", 1)[0] in scanned_sections]
+        for entry in gone:
+            self.log(f"  REMOVE: {entry.path}")
+        if gone:
+            t = time.perf_counter()
+            ColorImage.objects.filter(pk__in=[e.image_id for e in gone]).delete()
+            self.timings["db"] += time.perf_counter() - t
+        self.stats["removed"] = len(gone)
+
+    def _log_leaf(self, leaf, count):
+        if self._logged_section != leaf.section_key:
+            self._logged_section = leaf.section_key
+            self.log(f"Section: {leaf.section_key} → {leaf.section}", "MIGRATE_HEADING")
+        if self.incremental:
+            action = "SYNC"
+        else:
+            action = "CREATE" if leaf.created else "UPDATE"
+        self.log(f"  {action}: [{leaf.section_key}] {leaf.group.name} / {leaf.color.name}  ({count} images)")
@@ -0,0 +1,184 @@
+# schmidt_app/jobs.py
+"""
+File de tâches en base (modèle Job) pour le travail lent hors requête.
+
+    enqueue("process_image", image_id=42)   -> ligne Job « pending »
+    manage.py run_workers --processes 4     -> exécute les jobs dans un pool
+
+Le dispatcher (run_workers) réclame les jobs prêts par un UPDATE
+conditionnel (status pending -> running) puis confie leur id au pool de
+processus. En cas d'exception, le job repasse « pending » avec un délai
+croissant (RETRY_DELAYS) jusqu'à max_attempts, puis « failed ».
+Un job resté « running » au-delà de STALE_AFTER ou dont le pool s'est
+interrompu (worker tué) suit le même chemin qu'une exception.
+
+Les tâches sont des fonctions enregistrées avec @task(kind) ; leur payload
+(JSON) est passé en arguments nommés.
+"""
+import datetime
+import logging
+import traceback
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import sprites
+from .catalog import bump_revision
+from .imaging import build_derivatives
+from .models import ColorImage, ImageStatus, Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+RETRY_DELAYS = (10, 60, 300)  # secondes avant la 2e, 3e, 4e tentative…
+STALE_AFTER = datetime.timedelta(minutes=15)
+
+_TASKS = {}
+
+
+def task(kind: str, on_failure=None):
+    """
+    Enregistre une tâche. on_failure(**payload) est appelé quand le job
+    est abandonné (toutes les tentatives épuisées).
+    """
+    def register(func):
+        _TASKS[kind] = (func, on_failure)
+        return func
+    return register
+
+
+def enqueue(kind: str, max_attempts: int = MAX_ATTEMPTS, **payload) -> Job:
+    if kind not in _TASKS:
+        raise LookupError(f"unknown job kind: {kind}")
+    job = Job.objects.create(kind=kind, payload=payload, max_attempts=max_attempts)
+    # JOBS_EAGER (dev / tests sans run_workers) : exécution immédiate
+    if getattr(settings, "JOBS_EAGER", False):
+        Job.objects.filter(pk=job.pk).update(
+            status=JobStatus.RUNNING, locked_at=timezone.now(), attempts=1,
+        )
+        execute(job.pk)
+        job.refresh_from_db()
+    return job
+
+
+# ---------- Dispatcher ----------
+def claim(limit: int) -> list:
+    """Passe jusqu'à `limit` jobs prêts en « running » et retourne leurs ids."""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Job.objects
+            .filter(status=JobStatus.PENDING, run_after__lte=now)
+            .order_by("id")
+            .values_list("id", flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        # conditionnel : un job réclamé entre-temps par un autre dispatcher est ignoré
+        Job.objects.filter(id__in=ids, status=JobStatus.PENDING).update(
+            status=JobStatus.RUNNING, locked_at=now, attempts=F("attempts") + 1,
+        )
+        return list(
+            Job.objects
+            .filter(id__in=ids, status=JobStatus.RUNNING, locked_at=now)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+
+
+def requeue_stale(older_than: datetime.timedelta = STALE_AFTER) -> int:
+    """Remet en file les jobs « running » abandonnés par un worker arrêté."""
+    return _interrupted(
+        Job.objects.filter(locked_at__lt=timezone.now() - older_than),
+        f"worker arrêté : job resté en cours plus de {older_than}",
+    )
+
+
+def release(job_ids) -> int:
+    """Remet en file des jobs réclamés mais non terminés (pool interrompu)."""
+    return _interrupted(Job.objects.filter(id__in=list(job_ids)), "pool de processus interrompu (worker tué)")
+
+
+def _interrupted(qs, error: str) -> int:
+    """
+    Jobs « running » dont le worker a disparu : traités comme une exception.
+    La tentative compte (claim l'a incrémentée) : un job qui tue son worker
+    (OOM sur une image énorme…) est abandonné après max_attempts au lieu de
+    boucler indéfiniment.
+    """
+    with transaction.atomic():
+        jobs = list(qs.filter(status=JobStatus.RUNNING))
+        for job in jobs:
+            _failed(job, _TASKS.get(job.kind, (None, None))[1], error)
+    return len(jobs)
+
+
+# ---------- Exécution (dans un processus du pool) ----------
+def init_worker():
+    """initializer des ProcessPoolExecutor (run_workers, import_couleurs --jobs)."""
+    import django
+    django.setup()  # sans effet après un fork, nécessaire en mode spawn
+    # connexions héritées du parent : jamais partagées entre processus
+    connections.close_all()
+
+
+def execute(job_id: int) -> bool:
+    job = Job.objects.filter(pk=job_id).first()
+    if job is None:
+        return False
+    func, on_failure = _TASKS.get(job.kind, (None, None))
+    try:
+        if func is None:
+            raise LookupError(f"unknown job kind: {job.kind}")
+        func(**job.payload)
+    except Exception:
+        _failed(job, on_failure, traceback.format_exc())
+        return False
+    Job.objects.filter(pk=job.pk).update(status=JobStatus.DONE, locked_at=None, last_error="")
+    return True
+
+
+def _failed(job: Job, on_failure, error: str):
+    if job.attempts < job.max_attempts:
+        delay = RETRY_DELAYS[min(job.attempts, len(RETRY_DELAYS)) - 1]
+        Job.objects.filter(pk=job.pk).update(
+            status=JobStatus.PENDING, locked_at=None, last_error=error,
+            run_after=timezone.now() + datetime.timedelta(seconds=delay),
+        )
+        logger.warning("job %s (%s) en échec, nouvel essai dans %ss", job.pk, job.kind, delay)
+        return
+    Job.objects.filter(pk=job.pk).update(status=JobStatus.FAILED, locked_at=None, last_error=error)
+    logger.error("job %s (%s) abandonné après %s essais", job.pk, job.kind, job.attempts)
+    if on_failure is not None:
+        try:
+            on_failure(**job.payload)
+        except Exception:
+            logger.exception("on_failure du job %s", job.pk)
+
+
+# ---------- Tâches ----------
+def _image_failed(image_id: int):
+    ColorImage.objects.filter(pk=image_id).update(status=ImageStatus.FAILED)
+
+
+@task("process_image", on_failure=_image_failed)
+def process_image(image_id: int):
+    """Dimensions + déclinaisons srcset d'une image téléversée."""
+    img = ColorImage.objects.filter(pk=image_id).first()
+    if img is None:
+        return  # supprimée avant traitement
+    build_derivatives(img)
+    ColorImage.objects.filter(pk=image_id).update(status=ImageStatus.READY)
+    bump_revision()  # .update() : les srcset doivent apparaître dans le bundle
+
+
+@task("build_sprites")
+def build_sprites():
+    """Planches de vignettes manquantes (mise en file par bump_revision), puis nettoyage."""
+    _ready, missing = sprites.ready_sheets()
+    sprites.prune(sprites.build_sheets())
+    if missing:
+        # les snapshots des workers reprennent les nouvelles planches
+        bump_revision(rebuild_sprites=False)
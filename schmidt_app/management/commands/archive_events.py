@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Archive les vieux clics (ClickEvent) dans des segments mensuels compressés
+puis les supprime de la base par petits lots (schmidt_app/archive.py) :
+
+    python manage.py archive_events --older-than 90d
+    python manage.py archive_events --older-than 12w --dry-run
+    python manage.py archive_events --older-than 90d --vacuum
+
+Lancer rollup_analytics avant : seuls les clics déjà agrégés sont archivés.
+"""
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from schmidt_app import archive
+from schmidt_app.routers import analytics_db
+
+UNITS = {"d": 1, "w": 7}
+
+
+def parse_age(value: str) -> timedelta:
+    """'90d', '12w' ou '90' (jours)."""
+    m = re.fullmatch(r"(\d+)([dw]?)", value.strip().lower())
+    if not m:
+        raise CommandError(f"--older-than : durée invalide '{value}' (ex. 90d, 12w)")
+    return timedelta(days=int(m.group(1)) * UNITS.get(m.group(2) or "d"))
+
+
+class Command(BaseCommand):
+    help = "Archive les clics anciens en segments .jsonl.gz mensuels puis les supprime"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", required=True, help="Rétention, ex. 90d ou 12w")
+        parser.add_argument("--dir", help="Dossier des segments (défaut : settings.ANALYTICS_ARCHIVE_DIR)")
+        parser.add_argument(
+            "--batch",
+            type=int,
+            default=archive.DELETE_BATCH,
+            help=f"Lignes supprimées par transaction (défaut : {archive.DELETE_BATCH})",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Compte les clics concernés sans rien écrire")
+        parser.add_argument(
+            "--vacuum",
+            action="store_true",
+            help="VACUUM de la base analytics ensuite (bloque les écritures le temps de l'opération)",
+        )
+
+    def handle(self, *args, **opts):
+        cutoff = timezone.now() - parse_age(opts["older_than"])
+        self.stdout.write(f"Clics antérieurs au {timezone.localtime(cutoff):%Y-%m-%d %H:%M}")
+        done = archive.archive(
+            cutoff,
+            directory=opts.get("dir"),
+            delete_batch=max(opts["batch"], 1),
+            dry=opts["dry_run"],
+            log=self.stdout.write,
+        )
+        if opts["dry_run"]:
+            self.stdout.write(f"{done['archived']} clic(s) à archiver.")
+            return
+        if opts["vacuum"] and done["deleted"]:
+            with connections[analytics_db()].cursor() as cursor:
+                cursor.execute("VACUUM")
+        self.stdout.write(self.style.SUCCESS(
+            f"{done['archived']} clic(s) archivé(s) en {done['segments']} segment(s), "
+            f"{done['deleted']} supprimé(s)."
+        ))
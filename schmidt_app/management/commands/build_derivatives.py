@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Génère les déclinaisons srcset (160/480/1280 px, JPEG + WebP) des images
+existantes. Seules les déclinaisons manquantes sont produites, sauf --force.
+"""
+from django.core.management.base import BaseCommand
+
+from schmidt_app.catalog import bump_revision
+from schmidt_app.imaging import build_derivatives
+from schmidt_app.models import ColorImage
+
+
+class Command(BaseCommand):
+    help = "Génère les images redimensionnées (srcset) des ColorImage existantes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Régénère toutes les déclinaisons, même existantes",
+        )
+        parser.add_argument(
+            "--color",
+            type=int,
+            help="Limiter aux images d'une couleur (id)",
+        )
+
+    def handle(self, *args, **opts):
+        qs = ColorImage.objects.order_by("id")
+        if opts.get("color"):
+            qs = qs.filter(color_id=opts["color"])
+
+        done = failed = 0
+        for img in qs.iterator(chunk_size=200):
+            try:
+                build_derivatives(img, force=opts.get("force", False))
+                done += 1
+            except OSError as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f"  {img.image.name}: {e}"))
+
+        bump_revision()  # les srcset apparaissent dans le snapshot / bundle
+        self.stdout.write(self.style.SUCCESS(f"{done} image(s) traitée(s), {failed} échec(s)."))
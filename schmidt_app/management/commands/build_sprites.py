@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Construit les planches de vignettes par section (sprites.py).
+Normalement fait par la tâche "build_sprites" (run_workers) après un
+changement de catalogue ; utile sans worker ou juste après un import.
+--prune supprime les anciennes planches.
+"""
+from django.core.management.base import BaseCommand
+
+from schmidt_app import sprites
+from schmidt_app.catalog import bump_revision
+
+
+class Command(BaseCommand):
+    help = "Génère les planches de vignettes (sprites) de chaque section"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Supprime les planches qui ne correspondent plus au catalogue",
+        )
+
+    def handle(self, *args, **opts):
+        sheets = sprites.build_sheets()
+        bump_revision(rebuild_sprites=False)  # les workers relisent les planches prêtes
+        for section, meta in sorted(sheets.items()):
+            self.stdout.write(
+                f"  {section}: {len(meta['positions'])} vignette(s) -> {meta['name']} "
+                f"({meta['width']}x{meta['height']})"
+            )
+
+        if opts.get("prune"):
+            removed = sprites.prune(sheets)
+            self.stdout.write(f"  {removed} ancien(s) fichier(s) supprimé(s)")
+
+        self.stdout.write(self.style.SUCCESS("Planches à jour."))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Ferme les sessions abandonnées (onglet tué, borne éteinte : pas de
+perf_session_stop) et fige leur durée (UsageSession.duration) :
+
+    python manage.py close_sessions             # inactives depuis 30 min
+    python manage.py close_sessions --idle 10
+
+La fin retenue est le dernier clic de la session (à défaut son début).
+Remplit aussi `duration` pour les sessions déjà closes qui n'en ont pas
+(données antérieures à ce champ). À lancer régulièrement (cron).
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from schmidt_app.models import UsageSession
+
+BATCH = 1000
+
+
+class Command(BaseCommand):
+    help = "Ferme les sessions inactives et fige leur durée"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--idle",
+            type=int,
+            default=30,
+            help="Minutes sans clic au-delà desquelles une session ouverte est close (défaut : 30)",
+        )
+
+    def handle(self, *args, **opts):
+        cutoff = timezone.now() - timedelta(minutes=opts["idle"])
+
+        stale = (
+            UsageSession.objects
+            .filter(ended_at__isnull=True)
+            .annotate(last=Coalesce(Max("events__created_at"), "started_at"))
+            .filter(last__lt=cutoff)
+        )
+        closed = self._fix(stale, close=True)
+
+        legacy = UsageSession.objects.filter(ended_at__isnull=False, duration__isnull=True)
+        filled = self._fix(legacy, close=False)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{closed} session(s) close(s), {filled} durée(s) complétée(s)."
+        ))
+
+    def _fix(self, qs, close):
+        done = 0
+        while batch := list(qs.order_by("started_at")[:BATCH]):
+            for s in batch:
+                if close:
+                    s.ended_at = s.last
+                s.duration = s.measure_duration()
+            UsageSession.objects.bulk_update(batch, ["ended_at", "duration"])
+            done += len(batch)
+        return done
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Convertit les images existantes au stockage adressé par contenu (blobs.py) :
+chaque original est rangé sous son SHA-256, les doublons partagent alors
+un seul fichier et l'ancien chemin (colors/<slug>/gallery/…) est supprimé
+dès qu'il n'est plus référencé.
+"""
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from schmidt_app import blobs
+from schmidt_app.catalog import bump_revision
+from schmidt_app.imaging import build_derivatives, release_file
+from schmidt_app.models import ColorImage
+
+
+class Command(BaseCommand):
+    help = "Range les images existantes sous leur hash SHA-256 (déduplication)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Calcule les hash et affiche le gain sans rien modifier",
+        )
+
+    def handle(self, *args, **opts):
+        dry = opts.get("dry_run", False)
+        qs = ColorImage.objects.exclude(image__startswith=f"{blobs.BLOBS_DIR}/").order_by("id")
+
+        converted = missing = 0
+        seen = set()
+        saved_bytes = 0
+        for img in qs.iterator(chunk_size=200):
+            old_name = img.image.name
+            if not old_name or not default_storage.exists(old_name):
+                missing += 1
+                continue
+            if dry:
+                with default_storage.open(old_name, "rb") as f:
+                    sha256 = blobs.file_sha256(f)
+                if sha256 in seen:
+                    saved_bytes += default_storage.size(old_name)
+                seen.add(sha256)
+                continue
+
+            old_variants = dict(img.variants or {})
+            with transaction.atomic():  # même verrou que release_file (blobs.py)
+                with default_storage.open(old_name, "rb") as f:
+                    name, sha256 = blobs.store(f, old_name)
+                ColorImage.objects.filter(pk=img.pk).update(
+                    image=name, sha256=sha256, file_url=default_storage.url(name), variants={},
+                )
+            # ancien original + déclinaisons : supprimés s'ils ne servent plus
+            release_file(old_name, old_variants)
+            img.image.name, img.sha256, img.variants = name, sha256, {}
+            try:
+                build_derivatives(img)  # réutilise celles d'un doublon déjà converti
+            except OSError as e:
+                self.stdout.write(self.style.WARNING(f"  {name}: {e}"))
+            converted += 1
+
+        if dry:
+            self.stdout.write(
+                f"{len(seen)} contenu(s) distinct(s), ~{saved_bytes // 1024} Kio récupérables."
+            )
+            return
+        bump_revision()
+        self.stdout.write(self.style.SUCCESS(
+            f"{converted} image(s) converties, {missing} fichier(s) introuvable(s)."
+        ))
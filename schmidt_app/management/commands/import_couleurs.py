@@ -20,53 +20,42 @@ Structure acceptée et flexible:
 
 Par défaut, si un leaf est directement sous <section>/ (pas de parent de groupe),
 le groupe créé s’appelle "Divers".
-"""
-import os
-from pathlib import Path
-from typing import List, Tuple
-
-from django.core.files import File
-from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
-
-from django.utils.text import slugify
-
-from schmidt_app.models import Section, ColorGroup, Color, ColorImage
 
-SECTIONS_MAP = {
-    "facades": Section.FACADES,
-    "ambiances": Section.AMBIANCES,
-    "pieces": Section.ESPACES,               # "pieces" => Section.ESPACES
-    "plans_de_travail": Section.PLANS,       # "plans_de_travail" => Section.PLANS
-}
+--incremental : s'appuie sur le manifeste ImportedFile (chemin, taille, mtime,
+hash) pour n'ajouter que les nouveaux fichiers, remplacer ceux dont le contenu
+a changé et retirer les images dont le fichier a disparu. Un fichier dont
+taille et mtime sont inchangés n'est pas relu ; un arbre inchangé ne produit
+aucune écriture.
 
-IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+--jobs N : lecture, hash, copie et déclinaisons dans N processus ; les écritures
+en base sont groupées (bulk_create / bulk_update) par paquets de leaves.
+Le moteur est dans schmidt_app/importer.py.
 
+--watch : import incrémental puis surveillance de --base (inotify, ou polling
+des dossiers à défaut) ; après --debounce secondes sans nouvel événement, seuls
+les leaves touchés sont resynchronisés (positions recalculées dans leur section).
 
-def pretty_name(s: str) -> str:
-    s = s.replace("_", " ").replace("-", " ").strip()
-    # Garde les majuscules si l’entrée est déjà propre, sinon Title Case.
-    return s if any(c.isupper() for c in s) else s.title()
+--archive catalogue.zip|.tar.gz : même arborescence (sections à la racine ou
+sous un dossier unique), lue directement dans l'archive sans extraction.
 
+Chaque paquet (--chunk N leaves, 1 = un commit par leaf) est validé puis noté
+dans un fichier de reprise (--checkpoint, défaut <base>/.import_checkpoint.json).
+Après un échec, relancer avec les mêmes options et --resume : l'import repart
+du premier leaf non validé. Le fichier est supprimé quand l'import aboutit.
+"""
+import signal
+import tarfile
+import time
+from pathlib import Path
 
-def list_images(p: Path) -> List[Path]:
-    files = [f for f in sorted(p.iterdir()) if f.is_file() and f.suffix.lower() in IMAGE_EXTS]
-    return files
-
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections
 
-def find_leaf_dirs_with_images(section_root: Path) -> List[Path]:
-    """
-    Retourne les dossiers "leaf" (contenant des images) sous section_root.
-    Si un dossier contient des images, on l'utilise tel quel, même s'il a des sous-dossiers.
-    """
-    leaves: List[Path] = []
-    for root, dirs, files in os.walk(section_root):
-        rp = Path(root)
-        if any(Path(root, f).suffix.lower() in IMAGE_EXTS for f in files):
-            leaves.append(rp)
-            # on ne descend pas plus bas: ce dossier est déjà un leaf logique pour une couleur
-            dirs[:] = []
-    return sorted(leaves)
+from schmidt_app.importer import (  # noqa: F401 (réexportés pour compatibilité)
+    CHUNK_LEAVES, IMAGE_EXTS, SECTIONS_MAP, ArchiveSource, Checkpoint, DirSource,
+    ImportChunkError, Importer, find_leaf_dirs_with_images, list_images, pretty_name,
+)
+from schmidt_app.watcher import LeafIndex, PollingWatcher, make_watcher
 
 
 class Command(BaseCommand):
@@ -78,6 +67,10 @@ class Command(BaseCommand):
             default="schmidt_app/static/couleurs",
             help="Chemin racine des sections (défaut: schmidt_app/static/couleurs)",
         )
+        parser.add_argument(
+            "--archive",
+            help="Importe depuis une archive .zip / .tar.gz (sans extraction) au lieu de --base",
+        )
         parser.add_argument(
             "--only",
             choices=list(SECTIONS_MAP.keys()),
@@ -93,97 +86,202 @@ class Command(BaseCommand):
             action="store_true",
             help="Avant d'importer une couleur, supprime ses images existantes",
         )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="N'importe que les fichiers nouveaux ou modifiés et retire les images disparues",
+        )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=1,
+            help="Nombre de processus pour lire / copier / redimensionner les images (défaut: 1)",
+        )
+        parser.add_argument(
+            "--chunk",
+            type=int,
+            default=CHUNK_LEAVES,
+            help=f"Leaves par transaction (1 = un commit par leaf, défaut: {CHUNK_LEAVES})",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Fichier de reprise (défaut: <base>/.import_checkpoint.json)",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Reprend un import interrompu à partir du fichier de reprise",
+        )
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Après l'import, surveille --base et synchronise les leaves modifiés",
+        )
+        parser.add_argument(
+            "--debounce",
+            type=float,
+            default=2.0,
+            help="--watch : secondes sans événement avant synchronisation (défaut: 2)",
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=0,
+            help="--watch : polling toutes les N secondes au lieu d'inotify",
+        )
 
-    @transaction.atomic
     def handle(self, *args, **opts):
         base = Path(opts["base"]).resolve()
+        if opts.get("incremental") and opts.get("clear"):
+            raise CommandError("--incremental et --clear sont incompatibles.")
+        if opts.get("watch"):
+            if opts.get("archive") or opts.get("clear") or opts.get("dry_run") or opts.get("resume"):
+                raise CommandError("--watch est incompatible avec --archive, --clear, --dry-run et --resume.")
+            opts["incremental"] = True
+        if opts.get("archive"):
+            base = Path(opts["archive"]).resolve()
+            if not base.is_file():
+                raise CommandError(f"Archive introuvable: {base}")
+            try:
+                source = ArchiveSource(base)
+            except (OSError, tarfile.TarError) as e:
+                raise CommandError(f"Archive illisible ({base}): {e}")
+            default_checkpoint = base.with_name(f"{base.name}.import_checkpoint.json")
+        else:
+            if not base.exists():
+                raise CommandError(f"Base introuvable: {base}")
+            source = DirSource(base)
+            default_checkpoint = base / ".import_checkpoint.json"
+
+        if opts.get("watch"):
+            # surveillance démarrée avant l'import initial : aucun changement perdu entre les deux
+            watcher = make_watcher(base, opts.get("poll") or 0)
+            try:
+                index = LeafIndex(base, [opts["only"]] if opts.get("only") else list(SECTIONS_MAP))
+                self._import(source, base, default_checkpoint, opts)
+                self._watch(watcher, index, base, opts)
+            finally:
+                watcher.close()
+                source.close()
+            return
+        try:
+            self._import(source, base, default_checkpoint, opts)
+        finally:
+            source.close()
+
+    def _import(self, source, base, default_checkpoint, opts):
         only = opts.get("only")
         dry = opts.get("dry_run", False)
         clear = opts.get("clear", False)
-
-        if not base.exists():
-            raise CommandError(f"Base introuvable: {base}")
+        incremental = opts.get("incremental", False)
 
         # Liste des sections présentes
         section_dirs = [
-            d for d in base.iterdir()
-            if d.is_dir() and d.name in SECTIONS_MAP and (only is None or d.name == only)
+            d for d in source.section_dirs()
+            if d.name in SECTIONS_MAP and (only is None or d.name == only)
         ]
         if not section_dirs:
             raise CommandError("Aucune section trouvée (ou filtre --only trop restrictif).")
 
-        summary = []
-
+        checkpoint = None
+        if not dry:
+            path = Path(opts.get("checkpoint") or default_checkpoint)
+            signature = {"base": str(base), "only": only, "incremental": incremental, "clear": clear}
+            if opts.get("resume") and path.exists():
+                try:
+                    checkpoint = Checkpoint.load(path, signature)
+                except (OSError, ValueError) as e:
+                    raise CommandError(f"Fichier de reprise {path} : {e}")
+            elif opts.get("resume"):
+                self.stdout.write(self.style.WARNING(f"Aucun fichier de reprise ({path}) : import complet."))
+            checkpoint = checkpoint or Checkpoint(path, signature)
+
+        importer = Importer(
+            base, self._log, jobs=opts.get("jobs") or 1,
+            incremental=incremental, clear=clear, dry=dry,
+            checkpoint=checkpoint, chunk_size=opts.get("chunk") or CHUNK_LEAVES, source=source,
+        )
+        try:
+            leaves = importer.run(section_dirs)
+        except ImportChunkError as e:
+            raise CommandError(
+                f"Import interrompu ({e}). {importer.stats['chunks']} paquet(s) validé(s) ; "
+                f"corriger puis relancer avec les mêmes options et --resume."
+            )
         for section_dir in sorted(section_dirs):
-            section_key = section_dir.name
-            section_val = SECTIONS_MAP[section_key]
-            self.stdout.write(self.style.MIGRATE_HEADING(f"Section: {section_key} → {section_val}"))
-
-            leaves = find_leaf_dirs_with_images(section_dir)
-            if not leaves:
+            if not any(leaf.section_key == section_dir.name for leaf in leaves):
                 self.stdout.write(self.style.WARNING(f"  (aucun dossier avec images sous {section_dir})"))
-                continue
-
-            # Positionnement "basique": l'ordre des leaves pour Color, et index de l'image pour ColorImage
-            for color_pos, leaf in enumerate(leaves, start=1):
-                images = list_images(leaf)
-                if not images:
-                    continue
-
-                # Déterminer group_name et color_name
-                # leaf = <base>/<section>/<...optional...>/<leaf-name>
-                parent = leaf.parent
-                is_parent_section = parent == section_dir
-
-                group_name = pretty_name(parent.name) if not is_parent_section else "Divers"
-                color_name = pretty_name(leaf.name)
-
-                # Créer/obtenir le groupe
-                group_defaults = {"position": 0, "section": section_val}
-                group, created_g = ColorGroup.objects.get_or_create(
-                    name=group_name,
-                    section=section_val,
-                    defaults=group_defaults,
-                )
-
-                # Créer/obtenir la couleur
-                color_defaults = {"group": group, "position": color_pos}
-                color, created_c = Color.objects.get_or_create(
-                    group=group,
-                    name=color_name,
-                    defaults=color_defaults,
-                )
-                # Mettre à jour position si nouvelle itération veut réordonner
-                if not dry and color.position != color_pos:
-                    color.position = color_pos
-                    color.save(update_fields=["position"])
-
-                action = "CREATE" if created_c else "UPDATE"
-                self.stdout.write(f"  {action}: [{section_key}] {group.name} / {color.name}  ({len(images)} images)")
-
-                if clear and not dry:
-                    color.images.all().delete()
-
-                # Import des images
-                for idx, img_path in enumerate(images):
-                    is_presentation = (idx == 0)
-                    if dry:
-                        self.stdout.write(f"     - {'[P] ' if is_presentation else ''}{img_path.name}")
-                        continue
-
-                    with img_path.open("rb") as f:
-                        img = ColorImage(
-                            color=color,
-                            is_presentation=is_presentation,
-                            position=idx + 1,
-                            alt=f"{color.name} – {group.name}",
-                        )
-                        # Important: donner un nom stable au fichier (gardera le nom d'origine)
-                        img.image.save(img_path.name, File(f), save=True)
-
-                summary.append((section_key, group.name, color.name, len(images)))
+
+        stats, timings = importer.stats, importer.timings
+        files = sum(len(leaf.files) for leaf in leaves)
+        self.stdout.write(
+            f"\n{len(leaves)} couleur(s), {files} fichier(s) : {stats['added']} ajout(s), "
+            f"{stats['updated']} remplacement(s), {stats['removed']} suppression(s), "
+            f"{stats['unchanged']} inchangé(s), {stats['adopted']} rattachée(s), "
+            f"{stats['failed']} sans déclinaisons"
+        )
+        total = timings["total"] or 1e-9
+        self.stdout.write(
+            f"Temps : scan {timings['scan']:.2f}s · hash {timings['hash']:.2f}s · "
+            f"copie {timings['copy']:.2f}s · décodage {timings['decode']:.2f}s "
+            f"(cumulés sur {importer.jobs} processus) · base {timings['db']:.2f}s · "
+            f"total {timings['total']:.2f}s ({files / total:.1f} fichiers/s)"
+        )
 
         if dry:
             self.stdout.write(self.style.NOTICE("\nDry-run terminé. Rien n'a été écrit en base."))
         else:
             self.stdout.write(self.style.SUCCESS("\nImport terminé avec succès."))
+
+    def _watch(self, watcher, index, base, opts):
+        debounce = max(0.1, opts.get("debounce") or 0)
+        mode = "polling" if isinstance(watcher, PollingWatcher) else "inotify"
+        self.stdout.write(f"\nSurveillance de {base} ({mode}, debounce {debounce:g}s). Ctrl-C pour arrêter.")
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        pending, last_event = set(), 0.0
+        retry, retry_removed = set(), set()
+        while not self._stopping:
+            touched = watcher.changes(timeout=min(debounce, 1.0))
+            if touched:
+                pending |= touched
+                last_event = time.monotonic()
+            elif pending and time.monotonic() - last_event >= debounce:
+                # lot précédent en échec (fichier en cours de copie…) : repris avec celui-ci
+                batch, pending = pending | retry, set()
+                sections, dirty, removed = index.update(batch)
+                removed |= retry_removed
+                sections |= {rel.split("/", 1)[0] for rel in removed}
+                if not sections or self._sync(index, base, sections, dirty, removed, opts):
+                    retry, retry_removed = set(), set()
+                else:
+                    retry, retry_removed = batch, removed
+
+    def _sync(self, index, base, sections, dirty, removed, opts) -> bool:
+        close_old_connections()  # processus de longue durée
+        importer = Importer(
+            base, self._log, jobs=opts.get("jobs") or 1, incremental=True,
+            chunk_size=opts.get("chunk") or CHUNK_LEAVES,
+        )
+        try:
+            synced = importer.sync({base / key: index.leaves(key) for key in sections}, dirty, removed)
+        except (ImportChunkError, OSError, DatabaseError) as e:
+            self.stderr.write(f"  synchronisation en échec ({e}) : nouvel essai au prochain changement")
+            return False
+        stats = importer.stats
+        self.stdout.write(
+            f"{len(synced)} leaf(s) synchronisé(s), {len(removed)} retiré(s) : "
+            f"{stats['added']} ajout(s), {stats['updated']} remplacement(s), "
+            f"{stats['removed']} suppression(s) en {importer.timings['total']:.2f}s"
+        )
+        return True
+
+    def _stop(self, signum, frame):
+        if not self._stopping:
+            self.stdout.write("Arrêt demandé.")
+        self._stopping = True
+
+    def _log(self, message, style=None):
+        self.stdout.write(getattr(self.style, style)(message) if style else message)
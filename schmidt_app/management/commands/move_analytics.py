@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Déplace les statistiques déjà enregistrées (UsageSession, ClickEvent) de la
+base "default" vers la base "analytics" (routers.py). À lancer une fois,
+après `migrate --database=analytics` :
+
+    python manage.py move_analytics          # copie (relançable sans doublon)
+    python manage.py move_analytics --drop   # copie puis supprime les anciennes tables
+
+La colonne color_id de l'ancienne table (clé étrangère) est reprise telle quelle.
+Seules les colonnes présentes dans l'ancienne table sont lues (schéma
+antérieur : ended_at_client, pas de duration…) ; les champs absents prennent
+leur valeur par défaut (duration : compléter ensuite avec close_sessions).
+"""
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from schmidt_app.models import ClickEvent, UsageSession
+from schmidt_app.routers import analytics_db
+
+
+class Command(BaseCommand):
+    help = "Copie UsageSession / ClickEvent de la base default vers la base analytics"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=2000, help="Lignes par insertion (défaut : 2000)")
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Supprime les tables de la base default une fois la copie faite",
+        )
+
+    def handle(self, *args, **opts):
+        target = analytics_db()
+        if target == "default":
+            raise CommandError('Pas de base "analytics" dans settings.DATABASES')
+        source = connections["default"]
+        tables = set(source.introspection.table_names())
+
+        # sessions d'abord : ClickEvent.session les référence
+        for model in (UsageSession, ClickEvent):
+            table = model._meta.db_table
+            if table not in tables:
+                self.stdout.write(f"{table} : absente de la base default, rien à copier.")
+                continue
+            with source.cursor() as cursor:
+                present = {col.name for col in source.introspection.get_table_description(cursor, table)}
+            fields = [f.attname for f in model._meta.concrete_fields if f.column in present]
+            rows = (
+                model.objects.using("default").order_by("pk").values(*fields)
+                .iterator(chunk_size=opts["batch"])
+            )
+            copied = 0
+            while batch := list(islice(rows, opts["batch"])):
+                with transaction.atomic(using=target):
+                    model.objects.using(target).bulk_create([model(**row) for row in batch], ignore_conflicts=True)
+                copied += len(batch)
+            self.stdout.write(f"{table} : {copied} ligne(s) copiée(s).")
+
+        if opts["drop"]:
+            with source.cursor() as cursor:
+                for model in (ClickEvent, UsageSession):
+                    if model._meta.db_table in tables:
+                        cursor.execute(f"DROP TABLE {source.ops.quote_name(model._meta.db_table)}")
+            self.stdout.write("Anciennes tables supprimées de la base default.")
+        self.stdout.write(self.style.SUCCESS("Statistiques dans la base analytics."))
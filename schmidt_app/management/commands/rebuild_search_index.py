@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+Reconstruit l'index FTS5 de /api/search/ (schmidt_app/search.py).
+Normalement inutile : l'index est créé par les migrations puis tenu à jour
+par les signaux. Utile après des écritures faites hors ORM (SQL brut, .update()).
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from schmidt_app import search
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte du catalogue"
+
+    @transaction.atomic
+    def handle(self, *args, **opts):
+        if not search.available():
+            self.stdout.write(self.style.WARNING("FTS5 indisponible : la recherche utilise icontains."))
+            return
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS("Index de recherche reconstruit."))
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+Met à jour les agrégats quotidiens des statistiques (schmidt_app/rollups.py) :
+seuls les clics postérieurs au dernier passage sont lus.
+
+    python manage.py rollup_analytics    # à lancer en cron, ex. toutes les 5 min
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from schmidt_app import rollups
+
+
+class Command(BaseCommand):
+    help = "Agrège les nouveaux clics et sessions par jour"
+
+    def handle(self, *args, **opts):
+        try:
+            done = rollups.run()
+        except rollups.RollupConflict as e:
+            raise CommandError(f"{e} : un autre rollup_analytics tourne déjà ?")
+        self.stdout.write(self.style.SUCCESS(
+            f"{done['events']} clic(s) agrégé(s), {done['days']} jour(s) de sessions recalculé(s)."
+        ))
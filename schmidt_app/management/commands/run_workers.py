@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Exécute les tâches de fond (schmidt_app/jobs.py) dans un pool de processus.
+
+    python manage.py run_workers --processes 4
+    python manage.py run_workers --once        # vide la file puis s'arrête
+
+Le processus principal réclame les jobs en base et ne confie aux workers
+que leur id : chaque worker ouvre sa propre connexion. SIGTERM / Ctrl-C :
+plus de nouveaux jobs, on attend la fin de ceux en cours.
+"""
+import os
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from schmidt_app import jobs
+
+REQUEUE_EVERY = 60  # secondes entre deux recherches de jobs abandonnés
+
+
+class Command(BaseCommand):
+    help = "Exécute les tâches de fond (images…) dans un pool de processus"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count() or 2,
+            help="Nombre de processus workers (défaut : nombre de CPU)",
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=2.0,
+            help="Intervalle (s) d'interrogation de la file quand elle est vide",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Traite les jobs prêts puis s'arrête",
+        )
+
+    def handle(self, *args, **opts):
+        processes = max(1, opts["processes"])
+        poll = max(0.1, opts["poll"])
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        requeued = jobs.requeue_stale()
+        if requeued:
+            self.stdout.write(f"{requeued} job(s) abandonné(s) remis en file")
+        self.stdout.write(f"run_workers : {processes} processus")
+
+        connections.close_all()  # rien d'ouvert au moment du fork
+        pool = ProcessPoolExecutor(max_workers=processes, initializer=jobs.init_worker)
+        in_flight = {}
+        done_count = failed_count = 0
+        last_requeue = time.monotonic()
+        try:
+            while True:
+                claimed = []
+                if not self._stopping and len(in_flight) < processes:
+                    claimed = jobs.claim(processes - len(in_flight))
+                    for job_id in claimed:
+                        in_flight[pool.submit(jobs.execute, job_id)] = job_id
+
+                if not in_flight:
+                    if self._stopping or (opts["once"] and not claimed):
+                        break
+                    time.sleep(poll)
+                else:
+                    finished, _ = wait(in_flight, timeout=poll, return_when=FIRST_COMPLETED)
+                    interrupted = []
+                    for future in finished:
+                        job_id = in_flight.pop(future)
+                        try:
+                            ok = future.result()
+                        except BrokenProcessPool:
+                            interrupted.append(job_id)
+                            continue
+                        done_count += ok
+                        failed_count += not ok
+                    if interrupted:
+                        # un worker a été tué (OOM…) : tout le pool est inutilisable
+                        interrupted += in_flight.values()
+                        in_flight.clear()
+                        jobs.release(interrupted)
+                        self.stderr.write(f"  pool interrompu, {len(interrupted)} job(s) remis en file")
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        pool = ProcessPoolExecutor(max_workers=processes, initializer=jobs.init_worker)
+
+                if time.monotonic() - last_requeue > REQUEUE_EVERY:
+                    jobs.requeue_stale()
+                    last_requeue = time.monotonic()
+        finally:
+            pool.shutdown(wait=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{done_count} job(s) terminé(s), {failed_count} en échec (réessayés ou abandonnés)."
+        ))
+
+    def _stop(self, signum, frame):
+        if not self._stopping:
+            self.stdout.write("Arrêt demandé : fin des jobs en cours…")
+        self._stopping = True
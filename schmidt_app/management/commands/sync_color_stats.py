@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+Recalcule les champs dénormalisés Color.presentation_image / Color.gallery_count
+pour toutes les couleurs. La migration qui les ajoute les remplit et les
+signaux de ColorImage les tiennent à jour : utile seulement après des
+écritures qui contournent les signaux (SQL direct, .update() en masse).
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from schmidt_app.catalog import bump_revision
+from schmidt_app.models import Color
+
+
+class Command(BaseCommand):
+    help = "Recalcule presentation_image / gallery_count de chaque couleur"
+
+    @transaction.atomic
+    def handle(self, *args, **opts):
+        changed = Color.refresh_image_stats_bulk()
+        if changed:
+            bump_revision()
+        self.stdout.write(self.style.SUCCESS(f"{changed} couleur(s) mise(s) à jour."))
@@ -0,0 +1,127 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:30
+
+import django.db.models.deletion
+import django.db.models.functions.text
+import schmidt_app.models
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColorGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=150)),
+                ('slug', models.SlugField(blank=True, max_length=160, unique=True)),
+                ('position', models.PositiveIntegerField(db_index=True, default=0)),
+                ('section', models.CharField(choices=[('facades', 'Façades'), ('plans', 'Plans de travail'), ('espaces', 'Espaces de la maison'), ('ambiances', 'Ambiances')], db_index=True, default='facades', max_length=20)),
+            ],
+            options={
+                'ordering': ['section', 'position', 'name'],
+                'indexes': [models.Index(fields=['section'], name='schmidt_app_section_18707f_idx'), models.Index(fields=['slug'], name='schmidt_app_slug_5037d7_idx'), models.Index(fields=['position'], name='schmidt_app_positio_3d1e29_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Color',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=150)),
+                ('slug', models.SlugField(blank=True, max_length=160)),
+                ('position', models.PositiveIntegerField(db_index=True, default=0)),
+                ('clicks', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='colors', to='schmidt_app.colorgroup')),
+            ],
+            options={
+                'ordering': ['group__position', 'position', 'name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ColorImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to=schmidt_app.models.color_image_path)),
+                ('file_url', models.URLField(blank=True, editable=False, max_length=500)),
+                ('is_presentation', models.BooleanField(default=False)),
+                ('position', models.PositiveIntegerField(db_index=True, default=0)),
+                ('alt', models.CharField(blank=True, max_length=255)),
+                ('color', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='schmidt_app.color')),
+            ],
+            options={
+                'ordering': ['position', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UsageSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('started_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('ended_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('ended_at_client', models.DateTimeField(blank=True, null=True)),
+                ('idle_ms', models.PositiveIntegerField(default=0)),
+                ('clicks_count', models.PositiveIntegerField(default=0)),
+                ('client_id', models.CharField(blank=True, max_length=64)),
+                ('user_agent', models.CharField(blank=True, max_length=255)),
+                ('remote_addr', models.GenericIPAddressField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['started_at'], name='schmidt_app_started_e9255e_idx'), models.Index(fields=['ended_at'], name='schmidt_app_ended_a_823b67_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClickEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('section', models.CharField(choices=[('facades', 'Façades'), ('plans', 'Plans de travail'), ('espaces', 'Espaces de la maison'), ('ambiances', 'Ambiances')], max_length=20)),
+                ('action', models.CharField(max_length=32)),
+                ('meta', models.JSONField(blank=True, default=dict)),
+                ('color', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='schmidt_app.color')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='schmidt_app.usagesession')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='color',
+            index=models.Index(fields=['group', 'position'], name='schmidt_app_group_i_9524bb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='color',
+            index=models.Index(fields=['slug'], name='schmidt_app_slug_024c38_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='color',
+            index=models.Index(fields=['position'], name='schmidt_app_positio_054811_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='color',
+            constraint=models.UniqueConstraint(models.F('group'), django.db.models.functions.text.Lower('name'), name='uniq_color_name_ci_per_group'),
+        ),
+        migrations.AddConstraint(
+            model_name='color',
+            constraint=models.UniqueConstraint(models.F('group'), models.F('slug'), name='uniq_color_slug_per_group'),
+        ),
+        migrations.AddIndex(
+            model_name='colorimage',
+            index=models.Index(fields=['color', 'position', 'id'], name='schmidt_app_color_i_fb18c3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='colorimage',
+            index=models.Index(fields=['position'], name='schmidt_app_positio_aad503_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clickevent',
+            index=models.Index(fields=['created_at'], name='schmidt_app_created_a18296_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clickevent',
+            index=models.Index(fields=['section'], name='schmidt_app_section_73ca5f_idx'),
+        ),
+    ]
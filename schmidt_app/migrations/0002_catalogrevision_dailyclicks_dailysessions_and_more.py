@@ -0,0 +1,209 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_color_image_stats(apps, schema_editor):
+    # même calcul que Color.refresh_image_stats_bulk (méthodes absentes des modèles historiques)
+    Color = apps.get_model('schmidt_app', 'Color')
+    ColorImage = apps.get_model('schmidt_app', 'ColorImage')
+    db = schema_editor.connection.alias
+    images = ColorImage.objects.using(db)
+    presentations = {}
+    for color_id, image_id in (
+        images.filter(is_presentation=True).order_by('position', 'id').values_list('color_id', 'id')
+    ):
+        presentations.setdefault(color_id, image_id)
+    counts = dict(
+        images.filter(is_presentation=False)
+        .values('color_id').annotate(n=models.Count('id')).values_list('color_id', 'n')
+    )
+    changed = []
+    for color in Color.objects.using(db).only('id'):
+        color.presentation_image_id = presentations.get(color.id)
+        color.gallery_count = counts.get(color.id, 0)
+        if color.presentation_image_id or color.gallery_count:
+            changed.append(color)
+    Color.objects.using(db).bulk_update(changed, ['presentation_image', 'gallery_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schmidt_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyClicks',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('section', models.CharField(choices=[('facades', 'Façades'), ('plans', 'Plans de travail'), ('espaces', 'Espaces de la maison'), ('ambiances', 'Ambiances')], max_length=20)),
+                ('color_id', models.PositiveIntegerField(default=0)),
+                ('action', models.CharField(max_length=32)),
+                ('clicks', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySessions',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('closed', models.PositiveIntegerField(default=0)),
+                ('duration_total', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourlyClicks',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('section', models.CharField(choices=[('facades', 'Façades'), ('plans', 'Plans de travail'), ('espaces', 'Espaces de la maison'), ('ambiances', 'Ambiances')], max_length=20)),
+                ('clicks', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourlySessions',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(unique=True)),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('closed', models.PositiveIntegerField(default=0)),
+                ('duration_total', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ImportedFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500, unique=True)),
+                ('leaf', models.CharField(db_index=True, max_length=500)),
+                ('size', models.PositiveBigIntegerField()),
+                ('mtime_ns', models.BigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('imported_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('done', 'Terminée'), ('failed', 'Échec')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_event_id', models.PositiveBigIntegerField(default=0)),
+                ('sessions_from', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        # ClickEvent.color (clé étrangère) -> color_id (entier) : même colonne
+        # "color_id", valeurs conservées ; seule la contrainte de clé disparaît.
+        migrations.AlterField(
+            model_name='clickevent',
+            name='color',
+            field=models.PositiveIntegerField(blank=True, db_column='color_id', db_index=True, null=True),
+        ),
+        migrations.RenameField(
+            model_name='clickevent',
+            old_name='color',
+            new_name='color_id',
+        ),
+        migrations.AlterField(
+            model_name='clickevent',
+            name='color_id',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='color',
+            name='gallery_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='color',
+            name='presentation_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='schmidt_app.colorimage'),
+        ),
+        migrations.AddField(
+            model_name='colorimage',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='colorimage',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='colorimage',
+            name='status',
+            field=models.CharField(choices=[('pending', 'En attente'), ('ready', 'Prête'), ('failed', 'Échec')], default='ready', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='colorimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='colorimage',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='usagesession',
+            name='duration',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='usagesession',
+            index=models.Index(fields=['duration'], name='schmidt_app_duratio_cdc590_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyclicks',
+            index=models.Index(fields=['section', 'day'], name='schmidt_app_section_66d6e7_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyclicks',
+            constraint=models.UniqueConstraint(fields=('day', 'section', 'color_id', 'action'), name='uniq_daily_clicks'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlyclicks',
+            constraint=models.UniqueConstraint(fields=('hour', 'section'), name='uniq_hourly_clicks'),
+        ),
+        migrations.AddField(
+            model_name='importedfile',
+            name='image',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='import_source', to='schmidt_app.colorimage'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'run_after', 'id'], name='schmidt_app_status_28dde9_idx'),
+        ),
+        migrations.RunPython(
+            fill_color_image_stats, migrations.RunPython.noop, hints={'model_name': 'color'},
+        ),
+    ]
@@ -0,0 +1,66 @@
+from django.db import OperationalError, migrations
+
+TABLE = 'schmidt_app_search'
+SECTION_LABELS = {
+    'facades': 'Façades',
+    'plans': 'Plans de travail',
+    'espaces': 'Espaces de la maison',
+    'ambiances': 'Ambiances',
+}
+
+
+def create_search_index(apps, schema_editor):
+    """Table FTS5 de search.py, remplie avec le catalogue existant (ignorée sans FTS5)."""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        # IF NOT EXISTS : base où l'ancienne version de search.py l'avait créée à la volée
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5('
+            'kind UNINDEXED, section UNINDEXED, name, group_name, section_label, alts, '
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    except OperationalError:
+        return  # SQLite compilé sans FTS5 : search.py retombe sur icontains
+
+    Color = apps.get_model('schmidt_app', 'Color')
+    ColorGroup = apps.get_model('schmidt_app', 'ColorGroup')
+    ColorImage = apps.get_model('schmidt_app', 'ColorImage')
+    db = connection.alias
+    alts = {}
+    for color_id, alt in ColorImage.objects.using(db).exclude(alt='').values_list('color_id', 'alt'):
+        alts.setdefault(color_id, set()).add(alt)
+    rows = []
+    for color_id, name, section, group_name in Color.objects.using(db).values_list(
+        'id', 'name', 'group__section', 'group__name',
+    ):
+        rows.append((
+            2 * color_id, 'color', section or '', name, group_name or '',
+            SECTION_LABELS.get(section, ''), ' '.join(sorted(alts.get(color_id, ()))),
+        ))
+    for group_id, name, section in ColorGroup.objects.using(db).values_list('id', 'name', 'section'):
+        rows.append((2 * group_id + 1, 'group', section, name, name, SECTION_LABELS.get(section, ''), ''))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, kind, section, name, group_name, section_label, alts) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+            rows,
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schmidt_app', '0002_catalogrevision_dailyclicks_dailysessions_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index, hints={'model_name': 'color'}),
+    ]
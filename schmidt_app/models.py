@@ -1,12 +1,15 @@
 # schmidt_app/models.py
 import datetime
 
-from django.db import models
+from django.db import models, transaction
 from django.db.models import UniqueConstraint
 from django.db.models.functions import Lower
+from django.utils import timezone
 from django.utils.text import slugify
 from django.core.files.storage import default_storage
 
+from . import blobs
+
 
 class Section(models.TextChoices):
     FACADES = 'facades', 'Façades'
@@ -16,52 +19,41 @@ class Section(models.TextChoices):
 
 
 # ---------- Utils ----------
-def _uniqueify_slug_for_group(base_slug: str, group: "ColorGroup", instance_pk=None) -> str:
+def slug_matches(slug: str, base: str) -> bool:
+    """slug est `base` ou `base-N`."""
+    return slug == base or (slug.startswith(f"{base}-") and slug[len(base) + 1:].isdigit())
+
+
+class SlugAllocator:
     """
-    Retourne un slug unique dans le groupe donné en évitant les collisions
-    avec Color(slug) existants du même group.
+    Slugs uniques attribués en mémoire à partir des slugs déjà pris :
+    base, base-2, base-3… (le plus petit libre). Sert aux imports en lot
+    (une seule lecture des slugs existants, aucune requête par candidat).
     """
-    slug = base_slug or "item"
-    Model = Color
-    qs = Model.objects.filter(group=group, slug=slug)
-    if instance_pk:
-        qs = qs.exclude(pk=instance_pk)
-    if not qs.exists():
-        return slug
 
-    i = 2
-    while True:
-        candidate = f"{slug}-{i}"
-        qs = Model.objects.filter(group=group, slug=candidate)
-        if instance_pk:
-            qs = qs.exclude(pk=instance_pk)
-        if not qs.exists():
-            return candidate
-        i += 1
+    def __init__(self, taken=()):
+        self.taken = set(taken)
+        self._next = {}  # base -> prochain suffixe à essayer
+
+    def allocate(self, base: str) -> str:
+        slug = base
+        if slug in self.taken:
+            i = self._next.get(base, 2)
+            while f"{base}-{i}" in self.taken:
+                i += 1
+            slug = f"{base}-{i}"
+            self._next[base] = i + 1
+        self.taken.add(slug)
+        return slug
 
 
-def _uniqueify_slug_for_group_model(base_slug: str, section_slug_model: "ColorGroup", instance_pk=None) -> str:
-    """
-    Pour ColorGroup : unique global (champ slug unique=True).
-    Suffixe en cas de collision globale.
-    """
-    slug = base_slug or "groupe"
-    Model = ColorGroup
-    qs = Model.objects.filter(slug=slug)
+def unique_slug(queryset, base: str, instance_pk=None) -> str:
+    """Slug libre dans `queryset` (portée d'unicité) en une requête sur le préfixe."""
+    qs = queryset.filter(slug__startswith=base)
     if instance_pk:
         qs = qs.exclude(pk=instance_pk)
-    if not qs.exists():
-        return slug
-
-    i = 2
-    while True:
-        candidate = f"{slug}-{i}"
-        qs = Model.objects.filter(slug=candidate)
-        if instance_pk:
-            qs = qs.exclude(pk=instance_pk)
-        if not qs.exists():
-            return candidate
-        i += 1
+    taken = [slug for slug in qs.values_list("slug", flat=True) if slug_matches(slug, base)]
+    return SlugAllocator(taken).allocate(base)
 
 
 # ---------- Modèles ----------
@@ -88,9 +80,14 @@ class ColorGroup(models.Model):
         ]
 
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
         base = slugify(self.name) or "groupe"
-        # garantir unicité globale du slug avec suffixe si collision
-        self.slug = _uniqueify_slug_for_group_model(base, self, instance_pk=self.pk)
+        # nom inchangé (slug déjà dérivé de ce nom) ou slug non sauvegardé : rien à recalculer
+        if not (self.pk and slug_matches(self.slug, base)) and (
+            update_fields is None or {"name", "slug"} & set(update_fields)
+        ):
+            # garantir unicité globale du slug avec suffixe si collision
+            self.slug = unique_slug(ColorGroup.objects.all(), base, instance_pk=self.pk)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -99,6 +96,7 @@ class ColorGroup(models.Model):
 
 def color_image_path(instance, filename):
     # Note : si le slug d'une couleur change, les anciens fichiers restent à l'ancien chemin
+    # (mode MEDIA_CONTENT_ADDRESSED : chemin blobs/… fixé par ColorImage.save, voir blobs.py)
     return f"colors/{instance.color.slug}/gallery/{filename}"
 
 
@@ -116,6 +114,18 @@ class Color(models.Model):
     position = models.PositiveIntegerField(default=0, db_index=True)
     clicks = models.PositiveIntegerField(default=0)
 
+    # Champs dénormalisés, tenus à jour par les signaux de ColorImage
+    # (voir signals.py) : évitent 2 requêtes par couleur à la sérialisation.
+    presentation_image = models.ForeignKey(
+        "ColorImage",
+        related_name="+",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    gallery_count = models.PositiveIntegerField(default=0, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -140,36 +150,86 @@ class Color(models.Model):
             models.Index(fields=["position"]),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # groupe au chargement : le slug n'est revérifié que si la couleur change de groupe
+        instance._loaded_group_id = instance.__dict__.get("group_id")
+        return instance
+
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
         # slug de base depuis le nom (peut rester vide si name vide ; on gère ensuite)
         base = slugify(self.name) or "couleur"
-        # si pas de group (nullable), on suffixe quand même dans le "pseudo-groupe None"
-        if self.group_id:
-            self.slug = _uniqueify_slug_for_group(base, self.group, instance_pk=self.pk)
-        else:
-            # unicité logique pour group=None : on évite les collisions entre couleurs sans groupe
-            existing = Color.objects.filter(group__isnull=True, slug=base)
-            if self.pk:
-                existing = existing.exclude(pk=self.pk)
-            if not existing.exists():
-                self.slug = base
-            else:
-                i = 2
-                while True:
-                    candidate = f"{base}-{i}"
-                    e2 = Color.objects.filter(group__isnull=True, slug=candidate)
-                    if self.pk:
-                        e2 = e2.exclude(pk=self.pk)
-                    if not e2.exists():
-                        self.slug = candidate
-                        break
-                    i += 1
-
+        unchanged = (
+            self.pk
+            and slug_matches(self.slug, base)
+            and getattr(self, "_loaded_group_id", None) == self.group_id
+        )
+        if not unchanged and (update_fields is None or {"name", "slug", "group", "group_id"} & set(update_fields)):
+            # unicité par groupe ; si pas de group (nullable), dans le "pseudo-groupe None"
+            self.slug = unique_slug(Color.objects.filter(group_id=self.group_id), base, instance_pk=self.pk)
         super().save(*args, **kwargs)
+        self._loaded_group_id = self.group_id
 
     @property
     def presentation(self):
-        return self.images.filter(is_presentation=True).first()
+        return self.presentation_image
+
+    def refresh_image_stats(self, commit=True):
+        """
+        Recalcule presentation_image / gallery_count depuis les images.
+        commit=True : écrit via .update() (ne redéclenche pas save()).
+        """
+        self.presentation_image_id = (
+            self.images.filter(is_presentation=True)
+            .order_by("position", "id")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        self.gallery_count = self.images.filter(is_presentation=False).count()
+        if commit and self.pk:
+            Color.objects.filter(pk=self.pk).update(
+                presentation_image_id=self.presentation_image_id,
+                gallery_count=self.gallery_count,
+            )
+
+    @classmethod
+    def refresh_image_stats_bulk(cls, color_ids=None) -> int:
+        """
+        refresh_image_stats() pour un ensemble de couleurs (None = toutes) :
+        2 lectures + un bulk_update des seules couleurs modifiées.
+        Retourne le nombre de couleurs mises à jour.
+        """
+        images = ColorImage.objects.all()
+        colors = cls.objects.only("id", "presentation_image_id", "gallery_count")
+        if color_ids is not None:
+            color_ids = list(color_ids)
+            images = images.filter(color_id__in=color_ids)
+            colors = colors.filter(pk__in=color_ids)
+
+        presentations = {}
+        for color_id, image_id in (
+            images.filter(is_presentation=True).order_by("position", "id").values_list("color_id", "id")
+        ):
+            presentations.setdefault(color_id, image_id)
+        counts = dict(
+            images.filter(is_presentation=False)
+            .values("color_id")
+            .annotate(n=models.Count("id"))
+            .values_list("color_id", "n")
+        )
+
+        changed = []
+        for color in colors:
+            pres = presentations.get(color.id)
+            count = counts.get(color.id, 0)
+            if color.presentation_image_id != pres or color.gallery_count != count:
+                color.presentation_image_id = pres
+                color.gallery_count = count
+                changed.append(color)
+        cls.objects.bulk_update(changed, ["presentation_image", "gallery_count"], batch_size=500)
+        return len(changed)
 
     def __str__(self):
         # Affichage utile en admin
@@ -178,6 +238,13 @@ class Color(models.Model):
         return self.name
 
 
+class ImageStatus(models.TextChoices):
+    # traitement de fond (jobs.py) : déclinaisons + dimensions
+    PENDING = 'pending', 'En attente'
+    READY = 'ready', 'Prête'
+    FAILED = 'failed', 'Échec'
+
+
 class ColorImage(models.Model):
     color = models.ForeignKey(Color, related_name="images", on_delete=models.CASCADE)
     image = models.ImageField(upload_to=color_image_path)
@@ -186,6 +253,15 @@ class ColorImage(models.Model):
     is_presentation = models.BooleanField(default=False)
     position = models.PositiveIntegerField(default=0, db_index=True)
     alt = models.CharField(max_length=255, blank=True)
+    # dimensions de l'original + déclinaisons redimensionnées (voir imaging.py)
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+    status = models.CharField(
+        max_length=10, choices=ImageStatus.choices, default=ImageStatus.READY, editable=False,
+    )
+    # hash du contenu (mode MEDIA_CONTENT_ADDRESSED) : fichier partagé entre images identiques
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
 
     class Meta:
         ordering = ["position", "id"]
@@ -209,11 +285,86 @@ class ColorImage(models.Model):
                 type(self).objects.filter(pk=self.pk).update(file_url=self.file_url)
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
+        # on retire l'ancienne présentation AVANT l'écriture pour que les
+        # signaux post_save (stats dénormalisées de Color) voient l'état final
         if self.is_presentation:
-            ColorImage.objects.filter(color=self.color).exclude(pk=self.pk).update(is_presentation=False)
+            others = ColorImage.objects.filter(color_id=self.color_id, is_presentation=True)
+            if self.pk:
+                others = others.exclude(pk=self.pk)
+            others.update(is_presentation=False)
+        if blobs.enabled() and self.image and not self.image._committed:
+            # nouveau fichier : rangé sous son hash (réutilisé s'il existe déjà) ;
+            # stockage et insertion sous le même verrou que imaging.release_file
+            with transaction.atomic():
+                self.image.name, self.sha256 = blobs.store(self.image.file, self.image.name)
+                self.image._committed = True
+                super().save(*args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
         self.update_file_url(commit=True)
 
+class ImportedFile(models.Model):
+    """
+    Manifeste de `import_couleurs --incremental` : un fichier source par ligne.
+    Un fichier dont taille et mtime n'ont pas bougé n'est pas relu ; s'ils ont
+    changé, le hash décide si l'image doit être remplacée.
+    """
+    path = models.CharField(max_length=500, unique=True)  # relatif à --base, séparateur /
+    leaf = models.CharField(max_length=500, db_index=True)
+    size = models.PositiveBigIntegerField()
+    mtime_ns = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    image = models.OneToOneField(ColorImage, related_name="import_source", on_delete=models.CASCADE)
+    imported_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.path
+
+
+class CatalogRevision(models.Model):
+    """
+    Compteur de révision du catalogue (une seule ligne, pk=1).
+    Incrémenté à chaque écriture sur ColorGroup / Color / ColorImage :
+    chaque worker compare sa révision en mémoire à celle de la base
+    et reconstruit ses données dérivées (snapshot, bundle…) si besoin.
+    """
+    value = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"CatalogRevision({self.value})"
+
+
+# ---------- Tâches de fond (jobs.py / manage.py run_workers) ----------
+class JobStatus(models.TextChoices):
+    PENDING = 'pending', 'En attente'
+    RUNNING = 'running', 'En cours'
+    DONE = 'done', 'Terminée'
+    FAILED = 'failed', 'Échec'
+
+
+class Job(models.Model):
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=JobStatus.choices, default=JobStatus.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # réclamation : WHERE status='pending' AND run_after <= now ORDER BY id
+            models.Index(fields=["status", "run_after", "id"]),
+        ]
+
+    def __str__(self):
+        return f"Job({self.kind} #{self.pk}, {self.status})"
+
+
 # ---------- Performance / Analytics ----------
 import uuid
 from django.utils import timezone
@@ -227,6 +378,9 @@ class UsageSession(models.Model):
     - ended_at_client : fin côté client (= début d'inactivité constatée par le front).
     - idle_ms : temps d'inactivité cumulé à retrancher (en millisecondes).
     La durée effective prend le MIN(ended_at, ended_at_client) et soustrait idle_ms.
+    - duration : cette durée figée en base à la fin de session (perf_session_stop,
+      ou la commande close_sessions pour les sessions abandonnées) ; perf_stats
+      l'agrège en SQL.
     """
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -235,6 +389,7 @@ class UsageSession(models.Model):
     ended_at = models.DateTimeField(null=True, blank=True, db_index=True)
     ended_at_client = models.DateTimeField(null=True, blank=True)
     idle_ms = models.PositiveIntegerField(default=0)
+    duration = models.PositiveIntegerField(null=True, blank=True)  # secondes, None tant qu'ouverte
 
     clicks_count = models.PositiveIntegerField(default=0)
     client_id = models.CharField(max_length=64, blank=True)  # id anonyme (localStorage)
@@ -245,6 +400,8 @@ class UsageSession(models.Model):
         indexes = [
             models.Index(fields=["started_at"]),
             models.Index(fields=["ended_at"]),
+            # couvrant : SUM/COUNT de perf_stats sans lire les lignes
+            models.Index(fields=["duration"]),
         ]
 
     def __str__(self):
@@ -265,6 +422,12 @@ class UsageSession(models.Model):
 
     @property
     def duration_seconds(self) -> int:
+        """Durée figée si la session est close, sinon mesurée maintenant."""
+        if self.duration is not None:
+            return self.duration
+        return self.measure_duration()
+
+    def measure_duration(self) -> int:
         """
         Durée effective en secondes :
           max( (effective_end - started_at) - idle_ms, 0 )
@@ -277,11 +440,14 @@ class UsageSession(models.Model):
 class ClickEvent(models.Model):
     """
     Log léger de chaque clic pour les stats fines (catégorie, élément, action).
+    Base "analytics" (routers.py) : color_id est un simple entier, pas une
+    clé étrangère vers le catalogue (autre base) ; il peut désigner une
+    couleur supprimée depuis.
     """
     session = models.ForeignKey(UsageSession, related_name="events", on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     section = models.CharField(max_length=20, choices=Section.choices)
-    color = models.ForeignKey('Color', null=True, blank=True, on_delete=models.SET_NULL)
+    color_id = models.PositiveIntegerField(null=True, blank=True, db_index=True)
     action = models.CharField(max_length=32)  # ex: 'bubble', 'carousel', 'image', 'fullscreen', 'home'
     meta = models.JSONField(default=dict, blank=True)
 
@@ -289,4 +455,70 @@ class ClickEvent(models.Model):
         indexes = [
             models.Index(fields=["created_at"]),
             models.Index(fields=["section"]),
-        ]
\ No newline at end of file
+        ]
+
+# ---------- Agrégats des statistiques (rollups.py / manage.py rollup_analytics) ----------
+class DailyClicks(models.Model):
+    """
+    Clics par jour × section × couleur × action (base "analytics").
+    color_id = 0 : clic sans couleur (0 plutôt que NULL pour l'unicité).
+    """
+    day = models.DateField()
+    section = models.CharField(max_length=20, choices=Section.choices)
+    color_id = models.PositiveIntegerField(default=0)
+    action = models.CharField(max_length=32)
+    clicks = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "section", "color_id", "action"], name="uniq_daily_clicks"),
+        ]
+        indexes = [
+            models.Index(fields=["section", "day"]),
+        ]
+
+
+class DailySessions(models.Model):
+    """
+    Sessions par jour de début (base "analytics") ; duration_total et closed
+    ne portent que sur les sessions closes (durée figée).
+    """
+    day = models.DateField(unique=True)
+    sessions = models.PositiveIntegerField(default=0)
+    closed = models.PositiveIntegerField(default=0)
+    duration_total = models.PositiveBigIntegerField(default=0)
+
+
+class HourlyClicks(models.Model):
+    """Clics par heure × section (base "analytics"), pour les séries horaires."""
+    hour = models.DateTimeField()
+    section = models.CharField(max_length=20, choices=Section.choices)
+    clicks = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["hour", "section"], name="uniq_hourly_clicks"),
+        ]
+
+
+class HourlySessions(models.Model):
+    """Sessions par heure de début (base "analytics"), mêmes règles que DailySessions."""
+    hour = models.DateTimeField(unique=True)
+    sessions = models.PositiveIntegerField(default=0)
+    closed = models.PositiveIntegerField(default=0)
+    duration_total = models.PositiveBigIntegerField(default=0)
+
+
+class RollupState(models.Model):
+    """
+    Filigrane des agrégats (une seule ligne, pk=1) :
+    - last_event_id : dernier ClickEvent déjà compté ;
+    - sessions_from : début de la plus ancienne session encore ouverte au
+      dernier passage ; les jours à partir de celui-ci sont recalculés.
+    """
+    last_event_id = models.PositiveBigIntegerField(default=0)
+    sessions_from = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"RollupState({self.last_event_id})"
@@ -0,0 +1,67 @@
+# schmidt_app/ordering.py
+"""
+Positions espacées (groupes, couleurs, images de galerie).
+
+Les positions sont numérotées de POSITION_GAP en POSITION_GAP : déplacer un
+élément entre deux voisins lui donne la position médiane, donc UNE ligne
+écrite. Quand il n'y a plus de place (voisins consécutifs, égalités, données
+importées 1, 2, 3…), toute la liste est renumérotée par une seule requête
+UPDATE … SET position = CASE id WHEN … END.
+
+Les .update() ne déclenchent pas les signaux : l'appelant fait bump_revision().
+"""
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+
+POSITION_GAP = 1024
+CASE_BATCH = 500  # ids par UPDATE (limite de paramètres SQLite)
+
+
+def next_position(qs, field="position") -> int:
+    """Position après le dernier élément de qs."""
+    last = qs.order_by(f"-{field}").values_list(field, flat=True).first()
+    return (last or 0) + POSITION_GAP
+
+
+def renumber(qs, ordered_ids) -> int:
+    """Positions GAP, 2*GAP, … dans l'ordre de ordered_ids (un UPDATE par CASE_BATCH ids)."""
+    ordered_ids = list(ordered_ids)
+    updated = 0
+    with transaction.atomic():
+        for start in range(0, len(ordered_ids), CASE_BATCH):
+            batch = ordered_ids[start:start + CASE_BATCH]
+            updated += qs.filter(pk__in=batch).update(position=Case(
+                *[When(pk=pk, then=Value((start + i + 1) * POSITION_GAP)) for i, pk in enumerate(batch)],
+                output_field=IntegerField(),
+            ))
+    return updated
+
+
+def move_before(siblings, ordering, item_id, before_id=None) -> int:
+    """
+    Place item_id juste avant before_id (None : en fin de liste) parmi
+    `siblings` (queryset des éléments ordonnés ensemble, item compris),
+    `ordering` : tri complet (position d'abord). Retourne le nombre de
+    lignes écrites : 1, ou la taille de la liste si elle a été renumérotée.
+    """
+    rows = [(pk, pos) for pk, pos in siblings.order_by(*ordering).values_list("pk", "position")
+            if pk != item_id]
+    if before_id is None:
+        index = len(rows)
+    else:
+        index = next((i for i, (pk, _) in enumerate(rows) if pk == before_id), None)
+        if index is None:
+            raise ValueError(f"{before_id} is not a sibling of {item_id}")
+
+    lower = rows[index - 1][1] if index > 0 else 0
+    if index == len(rows):
+        position = lower + POSITION_GAP
+    else:
+        upper = rows[index][1]
+        position = (lower + upper) // 2 if upper - lower >= 2 else None
+
+    if position is not None:
+        return siblings.filter(pk=item_id).update(position=position)
+    ids = [pk for pk, _ in rows]
+    ids.insert(index, item_id)
+    return renumber(siblings, ids)
@@ -0,0 +1,107 @@
+# schmidt_app/pagination.py
+"""
+Pagination par curseur (keyset) et sélection de champs pour les listes JSON.
+
+- ?limit=N       -> N résultats max + "next" (curseur opaque) s'il en reste
+- ?cursor=...    -> reprend après la dernière ligne de la page précédente
+- ?fields=a,b,c  -> ne renvoie (et ne calcule) que ces champs
+
+Le curseur encode les valeurs des clés de tri de la dernière ligne :
+la page suivante est un simple WHERE (k1, k2, ...) > (v1, v2, ...) sur
+un index, sans OFFSET, donc coût constant quelle que soit la page.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise PaginationError("invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise PaginationError("invalid cursor")
+    # valeurs de clés de tri : scalaires JSON uniquement
+    if not all(v is None or isinstance(v, (str, int, float)) for v in values):
+        raise PaginationError("invalid cursor")
+    return values
+
+
+def keyset_after(keys, values) -> Q:
+    """(k1, k2, ...) > (v1, v2, ...) en ordre lexicographique croissant."""
+    condition = Q()
+    for i, key in enumerate(keys):
+        step = Q(**{f"{key}__gt": values[i]})
+        for prev_key, prev_value in zip(keys[:i], values[:i]):
+            step &= Q(**{prev_key: prev_value})
+        condition |= step
+    return condition
+
+
+def page_params(request):
+    """
+    Retourne (limit, cursor). limit=None si ni limit ni cursor ne sont fournis :
+    la liste est alors renvoyée en entier (compatibilité des anciens clients).
+    """
+    raw_limit = request.GET.get("limit")
+    cursor = request.GET.get("cursor") or None
+    if raw_limit is None and cursor is None:
+        return None, None
+    if raw_limit is None:
+        return DEFAULT_LIMIT, cursor
+    try:
+        limit = int(raw_limit)
+    except ValueError:
+        raise PaginationError("limit must be an integer")
+    if limit < 1:
+        raise PaginationError("limit must be positive")
+    return min(limit, MAX_LIMIT), cursor
+
+
+def requested_fields(request, allowed):
+    """Retourne l'ensemble des champs demandés (?fields=) ou None pour tous."""
+    raw = request.GET.get("fields")
+    if not raw:
+        return None
+    fields = {f.strip() for f in raw.split(",") if f.strip()}
+    unknown = fields - set(allowed)
+    if unknown:
+        raise PaginationError(f"unknown fields: {', '.join(sorted(unknown))}")
+    return fields
+
+
+def paginate(qs, keys, limit, cursor=None):
+    """
+    qs doit exposer chaque clé (champ ou annotation) ; tri croissant sur keys,
+    la dernière clé devant être unique (id).
+    Retourne (objets, curseur_suivant|None).
+    """
+    qs = qs.order_by(*keys)
+    if cursor:
+        try:
+            qs = qs.filter(keyset_after(keys, decode_cursor(cursor, len(keys))))
+        except (TypeError, ValueError, ValidationError):
+            # valeur du mauvais type pour la clé (ex. "abc" pour un entier)
+            raise PaginationError("invalid cursor")
+    rows = list(qs[: limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, key) for key in keys)
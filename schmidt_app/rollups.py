@@ -0,0 +1,192 @@
+# schmidt_app/rollups.py
+"""
+Agrégats des statistiques (base "analytics").
+
+    DailyClicks    : clics par jour × section × couleur × action
+    DailySessions  : sessions par jour de début, durée des sessions closes
+    HourlyClicks   : clics par heure × section       (séries horaires)
+    HourlySessions : sessions par heure de début
+
+run() (commande rollup_analytics, à lancer en cron) ne lit que les
+ClickEvent postérieurs au filigrane RollupState.last_event_id, par paquets
+d'ids, et ne recalcule que les jours de sessions qui ont pu changer (depuis
+la plus ancienne session restée ouverte). perf_stats / perf_breakdown avec
+?from=&to= et perf_timeseries lisent ces tables : le coût dépend du nombre
+de jours (ou d'heures), pas du nombre de clics.
+
+Jours en heure locale (TIME_ZONE). Les ids de ClickEvent croissent dans
+l'ordre de validation (SQLite : un seul écrivain à la fois), le filigrane
+ne saute donc aucun clic.
+"""
+from datetime import datetime, time
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from .models import (
+    ClickEvent, DailyClicks, DailySessions, HourlyClicks, HourlySessions, RollupState, UsageSession,
+)
+from .routers import analytics_db
+
+EVENT_BATCH = 50_000  # ids de ClickEvent par transaction
+
+CLICK_KEY = ("day", "section", "color_id", "action")
+HOUR_KEY = ("hour", "section")
+
+
+class RollupConflict(Exception):
+    """Un autre rollup_analytics a avancé le filigrane pendant ce passage."""
+
+
+def state() -> RollupState:
+    return RollupState.objects.get_or_create(pk=1)[0]
+
+
+def run(now=None) -> dict:
+    """Met les agrégats à jour ; retourne {"events": n, "days": n}."""
+    now = now or timezone.now()
+    current = state()
+    return {"events": _roll_events(current), "days": _roll_sessions(current, now)}
+
+
+def _roll_events(current) -> int:
+    db = analytics_db()
+    top = ClickEvent.objects.aggregate(m=Max("pk"))["m"] or 0
+    done = 0
+    while current.last_event_id < top:
+        low, high = current.last_event_id, min(current.last_event_id + EVENT_BATCH, top)
+        events = ClickEvent.objects.filter(pk__gt=low, pk__lte=high)
+        daily = (
+            events.annotate(day=TruncDate("created_at"))
+            .values("day", "section", "color_id", "action")
+            .annotate(n=Count("pk"))
+            .order_by()
+        )
+        hourly = events.annotate(hour=TruncHour("created_at")).values(*HOUR_KEY).annotate(n=Count("pk")).order_by()
+        days = {(r["day"], r["section"], r["color_id"] or 0, r["action"]): r["n"] for r in daily}
+        hours = {(r["hour"], r["section"]): r["n"] for r in hourly}
+        added = sum(days.values())  # avant _add_clicks, qui y cumule les totaux existants
+        with transaction.atomic(using=db):
+            # garde optimiste : deux passages concurrents ne comptent pas deux fois
+            if not RollupState.objects.filter(pk=current.pk, last_event_id=low).update(
+                last_event_id=high, updated_at=timezone.now(),
+            ):
+                raise RollupConflict("filigrane déplacé par un autre passage")
+            _add_clicks(DailyClicks, CLICK_KEY, days)
+            _add_clicks(HourlyClicks, HOUR_KEY, hours)
+        current.last_event_id = high
+        done += added
+    return done
+
+
+def _add_clicks(model, key_fields, totals):
+    """Ajoute {clé: n} aux lignes existantes de model (upsert sur key_fields)."""
+    if not totals:
+        return
+    first = key_fields[0]
+    existing = model.objects.filter(**{f"{first}__in": {key[0] for key in totals}}).values_list(
+        *key_fields, "clicks",
+    )
+    for *key, clicks in existing:
+        key = tuple(key)
+        if key in totals:
+            totals[key] += clicks
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key)), clicks=n) for key, n in totals.items()],
+        update_conflicts=True, unique_fields=list(key_fields), update_fields=["clicks"],
+        batch_size=500,
+    )
+
+
+def _roll_sessions(current, now) -> int:
+    # repère pris AVANT la lecture : une session ouverte ou créée pendant
+    # ce passage sera recomptée au suivant
+    oldest_open = UsageSession.objects.filter(duration__isnull=True).aggregate(m=Min("started_at"))["m"]
+    mark = min(oldest_open, now) if oldest_open else now
+
+    qs = UsageSession.objects.all()
+    since = start = None
+    if current.sessions_from:
+        since = timezone.localtime(current.sessions_from).date()
+        start = timezone.make_aware(datetime.combine(since, time.min))
+        qs = qs.filter(started_at__gte=start)
+    days = _count_sessions(qs, DailySessions, "day", TruncDate("started_at"))
+    hours = _count_sessions(qs, HourlySessions, "hour", TruncHour("started_at"))
+    with transaction.atomic(using=analytics_db()):
+        old_days, old_hours = DailySessions.objects.all(), HourlySessions.objects.all()
+        if since:
+            old_days, old_hours = old_days.filter(day__gte=since), old_hours.filter(hour__gte=start)
+        old_days.delete()
+        old_hours.delete()
+        DailySessions.objects.bulk_create(days, batch_size=500)
+        HourlySessions.objects.bulk_create(hours, batch_size=500)
+        RollupState.objects.filter(pk=current.pk).update(sessions_from=mark, updated_at=timezone.now())
+    current.sessions_from = mark
+    return len(days)
+
+
+def _count_sessions(qs, model, key, trunc) -> list:
+    rows = (
+        qs.annotate(**{key: trunc})
+        .values(key)
+        .annotate(sessions=Count("pk"), closed=Count("duration"), total=Sum("duration"))
+        .order_by()
+    )
+    return [
+        model(**{key: r[key]}, sessions=r["sessions"], closed=r["closed"], duration_total=r["total"] or 0)
+        for r in rows
+    ]
+
+
+# ---------- Lecture (vues perf_*) ----------
+def _between(qs, day_from, day_to):
+    if day_from:
+        qs = qs.filter(day__gte=day_from)
+    if day_to:
+        qs = qs.filter(day__lte=day_to)
+    return qs
+
+
+def sessions_between(day_from=None, day_to=None) -> dict:
+    """{"sessions", "closed", "duration_total"} sur la période (bornes incluses)."""
+    totals = _between(DailySessions.objects, day_from, day_to).aggregate(
+        sessions=Sum("sessions"), closed=Sum("closed"), duration_total=Sum("duration_total"),
+    )
+    return {k: v or 0 for k, v in totals.items()}
+
+
+def clicks_by_section(day_from=None, day_to=None) -> dict:
+    """section -> clics sur la période."""
+    rows = _between(DailyClicks.objects, day_from, day_to).values("section").annotate(n=Sum("clicks")).order_by()
+    return {r["section"]: r["n"] for r in rows}
+
+
+def clicks_by_color(section, day_from=None, day_to=None) -> dict:
+    """color_id -> clics sur la période pour une section (clics sans couleur exclus)."""
+    rows = (
+        _between(DailyClicks.objects.filter(section=section), day_from, day_to)
+        .exclude(color_id=0)
+        .values("color_id").annotate(n=Sum("clicks")).order_by()
+    )
+    return {r["color_id"]: r["n"] for r in rows}
+
+
+def click_series(bucket, start, end, section=None) -> dict:
+    """{(jour|heure, section): clics} pour start <= t <= end (bucket "day" ou "hour")."""
+    model, key = (DailyClicks, "day") if bucket == "day" else (HourlyClicks, "hour")
+    qs = model.objects.filter(**{f"{key}__gte": start, f"{key}__lte": end})
+    if section:
+        qs = qs.filter(section=section)
+    rows = qs.values(key, "section").annotate(n=Sum("clicks")).order_by()
+    return {(r[key], r["section"]): r["n"] for r in rows}
+
+
+def session_series(bucket, start, end) -> dict:
+    """{jour|heure: (sessions, durée totale des sessions closes)} pour start <= t <= end."""
+    model, key = (DailySessions, "day") if bucket == "day" else (HourlySessions, "hour")
+    rows = model.objects.filter(**{f"{key}__gte": start, f"{key}__lte": end}).values_list(
+        key, "sessions", "duration_total",
+    )
+    return {t: (n, total) for t, n, total in rows}
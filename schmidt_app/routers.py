@@ -0,0 +1,51 @@
+# schmidt_app/routers.py
+"""
+Routeur de bases : les statistiques (UsageSession, ClickEvent et leurs
+agrégats) vivent dans leur propre base ("analytics"), le catalogue et
+l'auth dans "default".
+Un clic n'attend donc plus jamais le verrou d'écriture du catalogue
+(dashboard, import_couleurs), et inversement.
+
+    python manage.py migrate                       # catalogue, auth…
+    python manage.py migrate --database=analytics  # UsageSession, ClickEvent
+
+Sans base "analytics" dans settings.DATABASES, tout reste dans "default".
+"""
+from django.conf import settings
+
+ANALYTICS_DB = "analytics"
+ANALYTICS_MODELS = {
+    "usagesession", "clickevent", "rollupstate",
+    "dailyclicks", "dailysessions", "hourlyclicks", "hourlysessions",
+}
+
+
+def analytics_db() -> str:
+    return ANALYTICS_DB if ANALYTICS_DB in settings.DATABASES else "default"
+
+
+def is_analytics(app_label, model_name) -> bool:
+    return app_label == "schmidt_app" and model_name in ANALYTICS_MODELS
+
+
+class AnalyticsRouter:
+    def db_for_read(self, model, **hints):
+        if is_analytics(model._meta.app_label, model._meta.model_name):
+            return analytics_db()
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        a = is_analytics(obj1._meta.app_label, obj1._meta.model_name)
+        b = is_analytics(obj2._meta.app_label, obj2._meta.model_name)
+        return None if a == b else False
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if model_name is None:
+            return None
+        if is_analytics(app_label, model_name):
+            return db == analytics_db()
+        if db == ANALYTICS_DB:
+            return False
+        return None
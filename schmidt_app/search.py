@@ -0,0 +1,213 @@
+# schmidt_app/search.py
+"""
+Index de recherche plein texte (SQLite FTS5) sur le catalogue.
+
+Une ligne par couleur (rowid = 2*id) et par groupe (rowid = 2*id + 1) :
+- couleur : nom, nom du groupe, libellé de section, textes alternatifs des images
+- groupe  : nom du groupe, libellé de section
+Tokenizer unicode61 + remove_diacritics : « ecru » trouve « Écru » ;
+index de préfixes (2 et 3 caractères) pour la recherche au fil de la frappe.
+
+La table virtuelle est créée et remplie par la migration 0003_search_index ;
+les signaux (signals.py) la tiennent ensuite à jour. Hors SQLite / sans
+FTS5 (table absente), on retombe sur des icontains.
+"""
+import functools
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import ColorGroup, Color, ColorImage, Section
+
+TABLE = "schmidt_app_search"
+SECTION_LABELS = dict(Section.choices)
+
+_ready = None  # None = pas encore vérifié ; True/False ensuite
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _color_rowid(color_id: int) -> int:
+    return 2 * color_id
+
+
+def _group_rowid(group_id: int) -> int:
+    return 2 * group_id + 1
+
+
+# ---------- Table ----------
+def available() -> bool:
+    """La table FTS5 existe (migration appliquée sur SQLite avec FTS5)."""
+    global _ready
+    if _ready is None:
+        if connection.vendor != "sqlite":
+            _ready = False
+        else:
+            with connection.cursor() as cur:
+                cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=%s", [TABLE])
+                _ready = cur.fetchone() is not None
+    return _ready
+
+
+def _indexed(func):
+    """N'exécute func que si l'index est disponible (sinon None)."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not available():
+            return None
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _color_rows(colors):
+    alts = {}
+    for color_id, alt in (
+        ColorImage.objects
+        .filter(color_id__in=[c.id for c in colors])
+        .exclude(alt="")
+        .values_list("color_id", "alt")
+    ):
+        alts.setdefault(color_id, set()).add(alt)
+    for c in colors:
+        group = c.group
+        yield (
+            _color_rowid(c.id),
+            "color",
+            group.section if group else "",
+            c.name,
+            group.name if group else "",
+            SECTION_LABELS.get(group.section, "") if group else "",
+            " ".join(sorted(alts.get(c.id, ()))),
+        )
+
+
+def _group_row(group):
+    return (
+        _group_rowid(group.id), "group", group.section,
+        group.name, group.name, SECTION_LABELS.get(group.section, ""), "",
+    )
+
+
+def _replace_rows(rows):
+    rows = list(rows)
+    if not rows:
+        return
+    with connection.cursor() as cur:
+        cur.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [(r[0],) for r in rows])
+        cur.executemany(
+            f"INSERT INTO {TABLE} (rowid, kind, section, name, group_name, section_label, alts) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            rows,
+        )
+
+
+def _delete_rowids(rowids):
+    with connection.cursor() as cur:
+        cur.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [(r,) for r in rowids])
+
+
+@_indexed
+def rebuild():
+    """Reconstruit tout l'index (3 requêtes de lecture)."""
+    with connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {TABLE}")
+    colors = list(Color.objects.select_related("group"))
+    _replace_rows(_color_rows(colors))
+    _replace_rows(_group_row(g) for g in ColorGroup.objects.all())
+
+
+# ---------- Mises à jour unitaires (signaux) ----------
+@_indexed
+def index_colors(color_ids):
+    color_ids = set(color_ids)
+    colors = list(Color.objects.select_related("group").filter(pk__in=color_ids))
+    # couleurs supprimées entre-temps : on retire juste leur ligne
+    missing = color_ids - {c.id for c in colors}
+    if missing:
+        _delete_rowids(_color_rowid(i) for i in missing)
+    _replace_rows(_color_rows(colors))
+
+
+@_indexed
+def remove_color(color_id: int):
+    _delete_rowids([_color_rowid(color_id)])
+
+
+@_indexed
+def index_group(group: ColorGroup):
+    """
+    Le nom / la section d'un groupe apparaît aussi sur chacune de ses couleurs.
+    Ligne du groupe déjà à jour (save() d'un déplacement, d'un slug…) : rien à réécrire.
+    """
+    row = _group_row(group)
+    with connection.cursor() as cur:
+        cur.execute(f"SELECT section, name FROM {TABLE} WHERE rowid = %s", [row[0]])
+        if cur.fetchone() == (group.section, group.name):
+            return
+    _replace_rows([row])
+    index_colors(group.colors.values_list("id", flat=True))
+
+
+@_indexed
+def remove_group(group_id: int, color_ids=()):
+    _delete_rowids([_group_rowid(group_id)])
+    if color_ids:
+        index_colors(color_ids)
+
+
+# ---------- Requête ----------
+def match_expression(q: str) -> str:
+    """« blanc ecr » -> "blanc"* "ecr"* (ET implicite, syntaxe FTS5 neutralisée)."""
+    tokens = _TOKEN_RE.findall(q or "")
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def search(q: str, section: str = None, limit: int = 20):
+    """
+    Retourne (color_ids, group_ids) classés par pertinence (bm25).
+    section : filtre optionnel sur le code de section.
+    """
+    expr = match_expression(q)
+    if not expr:
+        return [], []
+    found = _search_fts(expr, section, limit)
+    if found is None:
+        return _search_fallback(q, section, limit)
+    return found
+
+
+@_indexed
+def _search_fts(expr, section, limit):
+    # une requête par type : les couleurs, plus nombreuses, n'évincent pas les groupes
+    # (kind / section : colonnes non indexées, filtre appliqué aux seules lignes trouvées)
+    sql = f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s AND kind = %s"
+    if section:
+        sql += " AND section = %s"
+    sql += f" ORDER BY bm25({TABLE}) LIMIT %s"
+    found = []
+    with connection.cursor() as cur:
+        for kind in ("color", "group"):
+            cur.execute(sql, [expr, kind] + ([section] if section else []) + [limit])
+            found.append([rowid // 2 for (rowid,) in cur.fetchall()])
+    return tuple(found)
+
+
+def _search_fallback(q, section, limit):
+    cond = Q()
+    for token in _TOKEN_RE.findall(q):
+        cond &= (
+            Q(name__icontains=token)
+            | Q(group__name__icontains=token)
+            | Q(images__alt__icontains=token)
+        )
+    colors = Color.objects.filter(cond)
+    groups = ColorGroup.objects.all()
+    for token in _TOKEN_RE.findall(q):
+        groups = groups.filter(name__icontains=token)
+    if section:
+        colors = colors.filter(group__section=section)
+        groups = groups.filter(section=section)
+    color_ids = list(colors.order_by("name").values_list("id", flat=True).distinct()[:limit])
+    group_ids = list(groups.order_by("name").values_list("id", flat=True)[:limit])
+    return color_ids, group_ids
@@ -0,0 +1,100 @@
+# schmidt_app/serializers.py
+"""
+Sérialisation JSON des groupes / couleurs / images pour l'API.
+
+Le nombre de requêtes ne dépend pas de la taille du catalogue :
+- la présentation et le nombre d'images de galerie sont lus sur les champs
+  dénormalisés de Color (presentation_image / gallery_count) ;
+- group_slug et présentation viennent d'un select_related ;
+- les couleurs d'un ensemble de groupes sont chargées en un seul prefetch.
+"""
+from django.db.models import Prefetch, prefetch_related_objects
+
+from .imaging import image_srcsets
+from .models import ColorGroup, Color, ColorImage
+
+
+# ---------- QuerySets ----------
+def color_queryset(fields=None):
+    """
+    Couleurs prêtes à sérialiser (1 requête, jointures incluses).
+    fields : ne joint que les relations nécessaires aux champs demandés.
+    """
+    related = []
+    if fields is None or "group_slug" in fields:
+        related.append("group")
+    if fields is None or "presentation" in fields:
+        related.append("presentation_image")
+    qs = Color.objects.all()
+    return qs.select_related(*related) if related else qs
+
+
+def colors_prefetch():
+    return Prefetch("colors", queryset=color_queryset().order_by("position", "name"))
+
+
+def prefetch_group_colors(groups):
+    """Charge les couleurs (colors_prefetch) de groupes déjà lus, en une requête."""
+    prefetch_related_objects(list(groups), colors_prefetch())
+
+
+# ---------- Dicts ----------
+def image_dict(request, img: ColorImage):
+    return {
+        "id": img.id,
+        "url": request.build_absolute_uri(img.image.url),
+        "is_presentation": img.is_presentation,
+        "position": img.position,
+        "alt": img.alt or "",
+        "width": img.width,
+        "height": img.height,
+        "status": img.status,  # pending tant que run_workers n'est pas passé
+        # déclinaisons 160/480/1280 px (imaging.py), vides tant qu'elles n'existent pas
+        **image_srcsets(img),
+    }
+
+
+COLOR_FIELDS = ("id", "name", "slug", "position", "group_slug", "presentation", "gallery_count")
+GROUP_FIELDS = ("id", "name", "slug", "position", "section", "colors")
+
+
+def color_dict(request, color: Color, with_presentation=True, fields=None):
+    """
+    fields : sous-ensemble de COLOR_FIELDS (None = tout). Les relations
+    (group, presentation_image) ne sont lues que si leur champ est demandé.
+    """
+    def want(name):
+        return fields is None or name in fields
+
+    d = {"id": color.id}
+    if want("name"):
+        d["name"] = color.name
+    if want("slug"):
+        d["slug"] = color.slug  # utile côté UI/affichage
+    if want("position"):
+        d["position"] = color.position
+    if want("group_slug"):
+        d["group_slug"] = color.group.slug if color.group else None
+    if with_presentation:
+        if want("presentation"):
+            pres = color.presentation_image
+            d["presentation"] = image_dict(request, pres) if pres else None
+        if want("gallery_count"):
+            d["gallery_count"] = color.gallery_count
+    return d
+
+
+def group_dict(request, group: ColorGroup, with_colors=True, fields=None):
+    def want(name):
+        return fields is None or name in fields
+
+    d = {"id": group.id}
+    for name in ("name", "slug", "position"):
+        if want(name):
+            d[name] = getattr(group, name)
+    if want("section"):
+        d["section"] = getattr(group, "section", None)
+    if with_colors and want("colors"):
+        # .all() lit le cache du prefetch (colors_prefetch / prefetch_group_colors)
+        d["colors"] = [color_dict(request, c) for c in group.colors.all()]
+    return d
@@ -1,7 +1,11 @@
 # schmidt_app/signals.py
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from .models import ColorImage
+from . import search
+from .catalog import bump_revision
+from .imaging import release_file
+from .models import ColorGroup, Color, ColorImage
 
 @receiver(post_save, sender=ColorImage)
 def colorimage_set_url(sender, instance: ColorImage, created, **kwargs):
@@ -9,7 +13,61 @@ def colorimage_set_url(sender, instance: ColorImage, created, **kwargs):
 
 @receiver(post_delete, sender=ColorImage)
 def colorimage_delete_file(sender, instance: ColorImage, **kwargs):
-    if instance.image and instance.image.name:
-        storage = instance.image.storage
-        if storage.exists(instance.image.name):
-            storage.delete(instance.image.name)
+    # fichier éventuellement partagé (blobs.py) : supprimé au commit, et seulement
+    # si plus aucune image ne le référence (un --clear suivi d'un réimport le garde)
+    name, variants = instance.image.name, dict(instance.variants or {})
+    transaction.on_commit(lambda: release_file(name, variants))
+
+# Stats dénormalisées de Color (presentation_image / gallery_count)
+@receiver(post_save, sender=ColorImage)
+@receiver(post_delete, sender=ColorImage)
+def colorimage_refresh_color_stats(sender, instance: ColorImage, **kwargs):
+    if instance.color_id:
+        Color(pk=instance.color_id).refresh_image_stats(commit=True)
+
+# Toute écriture sur le catalogue invalide les snapshots des workers
+@receiver(post_save, sender=ColorGroup)
+@receiver(post_save, sender=Color)
+@receiver(post_save, sender=ColorImage)
+@receiver(post_delete, sender=ColorGroup)
+@receiver(post_delete, sender=Color)
+@receiver(post_delete, sender=ColorImage)
+def catalog_bump_revision(sender, **kwargs):
+    bump_revision()
+
+# Index de recherche (search.py) : seuls les champs indexés déclenchent une mise à jour
+def _touches(update_fields, indexed):
+    return update_fields is None or bool(set(update_fields) & indexed)
+
+@receiver(post_save, sender=Color)
+def color_search_index(sender, instance: Color, update_fields=None, **kwargs):
+    if _touches(update_fields, {"name", "group"}):
+        search.index_colors([instance.pk])
+
+@receiver(post_delete, sender=Color)
+def color_search_remove(sender, instance: Color, **kwargs):
+    search.remove_color(instance.pk)
+
+@receiver(post_save, sender=ColorGroup)
+def group_search_index(sender, instance: ColorGroup, update_fields=None, **kwargs):
+    if _touches(update_fields, {"name", "section"}):
+        search.index_group(instance)
+
+@receiver(pre_delete, sender=ColorGroup)
+def group_search_remember_colors(sender, instance: ColorGroup, **kwargs):
+    # après suppression, ses couleurs (group=NULL) doivent être réindexées
+    instance._search_color_ids = list(instance.colors.values_list("id", flat=True))
+
+@receiver(post_delete, sender=ColorGroup)
+def group_search_remove(sender, instance: ColorGroup, **kwargs):
+    search.remove_group(instance.pk, getattr(instance, "_search_color_ids", ()))
+
+@receiver(post_save, sender=ColorImage)
+def colorimage_search_index(sender, instance: ColorImage, created, update_fields=None, **kwargs):
+    if instance.alt if created else _touches(update_fields, {"alt"}):
+        search.index_colors([instance.color_id])
+
+@receiver(post_delete, sender=ColorImage)
+def colorimage_search_remove(sender, instance: ColorImage, **kwargs):
+    if instance.alt:
+        search.index_colors([instance.color_id])
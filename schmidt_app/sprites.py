@@ -0,0 +1,209 @@
+# schmidt_app/sprites.py
+"""
+Planches de vignettes (sprites) par section pour la page d'accueil.
+
+Les images de présentation d'une section sont recadrées en tuiles
+TILE_W x TILE_H et assemblées dans UNE image JPEG :
+    sprites/<section>-<clé>.jpg  +  sprites/<section>-<clé>.json (offsets)
+La clé est un hash du contenu (couleurs + fichiers de présentation) : un
+renommage ou un réordonnancement réutilise la planche existante ; seul un
+changement de photo de présentation (ou de couleurs) en génère une nouvelle.
+
+catalog.py ne fait que relire les planches déjà écrites (ready_sheets) ;
+chaque changement de catalogue met en file la tâche "build_sprites"
+(jobs.py) et les bulles d'une section sans planche gardent leurs <img>
+jusqu'à la révision suivante. La tâche (comme `manage.py build_sprites
+--prune`) supprime ensuite les planches qui ne servent plus, en gardant
+la génération précédente (prune).
+"""
+import hashlib
+import io
+import json
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .models import Color, Section
+
+SPRITES_DIR = "sprites"
+IN_USE = f"{SPRITES_DIR}/in-use.json"  # fichiers des deux dernières générations (prune)
+TILE_W, TILE_H = 400, 250   # ratio de .bubble-sprite (style.css)
+COLUMNS = 10
+JPEG_OPTIONS = {"quality": 80, "optimize": True, "progressive": True}
+
+
+def _source_name(image_name: str, variants: dict) -> str:
+    # la déclinaison 480 px suffit pour une tuile de 400 px
+    return ((variants or {}).get("480") or {}).get("jpeg") or image_name
+
+
+def _sheet_key(items) -> str:
+    h = hashlib.sha1()
+    h.update(f"{TILE_W}x{TILE_H}:{COLUMNS}".encode())
+    for color_id, source in items:
+        h.update(f"{color_id}={source};".encode())
+    return h.hexdigest()[:16]
+
+
+def _tile(source: str):
+    with default_storage.open(source, "rb") as f:
+        im = Image.open(f)
+        im = ImageOps.exif_transpose(im)
+        im.load()
+    return ImageOps.fit(im.convert("RGB"), (TILE_W, TILE_H), Image.LANCZOS)
+
+
+def _sheet_base(section: str, items) -> str:
+    # ordre indépendant de l'affichage : un réordonnancement réutilise la planche
+    return posixpath.join(SPRITES_DIR, f"{section}-{_sheet_key(sorted(items))}")
+
+
+def load_sheet(section: str, items):
+    """Métadonnées de la planche si elle est déjà dans le storage, sinon None."""
+    meta_name = f"{_sheet_base(section, items)}.json"
+    if not default_storage.exists(meta_name):
+        return None
+    with default_storage.open(meta_name, "rb") as f:
+        return json.loads(f.read())
+
+
+def build_sheet(section: str, items) -> dict:
+    """
+    items : [(color_id, nom_storage_source), ...] (ordre indifférent).
+    Retourne les métadonnées (lues depuis le storage si la planche existe déjà).
+    """
+    meta = load_sheet(section, items)
+    if meta is not None:
+        return meta
+    items = sorted(items)
+    base = _sheet_base(section, items)
+    meta_name = f"{base}.json"
+
+    tiles = []
+    for color_id, source in items:
+        try:
+            tiles.append((color_id, _tile(source)))
+        except (OSError, ValueError):
+            continue  # fichier absent/illisible : la bulle garde son <img>
+
+    columns = max(1, min(COLUMNS, len(tiles)))
+    rows = max(1, -(-len(tiles) // columns))
+    sheet = Image.new("RGB", (columns * TILE_W, rows * TILE_H), (255, 255, 255))
+    positions = {}
+    for i, (color_id, tile) in enumerate(tiles):
+        col, row = i % columns, i // columns
+        sheet.paste(tile, (col * TILE_W, row * TILE_H))
+        positions[str(color_id)] = [col * TILE_W, row * TILE_H]
+
+    buf = io.BytesIO()
+    sheet.save(buf, format="JPEG", **JPEG_OPTIONS)
+    image_name = f"{base}.jpg"
+    if not default_storage.exists(image_name):
+        image_name = default_storage.save(image_name, ContentFile(buf.getvalue()))
+
+    meta = {
+        "url": default_storage.url(image_name),
+        "name": image_name,
+        "meta_name": meta_name,
+        "width": sheet.width,
+        "height": sheet.height,
+        "tile": [TILE_W, TILE_H],
+        "columns": columns,
+        "rows": rows,
+        "positions": positions,
+    }
+    default_storage.save(meta_name, ContentFile(json.dumps(meta).encode("utf-8")))
+    return meta
+
+
+def _items_by_section() -> dict:
+    """{section: [(color_id, source), ...]} des sections ayant au moins une présentation."""
+    items_by_section = {code: [] for code, _label in Section.choices}
+    for color_id, section, image, variants in (
+        Color.objects
+        .filter(group__isnull=False, presentation_image__isnull=False)
+        .values_list("id", "group__section", "presentation_image__image", "presentation_image__variants")
+    ):
+        if section in items_by_section:
+            items_by_section[section].append((color_id, _source_name(image, variants)))
+    return {section: items for section, items in items_by_section.items() if items}
+
+
+def build_sheets() -> dict:
+    """{section: meta} pour toutes les sections ayant au moins une présentation."""
+    return {section: build_sheet(section, items) for section, items in _items_by_section().items()}
+
+
+def ready_sheets() -> tuple:
+    """
+    Sans rien générer : ({section: meta} des planches déjà construites,
+    [sections dont la planche est à construire]). Une requête + lectures storage.
+    """
+    ready, missing = {}, []
+    for section, items in _items_by_section().items():
+        meta = load_sheet(section, items)
+        if meta is None:
+            missing.append(section)
+        else:
+            ready[section] = meta
+    return ready, missing
+
+
+def css_position(meta: dict, color_id) -> dict:
+    """
+    Styles CSS d'une tuile, en pourcentages pour suivre la taille de la bulle :
+    background-size = colonnes x lignes, background-position = col/(colonnes-1).
+    """
+    xy = meta["positions"].get(str(color_id))
+    if xy is None:
+        return None
+    col, row = xy[0] // TILE_W, xy[1] // TILE_H
+    cols, rows = meta["columns"], meta["rows"]
+    x = col * 100 / (cols - 1) if cols > 1 else 0
+    y = row * 100 / (rows - 1) if rows > 1 else 0
+    return {
+        "url": meta["url"],
+        "size": f"{cols * 100}% {rows * 100}%",
+        "position": f"{x:.4f}% {y:.4f}%",
+        "x": xy[0],
+        "y": xy[1],
+    }
+
+
+def referenced_names(sheets: dict) -> set:
+    names = set()
+    for meta in sheets.values():
+        names.add(meta["name"])
+        names.add(meta["meta_name"])
+    return names
+
+
+def prune(sheets: dict) -> int:
+    """
+    Supprime les fichiers de SPRITES_DIR qui ne servent ni à `sheets` ni à
+    la génération précédente : un worker dont le snapshot n'a pas encore vu
+    la nouvelle révision sert encore ses URLs. Retourne le nombre supprimé.
+    """
+    if not default_storage.exists(SPRITES_DIR):
+        return 0
+    current = sorted(referenced_names(sheets))
+    state = {"current": [], "previous": []}
+    if default_storage.exists(IN_USE):
+        with default_storage.open(IN_USE, "rb") as f:
+            state = json.loads(f.read())
+    if state["current"] != current:
+        state = {"current": current, "previous": state["current"]}
+        default_storage.delete(IN_USE)
+        default_storage.save(IN_USE, ContentFile(json.dumps(state).encode("utf-8")))
+
+    keep = {IN_USE, *state["current"], *state["previous"]}
+    _dirs, files = default_storage.listdir(SPRITES_DIR)
+    removed = 0
+    for filename in files:
+        name = f"{SPRITES_DIR}/{filename}"
+        if name not in keep:
+            default_storage.delete(name)
+            removed += 1
+    return removed
@@ -30,10 +30,12 @@ document.addEventListener("DOMContentLoaded", function () {
   // ==============================
   const API = {
     // ------- Groupes -------
+    // Un seul bundle pour les 4 sections ; le navigateur le revalide (ETag -> 304)
     async listGroups(section) {
-      const r = await fetch(`/api/groups/?section=${encodeURIComponent(section||'facades')}`);
-      if (!r.ok) throw new Error('GET groups failed');
-      return (await r.json()).results || [];
+      const r = await fetch(`/api/catalog/`);
+      if (!r.ok) throw new Error('GET catalog failed');
+      const data = await r.json();
+      return ((data.sections || {})[section || 'facades'] || {}).groups || [];
     },
     async createGroup(name, section) {
       const r = await fetch(`/api/groups/`, {
@@ -61,6 +63,14 @@ document.addEventListener("DOMContentLoaded", function () {
         await this.patchGroup(slugs[i], { position: i });
       }
     },
+    // Glisser-déposer : place le groupe avant `beforeSlug` (null = en dernier), une ligne écrite
+    async moveGroup(slug, beforeSlug) {
+      const r = await fetch(`/api/groups/${encodeURIComponent(slug)}/move/`, {
+        method: 'POST', headers: jsonHeaders(), body: JSON.stringify({ before: beforeSlug })
+      });
+      if (!r.ok) throw new Error('POST move group failed');
+      return r.json();
+    },
     // Réordonne les couleurs d’un groupe (attend des IDs côté back)
     async reorderColors(groupSlug, ids) {
       const r = await fetch(`/api/groups/${encodeURIComponent(groupSlug)}/colors/reorder`, {
@@ -86,6 +96,13 @@ document.addEventListener("DOMContentLoaded", function () {
       if (!r.ok) throw new Error('PATCH color failed');
       return r.json();
     },
+    async moveColor(colorId, beforeId) {
+      const r = await fetch(`/api/colors/${colorId}/move/`, {
+        method:'POST', headers: jsonHeaders(), body: JSON.stringify({ before: beforeId })
+      });
+      if (!r.ok) throw new Error('POST move color failed');
+      return r.json();
+    },
     async deleteColor(colorId) {
       const r = await fetch(`/api/colors/${colorId}/`, {
         method:'DELETE', headers: csrfOnly()
@@ -107,6 +124,12 @@ document.addEventListener("DOMContentLoaded", function () {
       if (!r.ok) throw new Error('POST images failed');
       return r.json();
     },
+    async imagesStatus(colorId, ids) {
+      const q = ids && ids.length ? `?ids=${ids.join(',')}` : '';
+      const r = await fetch(`/api/colors/${colorId}/images/status/${q}`);
+      if (!r.ok) throw new Error('GET images status failed');
+      return r.json();
+    },
     async setPresentation(colorId, imageId) {
       const r = await fetch(`/api/colors/${colorId}/images/`, {
         method:'PATCH', headers: jsonHeaders(), body: JSON.stringify({ presentation_id: imageId })
@@ -119,6 +142,12 @@ document.addEventListener("DOMContentLoaded", function () {
       });
       if (!r.ok) throw new Error('PATCH reorder gallery failed');
     },
+    async moveImage(colorId, imageId, beforeId) {
+      const r = await fetch(`/api/colors/${colorId}/images/${imageId}/move/`, {
+        method:'POST', headers: jsonHeaders(), body: JSON.stringify({ before: beforeId })
+      });
+      if (!r.ok) throw new Error('POST move image failed');
+    },
     async deleteImage(colorId, imageId) {
       const r = await fetch(`/api/colors/${colorId}/images/${imageId}/`, {
         method:'DELETE', headers: csrfOnly()
@@ -166,10 +195,16 @@ document.addEventListener("DOMContentLoaded", function () {
   }
   function showSaveBanner(){ saveBanner && saveBanner.classList.add("show"); updateSaveBannerText(); }
   function hideSaveBanner(){ saveBanner && saveBanner.classList.remove("show"); }
-  // dédup simple par signature JSON
+  // élément suivant dans la liste triée (hors tuiles « ajouter ») : cible du « placer avant »
+  function nextDraggable(item, selector){
+    let n = item.nextElementSibling;
+    while (n && !n.matches(selector)) n = n.nextElementSibling;
+    return n;
+  }
+  // dédup simple par signature JSON (sauf déplacements : leur ordre compte)
   function queueOp(op){
     const sig = JSON.stringify(op);
-    if(!pendingOps.some(o=>JSON.stringify(o)===sig)){
+    if(op.kind.endsWith('_move') || !pendingOps.some(o=>JSON.stringify(o)===sig)){
       pendingOps.push(op); updateSaveBannerText();
     }
   }
@@ -193,6 +228,10 @@ document.addEventListener("DOMContentLoaded", function () {
           case 'color_rename':      await API.patchColor(op.colorId, { name: op.name }); break;
 
           case 'gallery_reorder':   await API.reorderGallery(op.colorId, op.ids); break;
+
+          case 'group_move':        await API.moveGroup(op.groupSlug, op.beforeSlug); break;
+          case 'color_move':        await API.moveColor(op.colorId, op.beforeId); break;
+          case 'image_move':        await API.moveImage(op.colorId, op.imageId, op.beforeId); break;
         }
       }
       clearPendingOps();
@@ -701,6 +740,25 @@ document.addEventListener("DOMContentLoaded", function () {
   });
   colorEditTitle && colorEditTitle.addEventListener('blur', () => { if (titleEditing) stopTitleEdit(true); });
 
+  // ===== Suivi du traitement de fond (déclinaisons produites par run_workers)
+  const PROCESSING_POLL_MS = 2000;
+  const PROCESSING_MAX_POLLS = 60;
+
+  async function watchProcessing(colorId, created) {
+    const ids = (created || []).filter((img) => img.status === 'pending').map((img) => img.id);
+    if (!ids.length) return;
+    for (let i = 0; i < PROCESSING_MAX_POLLS; i++) {
+      await new Promise((resolve) => setTimeout(resolve, PROCESSING_POLL_MS));
+      let status;
+      try { status = await API.imagesStatus(colorId, ids); } catch (err) { console.warn(err); return; }
+      if (status.pending > 0) continue;
+      const failed = status.images.filter((img) => img.status === 'failed');
+      if (failed.length) console.warn(`${failed.length} image(s) non traitée(s) : l'original reste affiché.`);
+      if (currentColor && currentColor.id === colorId) await loadImages();
+      return;
+    }
+  }
+
   // ===== loadImages
   async function loadImages() {
     if (!galleryContainer || !currentColor) return;
@@ -817,21 +875,25 @@ document.addEventListener("DOMContentLoaded", function () {
     if (!file || !currentColor) return;
 
     const prev = currentPresentationId;
-    await API.uploadImages(currentColor.id, [file], true);
+    const colorId = currentColor.id;
+    const res = await API.uploadImages(colorId, [file], true);
 
     if (prev) {
-      try { await API.deleteImage(currentColor.id, prev); } catch (err) { console.warn(err); }
+      try { await API.deleteImage(colorId, prev); } catch (err) { console.warn(err); }
     }
 
     await loadImages();
+    watchProcessing(colorId, res.created);
   });
 
   galleryFilesInput && galleryFilesInput.addEventListener("change",async(e)=>{
     const files=Array.from(e.target.files||[]);
     e.target.value="";
     if(!files.length || !currentColor) return;
-    await API.uploadImages(currentColor.id,files,false);
+    const colorId = currentColor.id;
+    const res = await API.uploadImages(colorId,files,false);
     await loadImages();
+    watchProcessing(colorId, res.created);
   });
 
   // ==============================
@@ -850,7 +912,8 @@ document.addEventListener("DOMContentLoaded", function () {
       filter: ".add-gallery-photo",
       animation: 150,
       ghostClass: "sortable-ghost",
-      onEnd: () => {
+      onEnd: (evt) => {
+        if (evt.oldIndex === evt.newIndex) return;
         const ids = Array.from(galleryContainer.querySelectorAll(".gallery-item"))
           .map(n => parseInt(n.dataset.imageId, 10))
           .filter(Boolean);
@@ -866,7 +929,12 @@ document.addEventListener("DOMContentLoaded", function () {
         });
 
         if (!originalSnapshot) originalSnapshot = deepCopy(groups);
-        queueOp({ kind: "gallery_reorder", colorId: currentColor.id, ids });
+        const next = nextDraggable(evt.item, ".gallery-item");
+        queueOp({
+          kind: "image_move", colorId: currentColor.id,
+          imageId: parseInt(evt.item.dataset.imageId, 10),
+          beforeId: next ? parseInt(next.dataset.imageId, 10) : null,
+        });
         showSaveBanner();
       }
     });
@@ -885,13 +953,15 @@ document.addEventListener("DOMContentLoaded", function () {
       filter: ".add-section-container",
       animation: 150,
       ghostClass: "sortable-ghost",
-      onEnd: () => {
-        const slugs = Array.from(sectionsContainer.querySelectorAll(".color-section"))
-          .map(s => s.dataset.groupSlug)
-          .filter(Boolean);
+      onEnd: (evt) => {
+        if (evt.oldIndex === evt.newIndex) return;
+        const next = nextDraggable(evt.item, ".color-section");
 
         if (!originalSnapshot) originalSnapshot = deepCopy(groups);
-        queueOp({ kind: "group_reorder", slugs });
+        queueOp({
+          kind: "group_move", groupSlug: evt.item.dataset.groupSlug,
+          beforeSlug: next ? next.dataset.groupSlug : null,
+        });
         showSaveBanner();
       }
     });
@@ -899,24 +969,21 @@ document.addEventListener("DOMContentLoaded", function () {
     document.querySelectorAll(".color-bubbles-container").forEach(container => {
       if (container.sortableInstance) container.sortableInstance.destroy();
 
-      const groupSlug = container.closest(".color-section").dataset.groupSlug;
-
       container.sortableInstance = new Sortable(container, {
         handle: ".bubble-drag-handle-container",
         draggable: ".color-bubble",
         filter: ".add-color-bubble",
         animation: 150,
         ghostClass: "sortable-ghost",
-        onEnd: () => {
-          const ids = Array.from(container.querySelectorAll(".color-bubble"))
-            .map(n => {
-              const colorId = parseInt(n.dataset.colorId, 10);
-              return Number.isFinite(colorId) ? colorId : null;
-            })
-            .filter(Boolean);
+        onEnd: (evt) => {
+          if (evt.oldIndex === evt.newIndex) return;
+          const colorId = parseInt(evt.item.dataset.colorId, 10);
+          if (!Number.isFinite(colorId)) return;
+          const next = nextDraggable(evt.item, ".color-bubble");
+          const beforeId = next ? parseInt(next.dataset.colorId, 10) : NaN;
 
           if (!originalSnapshot) originalSnapshot = deepCopy(groups);
-          queueOp({ kind: "colors_reorder", groupSlug, ids });
+          queueOp({ kind: "color_move", colorId, beforeId: Number.isFinite(beforeId) ? beforeId : null });
           showSaveBanner();
         }
       });
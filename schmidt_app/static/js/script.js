@@ -241,7 +241,7 @@ window.addEventListener('beforeunload', ()=> window.scrollTo(0,0));
 window.addEventListener('pageshow',      ()=> window.scrollTo(0,0));
 
 function fixImageSources() {
-  const bubbleImages = document.querySelectorAll('.bubble-image');
+  const bubbleImages = document.querySelectorAll('img.bubble-image'); // pas les tuiles de planche (span.bubble-sprite)
   const exts = ['.jpeg', '.jpg', '.png'];
   bubbleImages.forEach(async (img) => {
     const originalSrc = img.src;
@@ -273,10 +273,51 @@ function fixImageSources() {
   }
   function sameFile(a, b) { return stripQueryHash(a) === stripQueryHash(b); }
 
+  // Plus petite déclinaison (srcset "url 480w, ...") couvrant la largeur voulue
+  const CAROUSEL_TARGET_WIDTH = Math.min(1280, Math.round(window.innerWidth * (window.devicePixelRatio || 1)));
+  function pickFromSrcset(srcset, targetWidth) {
+    if (!srcset) return null;
+    const candidates = srcset.split(',').map(part => {
+      const [url, w] = part.trim().split(/\s+/);
+      return { url, w: parseInt(w, 10) || 0 };
+    }).filter(c => c.url).sort((a, b) => a.w - b.w);
+    if (!candidates.length) return null;
+    return (candidates.find(c => c.w >= targetWidth) || candidates[candidates.length - 1]).url;
+  }
+
   // ==============================
   // BULLes -> OUVRIR LE CARROUSEL PAR ID (API)
   // ==============================
+  // Catalogue complet chargé une fois (/api/catalog/, revalidé par ETag)
+  let catalogById = null;
+  let catalogPromise = null;
+  function loadCatalog() {
+    if (!catalogPromise) {
+      catalogPromise = fetch('/api/catalog/')
+        .then(r => { if (!r.ok) throw new Error('GET /api/catalog/ failed'); return r.json(); })
+        .then(data => {
+          const byId = new Map();
+          Object.values(data.sections || {}).forEach(sec =>
+            (sec.groups || []).forEach(g =>
+              (g.colors || []).forEach(c => byId.set(String(c.id), c))));
+          catalogById = byId;
+          return byId;
+        })
+        .catch(err => { catalogPromise = null; throw err; });
+    }
+    return catalogPromise;
+  }
+  loadCatalog().catch(() => {});
+
   async function fetchColorImagesById(id) {
+    try {
+      const byId = catalogById || await loadCatalog();
+      const c = byId.get(String(id));
+      if (c) return { presentation: c.presentation, gallery: c.gallery || [] };
+    } catch (err) {
+      console.warn(err);
+    }
+    // repli : endpoint par couleur
     const r = await fetch(`/api/colors/${encodeURIComponent(id)}/images/`);
     if (!r.ok) throw new Error('GET /api/colors/<id>/images/ failed');
     return r.json();
@@ -299,22 +340,16 @@ function fixImageSources() {
 
 
 
-      const gallery = (data.gallery || []).map(g => g?.url).filter(Boolean);
-
-
-
       const pres = data.presentation?.url;
-      const filtered = pres ? gallery.filter(u => !sameFile(u, pres)) : gallery;
-
-
+      const items = (data.gallery || []).filter(g => g?.url && !(pres && sameFile(g.url, pres)));
 
       const seen = new Set();
-      const unique = filtered.filter(u => {
-        const k = stripQueryHash(u);
+      const unique = items.filter(g => {
+        const k = stripQueryHash(g.url);
         if (seen.has(k)) return false;
         seen.add(k);
         return true;
-      });
+      }).map(g => pickFromSrcset(g.srcset, CAROUSEL_TARGET_WIDTH) || g.url);
 
       if (!unique.length) { alert("Aucune image de galerie pour ce coloris."); return; }
       openCarouselWithList(colorName, unique);
@@ -734,11 +769,17 @@ fixImageSources();
   if (window.__PERF_INSTALLED__) return;
   window.__PERF_INSTALLED__ = true;
 
+  // Clics regroupés : envoyés par lots à /api/perf/track/batch/
+  const FLUSH_INTERVAL_MS = 5000;
+  const FLUSH_MAX_EVENTS = 50;
+
   const PERF = {
     sessionId: null,
     activeSection: "facades",
     _idleStartTs: null,
     _startInFlight: null,
+    _queue: [],
+    _flushTimer: null,
 
     // ----- Inactivité (pilotée par ta pop) -----
     markIdleStart(inactivityDelayMs) {
@@ -801,8 +842,35 @@ fixImageSources();
       }
     },
 
+    // ----- Envoi : sendBeacon (sortie de page) ou fetch keepalive -----
+    _send(url, payload, beacon) {
+      if (beacon && navigator.sendBeacon) {
+        const blob = new Blob([payload], { type: "application/json" });
+        if (navigator.sendBeacon(url, blob)) return Promise.resolve();
+      }
+      return fetch(url, {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          "X-CSRFToken": this.csrftoken,
+        },
+        body: payload,
+        keepalive: true,
+      });
+    },
+
+    // ----- Lot de clics en attente -----
+    flush({ beacon = false } = {}) {
+      clearTimeout(this._flushTimer);
+      this._flushTimer = null;
+      if (!this._queue.length) return;
+      const events = this._queue.splice(0, this._queue.length);
+      this._send("/api/perf/track/batch/", JSON.stringify({ events }), beacon).catch(() => {});
+    },
+
     // ----- Stop : pop d’inactivité, reset/logo, OU filets de sortie -----
     async stop(opts = {}) {
+      this.flush({ beacon: true });  // clics de la session avant sa clôture
       if (!this.sessionId) return;
 
       const hasIdle = !!this._idleStartTs;
@@ -823,22 +891,7 @@ fixImageSources();
 
       try {
         // sendBeacon si dispo ; sinon fetch keepalive
-        let sent = false;
-        if (navigator.sendBeacon) {
-          const blob = new Blob([payload], { type: "application/json" });
-          sent = navigator.sendBeacon(url, blob);
-        }
-        if (!sent) {
-          await fetch(url, {
-            method: "POST",
-            headers: {
-              "Content-Type": "application/json",
-              "X-CSRFToken": this.csrftoken,
-            },
-            body: payload,
-            keepalive: true,
-          });
-        }
+        await this._send(url, payload, true);
       } catch (err) {
         console.warn("Erreur arrêt session:", err);
       } finally {
@@ -853,21 +906,17 @@ fixImageSources();
       await this.startIfNeeded();
       if (!this.sessionId) return;
 
-      const body = {
+      this._queue.push({
         session_id: this.sessionId,
         action,
         section: this.activeSection,
         ...(payload || {}),
-      };
-
-      fetch("/api/perf/track/", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          "X-CSRFToken": this.csrftoken,
-        },
-        body: JSON.stringify(body),
-      }).catch(() => {});
+      });
+      if (this._queue.length >= FLUSH_MAX_EVENTS) {
+        this.flush();
+      } else if (!this._flushTimer) {
+        this._flushTimer = setTimeout(() => this.flush(), FLUSH_INTERVAL_MS);
+      }
     },
   };
 
@@ -0,0 +1,85 @@
+# schmidt_app/streaming.py
+"""
+Réponses JSON en flux (?stream=1) pour les grosses listes, et exports CSV.
+
+Le corps {"<clé>": [ ... ]} est émis au fil d'un QuerySet.iterator(chunk_size=…) :
+la mémoire du worker reste constante et le premier octet part avant même
+la première requête SQL, quelle que soit la taille du résultat.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+CHUNK_SIZE = 500          # lignes lues par aller-retour SQL
+FLUSH_BYTES = 64 * 1024   # taille approximative des morceaux envoyés
+FORMULA_CHARS = ("=", "+", "-", "@", "\t", "\r")  # début de cellule interprété par un tableur
+
+
+def wants_stream(request) -> bool:
+    return (request.GET.get("stream") or "").lower() in ("1", "true", "yes")
+
+
+def iter_json_list(key: str, items):
+    """Génère le texte de {"<key>": [item, item, ...]} par morceaux."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    yield '{%s:[' % json.dumps(key)
+    buf, size, sep = [], 0, ""
+    for item in items:
+        piece = sep + encoder.encode(item)
+        sep = ","
+        buf.append(piece)
+        size += len(piece)
+        if size >= FLUSH_BYTES:
+            yield "".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf)
+    yield "]}"
+
+
+def stream_queryset(key: str, qs, serialize, chunk_size: int = CHUNK_SIZE):
+    """StreamingHttpResponse JSON sur qs.iterator() (prefetch conservé par chunk)."""
+    items = (serialize(obj) for obj in qs.iterator(chunk_size=chunk_size))
+    return StreamingHttpResponse(iter_json_list(key, items), content_type="application/json")
+
+
+class _Echo:
+    """Pseudo-fichier pour csv.writer : writerow() retourne la ligne formatée."""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    """Neutralise une formule (injection CSV : =HYPERLINK(…) dans un client_id…)."""
+    if isinstance(value, str) and value.startswith(FORMULA_CHARS):
+        return "'" + value
+    return value
+
+
+def iter_csv(header, rows):
+    """
+    Génère le texte CSV (BOM UTF-8 pour Excel, en-tête, lignes) par morceaux.
+    Les textes commençant par =, +, -, @, tabulation ou retour chariot sont
+    préfixés d'une apostrophe.
+    """
+    writer = csv.writer(_Echo())
+    buf, size = ["\ufeff", writer.writerow([_cell(v) for v in header])], 0
+    for row in rows:
+        line = writer.writerow([_cell(v) for v in row])
+        buf.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield "".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf)
+
+
+def stream_csv(filename: str, header, rows):
+    """StreamingHttpResponse CSV en pièce jointe ; `rows` : itérable de tuples."""
+    response = StreamingHttpResponse(iter_csv(header, rows), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
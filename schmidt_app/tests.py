@@ -1,3 +1,975 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import posixpath
+import re
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from collections import Counter
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from . import archive, catalog, counters, importer, jobs, ordering, rollups, search, sprites, watcher
+from .imaging import derivative_name, release_file
+from .management.commands import import_couleurs
+from .models import (
+    ClickEvent, Color, ColorGroup, ColorImage, Job, JobStatus, Section, SlugAllocator, UsageSession,
+)
+from .ordering import POSITION_GAP, renumber
+from .streaming import iter_csv
+
+
+def jpeg_bytes(size=(60, 40), color=(200, 10, 10)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+class TempMediaMixin:
+    """MEDIA_ROOT dans un dossier temporaire, supprimé après le test."""
+
+    def setUp(self):
+        super().setUp()
+        # snapshots du processus indexés par révision : les révisions repartent à chaque test
+        catalog._cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media, COUNTERS_FLUSH_INTERVAL=0, JOBS_EAGER=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+# ---------- Catalogue ----------
+class SnapshotTests(TempMediaMixin, TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.group = ColorGroup.objects.create(name="G", section=Section.FACADES)
+
+    def add_colors(self, n):
+        for i in range(n):
+            color = Color.objects.create(group=self.group, name=f"C{Color.objects.count()}")
+            ColorImage.objects.create(
+                color=color, is_presentation=True, image=SimpleUploadedFile(f"p{i}.jpg", jpeg_bytes()),
+            )
+
+    def cold_snapshot_queries(self):
+        catalog.bump_revision(rebuild_sprites=False)
+        with CaptureQueriesContext(connections["default"]) as ctx:
+            catalog.get_snapshot()
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_catalog(self):
+        self.add_colors(2)
+        small = self.cold_snapshot_queries()
+        self.add_colors(6)
+        self.assertEqual(self.cold_snapshot_queries(), small)
+        # révision, couleurs, révision + présentations (planches), groupes
+        self.assertEqual(small, 5)
+        # copie à jour : seule la révision est relue
+        with self.assertNumQueries(1):
+            snapshot = catalog.get_snapshot()
+        colors = snapshot["sections"][0]["groups"][0]["colors"]
+        self.assertEqual(len(colors), 8)
+        self.assertTrue(all(c["presentation"]["url"].startswith("/media/") for c in colors))
+
+    def test_catalog_writes_invalidate_snapshot(self):
+        self.add_colors(1)
+        color = Color.objects.get()
+        self.assertIn(">C0<", self.client.get("/").content.decode())
+        revision = catalog.current_revision()
+
+        color.name = "Rouge basque"
+        color.save()
+        self.assertGreater(catalog.current_revision(), revision)
+        html = self.client.get("/").content.decode()
+        self.assertIn("Rouge basque", html)
+        self.assertNotIn(">C0<", html)
+
+        # .update() en masse (déplacement de groupe) : la vue incrémente elle-même
+        other = ColorGroup.objects.create(name="Autre", section=Section.FACADES)
+        revision = catalog.current_revision()
+        response = self.client.post(f"/api/groups/{other.slug}/move/", {"before": self.group.slug},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(catalog.current_revision(), revision)
+
+
+class ColorStatsTests(TempMediaMixin, TestCase):
+    databases = "__all__"
+
+    def image(self, color, presentation=False):
+        return ColorImage.objects.create(
+            color=color, is_presentation=presentation, image=SimpleUploadedFile("a.jpg", jpeg_bytes()),
+        )
+
+    def test_signals_keep_presentation_and_gallery_count(self):
+        color = Color.objects.create(name="Blanc")
+        first = self.image(color, presentation=True)
+        self.image(color)
+        gallery = self.image(color)
+        color.refresh_from_db()
+        self.assertEqual((color.presentation_image_id, color.gallery_count), (first.pk, 2))
+
+        gallery.delete()
+        first.delete()
+        color.refresh_from_db()
+        self.assertEqual((color.presentation_image_id, color.gallery_count), (None, 1))
+        self.assertEqual(Color.refresh_image_stats_bulk(), 0)
+
+    def test_list_queries_do_not_grow_with_catalog(self):
+        def queries(url):
+            with CaptureQueriesContext(connections["default"]) as ctx:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            return len(ctx.captured_queries)
+
+        def add_group(n):
+            group = ColorGroup.objects.create(name=f"G{n}", section=Section.FACADES)
+            for i in range(n):
+                color = Color.objects.create(group=group, name=f"G{n}C{i}")
+                self.image(color, presentation=True)
+                self.image(color)
+
+        add_group(1)
+        before = [queries("/api/groups/?section=facades"), queries("/api/colors/")]
+        add_group(4)
+        self.assertEqual([queries("/api/groups/?section=facades"), queries("/api/colors/")], before)
+
+
+class CatalogBundleTests(TempMediaMixin, TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        group = ColorGroup.objects.create(name="G", section=Section.FACADES)
+        color = Color.objects.create(group=group, name="Blanc")
+        ColorImage.objects.create(color=color, image=SimpleUploadedFile("a.jpg", jpeg_bytes()))
+
+    def test_etag_and_not_modified(self):
+        first = self.client.get("/api/catalog/")
+        etag = first["ETag"]
+        self.assertEqual(first.json()["sections"]["facades"]["groups"][0]["colors"][0]["gallery"][0]["position"], 0)
+
+        with self.assertNumQueries(1):
+            cached = self.client.get("/api/catalog/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b"")
+        self.assertEqual(self.client.get("/api/catalog/", HTTP_IF_NONE_MATCH=f"W/{etag}").status_code, 304)
+
+        Color.objects.create(name="Noir")
+        fresh = self.client.get("/api/catalog/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh["ETag"], etag)
+
+    def test_gzip_variant(self):
+        plain = self.client.get("/api/catalog/")
+        packed = self.client.get("/api/catalog/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(packed["Content-Encoding"], "gzip")
+        self.assertEqual(packed["Vary"], "Accept-Encoding")
+        self.assertEqual(json.loads(gzip.decompress(packed.content)), plain.json())
+
+
+class StreamTests(TestCase):
+    def setUp(self):
+        group = ColorGroup.objects.create(name="G", section=Section.FACADES)
+        for i in range(3):
+            Color.objects.create(group=group, name=f"C{i}", clicks=i)
+
+    def test_stream_matches_buffered_json(self):
+        for url in ("/api/colors/", "/api/groups/?section=facades", "/api/perf/breakdown/facades/"):
+            buffered = self.client.get(url)
+            streamed = self.client.get(url + ("&" if "?" in url else "?") + "stream=1")
+            self.assertTrue(streamed.streaming, url)
+            self.assertEqual(json.loads(b"".join(streamed.streaming_content)), buffered.json(), url)
+
+
+# ---------- Slugs ----------
+class SlugTests(TestCase):
+    def test_allocator_takes_smallest_free_suffix(self):
+        allocator = SlugAllocator(["divers", "divers-2", "divers-4", "diversite"])
+        self.assertEqual([allocator.allocate("divers") for _ in range(3)], ["divers-3", "divers-5", "divers-6"])
+        self.assertEqual(allocator.allocate("blanc"), "blanc")
+        self.assertEqual(allocator.allocate("blanc"), "blanc-2")
+
+    def test_save_allocates_once(self):
+        groups = [ColorGroup.objects.create(name="Divers", section=section) for section, _ in Section.choices]
+        self.assertEqual([g.slug for g in groups], ["divers", "divers-2", "divers-3", "divers-4"])
+        groups[1].delete()
+        self.assertEqual(ColorGroup.objects.create(name="Divers").slug, "divers-2")
+        # unicité par groupe pour les couleurs
+        self.assertEqual(Color.objects.create(group=groups[0], name="Blanc").slug, "blanc")
+        self.assertEqual(Color.objects.create(group=groups[2], name="Blanc").slug, "blanc")
+        color = Color.objects.create(group=groups[0], name="Blanc !")
+        self.assertEqual(color.slug, "blanc-2")
+
+        # position seule, ou nom inchangé : aucun calcul de slug
+        for obj in (groups[0], color):
+            obj.position = 5
+            with CaptureQueriesContext(connections["default"]) as ctx:
+                obj.save(update_fields=["position"])
+                obj.save()
+            self.assertFalse([q for q in ctx.captured_queries if "LIKE" in q["sql"]])
+
+        color.group = groups[2]
+        color.save()
+        self.assertEqual(color.slug, "blanc-2")
+        color.name = "Blanc cassé"
+        color.save()
+        self.assertEqual(color.slug, "blanc-casse")
+
+
+# ---------- Ordre ----------
+class OrderingTests(TestCase):
+    def setUp(self):
+        self.group = ColorGroup.objects.create(name="G", section=Section.FACADES)
+        self.a, self.b, self.c, self.d = [
+            Color.objects.create(group=self.group, name=name, position=(i + 1) * POSITION_GAP)
+            for i, name in enumerate("ABCD")
+        ]
+
+    def names(self):
+        return list(self.group.colors.order_by("position", "name", "id").values_list("name", flat=True))
+
+    def move(self, color, before):
+        return self.client.post(f"/api/colors/{color.pk}/move/", {"before": before},
+                                content_type="application/json")
+
+    def test_move_writes_one_row_while_gaps_remain(self):
+        self.assertEqual(self.move(self.d, self.b.pk).json(), {"ok": True, "updated": 1})
+        self.assertEqual(self.names(), ["A", "D", "B", "C"])
+        self.assertEqual(self.move(self.a, None).json()["updated"], 1)
+        self.assertEqual(self.names(), ["D", "B", "C", "A"])
+
+        other = Color.objects.create(group=ColorGroup.objects.create(name="H"), name="X")
+        self.assertEqual(self.move(self.a, other.pk).status_code, 400)
+        self.assertEqual(self.move(self.a, "B").status_code, 400)
+
+    def test_move_renumbers_when_neighbours_touch(self):
+        for i, color in enumerate((self.a, self.b, self.c, self.d)):
+            Color.objects.filter(pk=color.pk).update(position=i + 1)  # positions importées 1, 2, 3…
+        self.assertEqual(self.move(self.d, self.b.pk).json()["updated"], 4)
+        self.assertEqual(self.names(), ["A", "D", "B", "C"])
+        self.assertEqual(
+            list(self.group.colors.order_by("position").values_list("position", flat=True)),
+            [POSITION_GAP, 2 * POSITION_GAP, 3 * POSITION_GAP, 4 * POSITION_GAP],
+        )
+
+    def test_reorder_is_one_case_update(self):
+        order = [self.c.pk, self.a.pk, self.d.pk, self.b.pk]
+        url = f"/api/groups/{self.group.slug}/colors/reorder"
+        with CaptureQueriesContext(connections["default"]) as ctx:
+            response = self.client.patch(url, {"order": order}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        updates = [q["sql"] for q in ctx.captured_queries if 'UPDATE "schmidt_app_color"' in q["sql"]]
+        self.assertEqual(len(updates), 1)
+        self.assertIn("CASE", updates[0])
+        self.assertEqual(self.names(), ["C", "A", "D", "B"])
+
+        with mock.patch.object(ordering, "CASE_BATCH", 3):
+            renumber(self.group.colors.all(), list(reversed(order)))
+        self.assertEqual(self.names(), ["B", "D", "A", "C"])
+
+        other = Color.objects.create(name="Sans groupe")
+        response = self.client.patch(url, {"order": order + [other.pk]}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+# ---------- Pagination ----------
+class PaginationTests(TestCase):
+    def setUp(self):
+        first = ColorGroup.objects.create(name="A", section=Section.FACADES, position=1)
+        second = ColorGroup.objects.create(name="B", section=Section.FACADES, position=2)
+        for group in (second, first):
+            for i in range(3):
+                Color.objects.create(group=group, name=f"{group.name}{i}", position=i)
+        Color.objects.create(group=None, name="Sans groupe")
+
+    def test_pages_cover_full_list_in_order(self):
+        full = [c["id"] for c in self.client.get("/api/colors/").json()["results"]]
+        seen, cursor = [], None
+        while True:
+            url = "/api/colors/?limit=2&fields=id,name" + (f"&cursor={cursor}" if cursor else "")
+            with self.assertNumQueries(1):
+                page = self.client.get(url).json()
+            self.assertLessEqual(len(page["results"]), 2)
+            seen += [c["id"] for c in page["results"]]
+            cursor = page["next"]
+            if not cursor:
+                break
+        self.assertEqual(seen, full)
+        self.assertEqual(len(full), 7)
+
+    def test_invalid_cursors_are_rejected(self):
+        def cursor(values):
+            return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+        for bad in ("zz", cursor([1, 2]), cursor([{"a": 1}, 1, "x", 1]), cursor(["abc", 1, "x", 1])):
+            response = self.client.get(f"/api/colors/?limit=2&cursor={bad}")
+            self.assertEqual(response.status_code, 400, bad)
+        self.assertEqual(self.client.get("/api/colors/?limit=0").status_code, 400)
+        self.assertEqual(self.client.get("/api/colors/?fields=nope").status_code, 400)
+
+
+# ---------- Recherche ----------
+class SearchTests(TestCase):
+    def setUp(self):
+        self.group = ColorGroup.objects.create(name="Blancs", section=Section.PLANS)
+        self.ecru = Color.objects.create(group=self.group, name="Écru mat")
+        Color.objects.create(group=self.group, name="Noir")
+
+    def ids(self, url):
+        data = self.client.get(url).json()
+        return [c["id"] for c in data["colors"]], [g["id"] for g in data["groups"]]
+
+    def test_accent_insensitive_prefix_match(self):
+        self.assertEqual(self.ids("/api/search/?q=ecr"), ([self.ecru.pk], []))
+        self.assertEqual(self.ids("/api/search/?q=ECRU ma")[0], [self.ecru.pk])
+        self.assertEqual(self.ids("/api/search/?q=blanc&section=facades"), ([], []))
+        self.assertEqual(self.client.get('/api/search/?q="*(').status_code, 200)
+
+    def test_index_follows_renames_and_deletes(self):
+        self.group.name = "Clairs"
+        self.group.save()
+        self.assertEqual(self.ids("/api/search/?q=blanc"), ([], []))
+        self.assertEqual(len(self.ids("/api/search/?q=clai")[0]), 2)
+        self.ecru.delete()
+        self.assertEqual(self.ids("/api/search/?q=ecru"), ([], []))
+
+    def test_groups_are_not_crowded_out_by_colors(self):
+        for i in range(5):
+            Color.objects.create(group=self.group, name=f"Blanc {i}")
+        colors, groups = search.search("blanc", limit=3)
+        self.assertEqual(len(colors), 3)
+        self.assertEqual(groups, [self.group.pk])
+
+    def test_position_only_save_does_not_reindex_colors(self):
+        self.group.position = 5
+        with mock.patch.object(search, "index_colors") as index_colors:
+            self.group.save()
+        index_colors.assert_not_called()
+
+
+# ---------- Planches de vignettes ----------
+class SpriteTests(TempMediaMixin, TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        group = ColorGroup.objects.create(name="G", section=Section.FACADES)
+        self.colors = []
+        for i in range(3):
+            color = Color.objects.create(group=group, name=f"C{i}")
+            self.present(color, i)
+            self.colors.append(color)
+
+    def present(self, color, shade):
+        ColorImage.objects.create(
+            color=color, is_presentation=True,
+            image=SimpleUploadedFile(f"p{shade}.jpg", jpeg_bytes((500, 300), (shade * 40, 0, 0))),
+        )
+
+    def run_jobs(self):
+        for job_id in jobs.claim(10):
+            self.assertTrue(jobs.execute(job_id))
+
+    def sprite_styles(self):
+        return re.findall(r'background-position: ([^;]+);', self.client.get("/").content.decode())
+
+    def test_kiosk_read_never_builds_or_enqueues(self):
+        Job.objects.all().delete()
+        with CaptureQueriesContext(connections["default"]) as ctx:
+            self.assertEqual(self.sprite_styles(), [])  # pas encore de planche : <img>
+        self.assertFalse([q for q in ctx.captured_queries if not q["sql"].startswith("SELECT")])
+        self.assertFalse(Job.objects.exists())
+
+    def test_catalog_change_queues_one_build(self):
+        self.assertEqual(Job.objects.filter(kind="build_sprites", status=JobStatus.PENDING).count(), 1)
+        self.run_jobs()
+        self.assertEqual(self.sprite_styles(), ["0.0000% 0.0000%", "50.0000% 0.0000%", "100.0000% 0.0000%"])
+        tile = self.client.get("/api/catalog/").json()["sections"]["facades"]["groups"][0]["colors"][1]["sprite"]
+        self.assertEqual(tile, {"x": sprites.TILE_W, "y": 0})
+        # la tâche incrémente la révision sans se remettre en file
+        self.assertFalse(Job.objects.filter(kind="build_sprites", status=JobStatus.PENDING).exists())
+
+    def test_prune_keeps_previous_generation(self):
+        def generation(shade):
+            if shade is not None:
+                self.present(self.colors[0], shade)
+            before = self.sheet_files()
+            self.run_jobs()
+            return self.sheet_files() - before, self.sheet_files()
+
+        first, _files = generation(None)
+        second, files = generation(5)
+        # l'ancienne planche sert encore aux snapshots pas encore rafraîchis
+        self.assertTrue(first <= files)
+        third, files = generation(6)
+        self.assertFalse(first & files)
+        self.assertEqual(files, second | third)
+
+    def sheet_files(self):
+        directory = Path(self.media) / sprites.SPRITES_DIR
+        names = set(os.listdir(directory)) if directory.exists() else set()
+        return names - {posixpath.basename(sprites.IN_USE)}
+
+
+# ---------- Déclinaisons ----------
+class DerivativeTests(TempMediaMixin, TestCase):
+    databases = "__all__"
+
+    def test_names_keep_source_extension(self):
+        jpg = derivative_name("colors/blanc/gallery/photo.jpg", 480, "webp")
+        png = derivative_name("colors/blanc/gallery/photo.png", 480, "webp")
+        self.assertNotEqual(jpg, png)
+        self.assertEqual(jpg, "colors/blanc/derived/photo-jpg-480.webp")
+
+    def test_index_serves_derivatives_in_every_section(self):
+        for section in (Section.FACADES, Section.PLANS):
+            group = ColorGroup.objects.create(name=f"G {section}", section=section)
+            color = Color.objects.create(group=group, name=f"C {section}")
+            img = ColorImage.objects.create(
+                color=color, is_presentation=True, image=SimpleUploadedFile("a.jpg", jpeg_bytes()),
+            )
+            ColorImage.objects.filter(pk=img.pk).update(width=1200, variants={
+                "480": {"jpeg": f"colors/{section}/derived/a-jpg-480.jpg",
+                        "webp": f"colors/{section}/derived/a-jpg-480.webp"},
+            })
+        html = self.client.get("/").content.decode()
+        self.assertEqual(html.count('class="bubble"'), 2)
+        self.assertEqual(html.count('<source type="image/webp"'), 2)
+        self.assertIn("/media/colors/plans/derived/a-jpg-480.webp 480w", html)
+        self.assertIn("/media/colors/facades/derived/a-jpg-480.jpg 480w", html)
+
+    def test_release_keeps_derivatives_still_referenced(self):
+        group = ColorGroup.objects.create(name="G", section=Section.FACADES)
+        color = Color.objects.create(group=group, name="Blanc")
+        shared = default_storage.save("colors/blanc/derived/a-jpg-480.webp", ContentFile(b"x"))
+        own = default_storage.save("colors/blanc/derived/b-jpg-480.webp", ContentFile(b"x"))
+        kept = ColorImage.objects.create(color=color, image=SimpleUploadedFile("a.jpg", jpeg_bytes()))
+        ColorImage.objects.filter(pk=kept.pk).update(variants={"480": {"webp": shared}})
+        gone = default_storage.save("colors/blanc/gallery/b.jpg", ContentFile(jpeg_bytes()))
+
+        # l'original n'est plus référencé : lui et sa déclinaison propre partent
+        self.assertTrue(release_file(gone, {"480": {"webp": own}, "640": {"webp": shared}}))
+        self.assertFalse(default_storage.exists(gone))
+        self.assertFalse(default_storage.exists(own))
+        self.assertTrue(default_storage.exists(shared))
+
+
+# ---------- Import ----------
+class ImporterTests(TempMediaMixin, TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.base = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.base, ignore_errors=True)
+        for leaf in ("facades/GA/Blanc", "facades/GA/Noir"):
+            for i in range(3):
+                self.write(f"{leaf}/{i:02d}.jpg", (300 + i * 10, 200))
+
+    def write(self, rel, size):
+        path = self.base / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(jpeg_bytes(size))
+
+    def run_import(self):
+        call_command("import_couleurs", "--base", str(self.base), "--incremental", stdout=io.StringIO())
+
+    def gallery(self, name):
+        return list(
+            ColorImage.objects.filter(color__name=name)
+            .order_by("position", "id").values_list("id", "position", "is_presentation")
+        )
+
+    def test_rerun_keeps_dashboard_ordering(self):
+        self.run_import()
+        blanc, noir = Color.objects.get(name="Blanc"), Color.objects.get(name="Noir")
+        # réordonnancement fait depuis le dashboard
+        Color.objects.filter(pk=noir.pk).update(position=1)
+        Color.objects.filter(pk=blanc.pk).update(position=2)
+        first, second, third = [pk for pk, _pos, _pres in self.gallery("Blanc")]
+        ColorImage.objects.filter(pk=third).update(position=1, is_presentation=True)
+        ColorImage.objects.filter(pk=first).update(position=3, is_presentation=False)
+        ColorImage.objects.filter(pk=second).update(position=2)
+        before = self.gallery("Blanc")
+
+        self.run_import()
+
+        self.assertEqual(self.gallery("Blanc"), before)
+        self.assertEqual(
+            list(Color.objects.filter(group__name="GA").order_by("position").values_list("name", flat=True)),
+            ["Noir", "Blanc"],
+        )
+
+    def test_new_file_goes_after_existing_images(self):
+        self.run_import()
+        before = self.gallery("Blanc")
+        self.write("facades/GA/Blanc/03.jpg", (420, 200))
+
+        self.run_import()
+
+        after = self.gallery("Blanc")
+        self.assertEqual(after[:3], before)
+        self.assertGreater(after[3][1], before[-1][1])
+        self.assertFalse(after[3][2])
+
+    def test_resume_after_failed_chunk(self):
+        self.write("facades/GB/Rouge/00.jpg", (300, 200))
+        checkpoint = self.base / ".import_checkpoint.json"
+        process_file = importer.process_file
+
+        def fail_on_noir(task):
+            if "/Noir/" in task.rel:
+                raise OSError("disque plein")
+            return process_file(task)
+
+        args = ["import_couleurs", "--base", str(self.base), "--chunk", "1"]
+        with mock.patch.object(importer, "process_file", fail_on_noir):
+            with self.assertRaisesMessage(CommandError, "--resume"):
+                call_command(*args, stdout=io.StringIO())
+        # le paquet en échec est annulé, le précédent reste validé
+        self.assertEqual(len(self.gallery("Blanc")), 3)
+        self.assertEqual(self.gallery("Noir"), [])
+        self.assertEqual(json.loads(checkpoint.read_text())["done"], ["facades/GA/Blanc"])
+
+        out = io.StringIO()
+        call_command(*args, "--resume", stdout=out)
+        self.assertIn("Reprise : 1 leaf(s)", out.getvalue())
+        self.assertEqual([len(self.gallery(name)) for name in ("Blanc", "Noir", "Rouge")], [3, 3, 1])
+        self.assertFalse(checkpoint.exists())
+
+    def test_import_from_archives(self):
+        work = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, work, ignore_errors=True)
+        files = sorted(p for p in self.base.rglob("*.jpg"))
+        # zip : sections sous un dossier racine unique ; tar.gz : sections à la racine
+        with zipfile.ZipFile(work / "catalogue.zip", "w") as zf:
+            for path in files:
+                zf.write(path, "couleurs/" + path.relative_to(self.base).as_posix())
+        with tarfile.open(work / "catalogue.tar.gz", "w:gz") as tf:
+            for path in files:
+                tf.add(path, path.relative_to(self.base).as_posix())
+
+        for name in ("catalogue.zip", "catalogue.tar.gz"):
+            ColorImage.objects.all().delete()
+            Color.objects.all().delete()
+            call_command("import_couleurs", "--archive", str(work / name), stdout=io.StringIO())
+            self.assertEqual(
+                sorted(Color.objects.values_list("group__name", "name")), [("GA", "Blanc"), ("GA", "Noir")],
+                name,
+            )
+            gallery = ColorImage.objects.filter(color__name="Blanc").order_by("position")
+            self.assertEqual([img.is_presentation for img in gallery], [True, False, False], name)
+            self.assertEqual([img.width for img in gallery], [300, 310, 320], name)
+            with gallery[0].image.open("rb") as f:
+                self.assertEqual(f.read(), (self.base / "facades/GA/Blanc/00.jpg").read_bytes())
+        self.assertFalse(list(work.glob("*.import_checkpoint.json")))
+
+    def test_watch_syncs_only_touched_leaves(self):
+        self.run_import()
+        index = watcher.LeafIndex(self.base, ["facades", "pieces"])
+        poller = watcher.PollingWatcher(self.base, interval=0)
+        ga = self.base / "facades/GA"
+
+        self.write("facades/GA/Vert/00.jpg", (300, 200))
+        shutil.rmtree(ga / "Noir")
+        (ga / "Blanc/notes").mkdir()  # sous-dossier d'un leaf : seul Blanc est relu
+        touched = poller.changes(timeout=0)
+        self.assertIn(ga / "Blanc/notes", touched)
+        sections, dirty, removed = index.update(touched)
+        self.assertEqual((sections, dirty, removed), ({"facades"}, {ga / "Blanc", ga / "Vert"}, {"facades/GA/Noir"}))
+        self.assertEqual(index.leaves("facades"), [ga / "Blanc", ga / "Vert"])
+
+        blanc = self.gallery("Blanc")
+        command = import_couleurs.Command(stdout=io.StringIO())
+        # la connexion du test porte sa transaction : pas de fermeture entre deux lots
+        with mock.patch.object(import_couleurs, "close_old_connections"):
+            self.assertTrue(command._sync(index, self.base, sections, dirty, removed, {}))
+        self.assertEqual(self.gallery("Blanc"), blanc)
+        self.assertEqual(len(self.gallery("Vert")), 1)
+        self.assertEqual(self.gallery("Noir"), [])
+
+        # rien de nouveau : aucun leaf à resynchroniser
+        self.assertEqual(index.update(poller.changes(timeout=0)), (set(), set(), set()))
+
+
+# ---------- File de tâches ----------
+_failures = []
+
+
+@jobs.task("tests_noop", on_failure=lambda **payload: _failures.append(payload))
+def _noop(**payload):
+    pass
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        _failures.clear()
+
+    def claim_one(self, job):
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(jobs.claim(5), [job.pk])
+
+    def test_release_gives_up_after_max_attempts(self):
+        job = jobs.enqueue("tests_noop", max_attempts=2, image_id=7)
+        # le job tue son worker à chaque essai (BrokenProcessPool -> release)
+        with self.assertLogs("schmidt_app.jobs", "WARNING"):
+            for _attempt in range(2):
+                self.claim_one(job)
+                jobs.release([job.pk])
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(_failures, [{"image_id": 7}])
+        self.assertEqual(jobs.claim(5), [])
+
+    def test_requeue_stale_retries_then_fails(self):
+        job = jobs.enqueue("tests_noop", max_attempts=2)
+        self.claim_one(job)
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - jobs.STALE_AFTER * 2)
+        with self.assertLogs("schmidt_app.jobs", "WARNING"):
+            self.assertEqual(jobs.requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.PENDING)
+        self.assertGreater(job.run_after, timezone.now())
+
+        self.claim_one(job)
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - jobs.STALE_AFTER * 2)
+        with self.assertLogs("schmidt_app.jobs", "ERROR"):
+            jobs.requeue_stale()
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertEqual(len(_failures), 1)
+
+    def test_recent_running_job_is_left_alone(self):
+        job = jobs.enqueue("tests_noop")
+        self.claim_one(job)
+        self.assertEqual(jobs.requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.RUNNING)
+
+
+# ---------- Compteurs ----------
+class CounterTests(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        group = ColorGroup.objects.create(name="G", section=Section.FACADES)
+        self.colors = [Color.objects.create(group=group, name=f"C{i}") for i in range(5)]
+
+    def clicks(self):
+        return list(Color.objects.order_by("pk").values_list("clicks", flat=True))
+
+    def test_apply_splits_case_update(self):
+        per_pk = Counter({c.pk: i + 1 for i, c in enumerate(self.colors)})
+        with mock.patch.object(counters, "CASE_BATCH", 2), \
+                CaptureQueriesContext(connections["default"]) as ctx:
+            counters.apply("color", per_pk)
+        self.assertEqual(len([q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]), 3)
+        self.assertEqual(self.clicks(), [1, 2, 3, 4, 5])
+
+    @override_settings(COUNTERS_FLUSH_INTERVAL=60)
+    def test_shutdown_joins_flusher_then_writes(self):
+        buffer = counters.CounterBuffer()
+        buffer.add(color_counts=Counter({self.colors[0].pk: 2}))
+        self.assertEqual(buffer.pending()["colors"], 1)
+        self.assertEqual(self.clicks()[0], 0)
+
+        buffer.shutdown()
+
+        self.assertFalse(buffer._thread.is_alive())
+        self.assertEqual(self.clicks()[0], 2)
+        self.assertEqual(buffer.pending()["colors"], 0)
+
+    @override_settings(COUNTERS_FLUSH_INTERVAL=60)
+    def test_failed_flush_keeps_increments(self):
+        buffer = counters.CounterBuffer()
+        buffer._pending["color"].update({self.colors[1].pk: 3})
+        with mock.patch.object(counters, "apply", side_effect=counters.DatabaseError("locked")), \
+                self.assertLogs("schmidt_app.counters", "ERROR"):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.pending()["colors"], 1)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.clicks()[1], 3)
+
+
+@override_settings(COUNTERS_FLUSH_INTERVAL=0)
+class TrackBatchTests(TestCase):
+    databases = "__all__"
+
+    def post(self, payload):
+        return self.client.post("/api/perf/track/batch/", payload, content_type="application/json")
+
+    def test_valid_events_are_kept_and_counted(self):
+        color = Color.objects.create(group=ColorGroup.objects.create(name="G"), name="Blanc")
+        first, second = UsageSession.objects.create(), UsageSession.objects.create()
+        events = [
+            {"action": "bubble", "section": "facades", "color_id": color.pk},
+            {"action": "bubble", "section": "facades", "color_id": color.pk, "meta": {"x": 1}},
+            {"session_id": str(second.pk), "action": "tab", "section": "plans"},
+            {"action": "bubble", "section": "facades", "color_id": 999999},  # couleur inconnue : gardé sans
+            {"action": "bubble", "section": "cuisine"},                      # section inconnue
+            {"action": "", "section": "facades"},                            # action vide
+            {"session_id": "pas-un-uuid", "action": "tab", "section": "plans"},
+            {"session_id": "00000000-0000-0000-0000-000000000000", "action": "tab", "section": "plans"},
+            "bubble",
+        ]
+        with CaptureQueriesContext(connections["default"]) as ctx:
+            response = self.post({"session_id": str(first.pk), "events": events})
+        self.assertEqual(response.json(), {"accepted": 4, "rejected": 5})
+        # une lecture des couleurs, un UPDATE … CASE des compteurs
+        statements = [q["sql"].split()[0] for q in ctx.captured_queries]
+        self.assertEqual([s for s in statements if s in ("SELECT", "UPDATE", "INSERT")], ["SELECT", "UPDATE"])
+
+        self.assertEqual(ClickEvent.objects.filter(session=first).count(), 3)
+        self.assertEqual(ClickEvent.objects.filter(session=first, color_id__isnull=True).count(), 1)
+        self.assertEqual(ClickEvent.objects.get(meta__x=1).color_id, color.pk)
+        color.refresh_from_db()
+        self.assertEqual(color.clicks, 2)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.clicks_count, second.clicks_count), (3, 1))
+
+    def test_malformed_batches_are_rejected(self):
+        self.assertEqual(self.client.post(
+            "/api/perf/track/batch/", "{", content_type="application/json").status_code, 400)
+        self.assertEqual(self.post({"events": {"action": "bubble"}}).status_code, 400)
+        too_many = [{"action": "bubble", "section": "facades"}] * 501
+        self.assertEqual(self.post({"events": too_many}).status_code, 400)
+        self.assertEqual(self.post({"events": []}).json(), {"accepted": 0, "rejected": 0})
+
+
+# ---------- Agrégats et archivage ----------
+class AnalyticsMixin:
+    databases = "__all__"
+
+    def click(self, session, section, color_id=None, when=None):
+        event = ClickEvent.objects.create(session=session, section=section, color_id=color_id, action="bubble")
+        if when:
+            ClickEvent.objects.filter(pk=event.pk).update(created_at=when)
+        return event
+
+
+class RollupTests(AnalyticsMixin, TestCase):
+    def test_incremental_rollup(self):
+        session = UsageSession.objects.create()
+        for _ in range(3):
+            self.click(session, Section.FACADES, color_id=4)
+        self.click(session, Section.PLANS)
+
+        self.assertEqual(rollups.run()["events"], 4)
+        self.assertEqual(rollups.clicks_by_section(), {Section.FACADES: 3, Section.PLANS: 1})
+        self.assertEqual(rollups.clicks_by_color(Section.FACADES), {4: 3})
+
+        # second passage : seuls les nouveaux clics sont comptés
+        self.click(session, Section.FACADES, color_id=4)
+        self.assertEqual(rollups.run()["events"], 1)
+        self.assertEqual(rollups.clicks_by_section()[Section.FACADES], 4)
+        self.assertEqual(rollups.sessions_between()["sessions"], 1)
+
+    def test_conflicting_pass_is_rejected(self):
+        session = UsageSession.objects.create()
+        self.click(session, Section.FACADES)
+        stale = rollups.state()
+        rollups.run()
+        self.click(session, Section.FACADES)
+        with self.assertRaises(rollups.RollupConflict):
+            rollups._roll_events(stale)
+        self.assertEqual(rollups.clicks_by_section()[Section.FACADES], 1)
+
+
+@override_settings(COUNTERS_FLUSH_INTERVAL=0)
+class SessionStatsTests(AnalyticsMixin, TestCase):
+    def session(self, minutes_ago, **fields):
+        session = UsageSession.objects.create()
+        started = timezone.now() - datetime.timedelta(minutes=minutes_ago)
+        UsageSession.objects.filter(pk=session.pk).update(started_at=started, **fields)
+        session.refresh_from_db()
+        return session
+
+    def test_stop_stores_duration(self):
+        session = self.session(10)
+        response = self.client.post("/api/perf/session-stop/", {
+            "session_id": str(session.pk), "subtract_idle_ms": 120_000,
+        }, content_type="application/json")
+        session.refresh_from_db()
+        self.assertAlmostEqual(session.duration, 480, delta=2)
+        self.assertEqual(response.json()["duration_seconds"], session.duration)
+
+    def test_close_sessions_freezes_abandoned_ones(self):
+        now = timezone.now()
+        abandoned = self.session(180)
+        self.click(abandoned, Section.FACADES, when=now - datetime.timedelta(minutes=120))
+        idle = self.session(90)                  # aucun clic : close à son début
+        active = self.session(60)
+        self.click(active, Section.FACADES, when=now - datetime.timedelta(minutes=5))
+        legacy = self.session(50, ended_at=now - datetime.timedelta(minutes=40))
+
+        call_command("close_sessions", "--idle", "30", stdout=io.StringIO())
+
+        for session in (abandoned, idle, active, legacy):
+            session.refresh_from_db()
+        self.assertAlmostEqual(abandoned.duration, 3600, delta=2)
+        self.assertEqual(idle.duration, 0)
+        self.assertIsNone(active.ended_at)
+        self.assertIsNone(active.duration)
+        self.assertAlmostEqual(legacy.duration, 600, delta=2)
+
+    def test_perf_stats_aggregates_in_sql(self):
+        group = ColorGroup.objects.create(name="G", section=Section.PLANS)
+        Color.objects.create(group=group, name="A", clicks=3)
+        Color.objects.create(group=group, name="B", clicks=4)
+        Color.objects.create(name="Sans groupe", clicks=9)
+        for minutes in (10, 20):
+            self.session(minutes, ended_at=timezone.now(), duration=minutes * 60)
+        self.session(5)  # en cours : durée mesurée
+        UsageSession.objects.bulk_create([UsageSession(duration=60, ended_at=timezone.now()) for _ in range(50)])
+
+        with CaptureQueriesContext(connections["analytics"]) as analytics, \
+                CaptureQueriesContext(connections["default"]) as default:
+            stats = self.client.get("/api/perf/stats/").json()
+        self.assertEqual(len(analytics.captured_queries), 2)
+        self.assertEqual(len(default.captured_queries), 1)
+
+        self.assertEqual(stats["sessions"], 53)
+        self.assertAlmostEqual(stats["total_duration_seconds"], 1800 + 300 + 3000, delta=2)
+        self.assertEqual(stats["avg_duration_seconds"], stats["total_duration_seconds"] // 53)
+        self.assertEqual(stats["sections"][Section.PLANS], {"elements": 2, "clicks": 7})
+        self.assertEqual(stats["sections"][Section.FACADES], {"elements": 0, "clicks": 0})
+
+
+class TimeseriesTests(AnalyticsMixin, TestCase):
+    def setUp(self):
+        self.day = timezone.localdate() - datetime.timedelta(days=10)
+        noon = timezone.make_aware(datetime.datetime.combine(self.day, datetime.time(12)))
+        session = UsageSession.objects.create(duration=90, ended_at=noon)
+        UsageSession.objects.filter(pk=session.pk).update(started_at=noon)
+        for when, section in [(noon, Section.FACADES)] * 2 + [
+            (noon + datetime.timedelta(hours=2), Section.PLANS),
+            (noon + datetime.timedelta(days=2), Section.FACADES),
+        ]:
+            self.click(session, section, when=when)
+        rollups.run()
+
+    def series(self, **params):
+        params.setdefault("from", self.day.isoformat())
+        params.setdefault("to", (self.day + datetime.timedelta(days=2)).isoformat())
+        return self.client.get("/api/perf/timeseries/", params)
+
+    def test_daily_clicks_are_parallel_arrays(self):
+        data = self.series().json()
+        self.assertEqual(data["t"], [(self.day + datetime.timedelta(days=i)).isoformat() for i in range(3)])
+        self.assertEqual(data["series"], {
+            Section.FACADES: [2, 0, 1], Section.PLANS: [1, 0, 0],
+            Section.ESPACES: [0, 0, 0], Section.AMBIANCES: [0, 0, 0],
+        })
+        self.assertEqual(self.series(section=Section.PLANS).json()["series"], {Section.PLANS: [1, 0, 0]})
+
+    def test_hourly_and_session_metrics(self):
+        data = self.series(bucket="hour", to=self.day.isoformat(), section=Section.FACADES).json()
+        self.assertEqual(len(data["t"]), 24)
+        self.assertEqual(data["t"][12], f"{self.day.isoformat()}T12:00")
+        self.assertEqual(data["series"][Section.FACADES][12], 2)
+        self.assertEqual(sum(data["series"][Section.FACADES]), 2)
+
+        self.assertEqual(self.series(metric="sessions").json()["series"], {"all": [1, 0, 0]})
+        self.assertEqual(self.series(metric="duration").json()["series"], {"all": [90, 0, 0]})
+
+    def test_invalid_parameters(self):
+        for params in ({"metric": "views"}, {"bucket": "week"}, {"section": "cuisine"},
+                       {"from": "2026-13-01"}, {"bucket": "hour", "from": "2025-01-01"}):
+            self.assertEqual(self.series(**params).status_code, 400, params)
+
+
+class ArchiveTests(AnalyticsMixin, TempMediaMixin, TestCase):
+    def test_archive_rolled_up_events(self):
+        directory = Path(self.media) / "archives"
+        session = UsageSession.objects.create()
+        old = timezone.now() - datetime.timedelta(days=400)
+        archived = [self.click(session, Section.FACADES, color_id=9, when=old) for _ in range(3)]
+        rollups.run()
+        recent = self.click(session, Section.FACADES)           # trop récent
+        not_rolled = self.click(session, Section.PLANS, when=old)  # pas encore agrégé
+        cutoff = timezone.now() - datetime.timedelta(days=30)
+
+        stats = archive.archive(cutoff, directory, read_chunk=2, delete_batch=2, log=lambda msg: None)
+
+        self.assertEqual((stats["archived"], stats["deleted"]), (3, 3))
+        self.assertEqual(
+            set(ClickEvent.objects.values_list("pk", flat=True)), {recent.pk, not_rolled.pk},
+        )
+        rows = list(archive.iter_events(directory))
+        self.assertEqual([r["id"] for r in rows], [e.pk for e in archived])
+        self.assertEqual(rows[0]["color_id"], 9)
+        self.assertIsNone(archive.load_manifest(directory)["pending"])
+        self.assertEqual(rollups.clicks_by_section()[Section.FACADES], 3)
+
+        # relance : rien n'est archivé deux fois
+        self.assertEqual(archive.archive(cutoff, directory, log=lambda msg: None)["archived"], 0)
+
+
+class MoveAnalyticsTests(TestCase):
+    databases = "__all__"
+
+    def test_copies_legacy_columns_only(self):
+        # anciennes tables de la base default : ended_at_client, pas de duration
+        session_id = "0" * 31 + "1"
+        with connections["default"].cursor() as cursor:
+            cursor.execute(
+                'CREATE TABLE "schmidt_app_usagesession" ("id" char(32) PRIMARY KEY, '
+                '"started_at" datetime NOT NULL, "ended_at" datetime NULL, "ended_at_client" datetime NULL, '
+                '"idle_ms" integer NOT NULL, "clicks_count" integer NOT NULL, "client_id" varchar(64) NOT NULL, '
+                '"user_agent" varchar(255) NOT NULL, "remote_addr" char(39) NULL)'
+            )
+            cursor.execute(
+                'CREATE TABLE "schmidt_app_clickevent" ("id" integer PRIMARY KEY AUTOINCREMENT, '
+                '"created_at" datetime NOT NULL, "section" varchar(20) NOT NULL, "action" varchar(32) NOT NULL, '
+                '"meta" text NOT NULL, "color_id" bigint NULL, "session_id" char(32) NOT NULL)'
+            )
+            cursor.execute(
+                "INSERT INTO schmidt_app_usagesession VALUES (%s, '2025-03-01 10:00:00', "
+                "'2025-03-01 10:05:00', NULL, 0, 2, 'kiosk', '', NULL)",
+                [session_id],
+            )
+            cursor.execute(
+                "INSERT INTO schmidt_app_clickevent (created_at, section, action, meta, color_id, session_id) "
+                "VALUES ('2025-03-01 10:01:00', 'facades', 'bubble', '{}', 12, %s)",
+                [session_id],
+            )
+
+        call_command("move_analytics", stdout=io.StringIO())
+        call_command("move_analytics", stdout=io.StringIO())  # relançable sans doublon
+
+        session = UsageSession.objects.get()
+        self.assertEqual((session.client_id, session.clicks_count, session.duration), ("kiosk", 2, None))
+        event = ClickEvent.objects.get()
+        self.assertEqual((event.session_id.hex, event.color_id, event.meta), (session_id, 12, {}))
+
+
+# ---------- Export CSV ----------
+class CsvTests(TestCase):
+    def test_formula_cells_are_escaped(self):
+        rows = [("=HYPERLINK(\"x\")", "+33", "-1", "@SUM(A1)", "\tx", "\rx", "ok", -4, None)]
+        text = "".join(iter_csv(["=a", "b"], rows))
+        self.assertTrue(text.startswith("\ufeff"))
+        header, row = csv.reader(io.StringIO(text[1:], newline=""))
+        self.assertEqual(header, ["'=a", "b"])
+        self.assertEqual(row, ["'=HYPERLINK(\"x\")", "'+33", "'-1", "'@SUM(A1)", "'\tx", "'\rx", "ok", "-4", ""])
@@ -7,17 +7,27 @@ urlpatterns = [
     path("dashboard/", views.dashboard, name="dashboard"),
     path("first-login/", views.force_change_password, name="force_change_password"),
 
+    # API Catalogue (bundle complet, ETag + gzip/brotli)
+    path("api/catalog/", views.catalog_bundle, name="catalog_bundle"),
+
     # API Groupes
     path("api/groups/", views.groups_list, name="groups_list"),
     path("api/groups/<slug:slug>/", views.group_detail, name="group_detail"),
     path("api/groups/<slug:slug>/colors/", views.group_colors_create, name="group_colors_create"),
     path("api/groups/<slug:slug>/colors/reorder", views.group_colors_reorder, name="group_colors_reorder"),
+    path("api/groups/<slug:slug>/move/", views.group_move, name="group_move"),
+
+    # Recherche
+    path("api/search/", views.search_catalog, name="search_catalog"),
 
     # API Couleurs
     path("api/colors/", views.colors_list, name="colors_list"),
     path("api/colors/<int:color_id>/", views.color_detail, name="color_detail"),
+    path("api/colors/<int:color_id>/move/", views.color_move, name="color_move"),
     path("api/colors/<int:color_id>/images/", views.color_images, name="color_images"),
+    path("api/colors/<int:color_id>/images/status/", views.color_images_status, name="color_images_status"),
     path("api/colors/<int:color_id>/images/<int:image_id>/", views.color_image_detail, name="color_image_detail"),
+    path("api/colors/<int:color_id>/images/<int:image_id>/move/", views.color_image_move, name="color_image_move"),
 
     # Auth
     path("login/", views.login_view, name="login"),
@@ -33,7 +43,10 @@ urlpatterns = [
     path("api/perf/session-start/", views.perf_session_start, name="perf_session_start"),
     path("api/perf/session-stop/", views.perf_session_stop, name="perf_session_stop"),
     path("api/perf/track/", views.perf_track, name="perf_track"),
+    path("api/perf/track/batch/", views.perf_track_batch, name="perf_track_batch"),
     path("api/perf/stats/", views.perf_stats, name="perf_stats"),
     path("api/perf/breakdown/<str:section>/", views.perf_breakdown, name="perf_breakdown"),
+    path("api/perf/timeseries/", views.perf_timeseries, name="perf_timeseries"),
+    path("api/perf/export.csv", views.perf_export_csv, name="perf_export_csv"),
 
 ]
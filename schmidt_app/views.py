@@ -9,20 +9,30 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.password_validation import validate_password, ValidationError
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.core.mail import EmailMessage
-from django.db.models import Prefetch
-from django.http import JsonResponse
+from django.db.models import IntegerField, Value
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
 from django.shortcuts import get_object_or_404, render, redirect
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils.crypto import get_random_string
 from django.utils.dateparse import parse_datetime
 from django.utils.encoding import force_str, force_bytes
-from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.http import parse_etags, urlsafe_base64_decode, urlsafe_base64_encode
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.http import require_http_methods
 
 from accounts.models import Role
-from .models import ColorGroup, Color, ColorImage, Section
+from . import jobs, search
+from .catalog import SUPPORTED_ENCODINGS, bump_revision, get_bundle, get_snapshot
+from .models import ColorGroup, Color, ColorImage, ImageStatus, JobStatus, Section
+from .ordering import POSITION_GAP, move_before, next_position, renumber
+from .pagination import PaginationError, page_params, paginate, requested_fields
+from .serializers import (
+    COLOR_FIELDS, GROUP_FIELDS, color_dict, color_queryset, colors_prefetch, group_dict,
+    image_dict, prefetch_group_colors,
+)
+from .streaming import stream_csv, stream_queryset, wants_stream
 
 
 # ---------------------------
@@ -31,6 +41,10 @@ from .models import ColorGroup, Color, ColorImage, Section
 
 
 
+COLOR_KEYSET = ("group_pos", "position", "name", "id")
+GROUP_KEYSET = ("position", "name", "id")
+
+
 def _get_section(request):
     s = (request.GET.get('section') or request.POST.get('section') or '').strip().lower()
     return s if s in dict(Section.choices) else Section.FACADES
@@ -43,9 +57,19 @@ def _json_payload(request):
         return {}
 
 
-def _next_position(qs, field="position"):
-    last = qs.order_by(f"-{field}").values_list(field, flat=True).first()
-    return (last or 0) + 1
+def _paginated(request, qs, keys, serialize):
+    """
+    {"results": [...]} ; avec ?limit / ?cursor : page keyset + "next" ;
+    avec ?stream=1 (sans limit) : liste complète émise en flux.
+    Lève PaginationError si les paramètres sont invalides.
+    """
+    limit, cursor = page_params(request)
+    if limit is None:
+        if wants_stream(request):
+            return stream_queryset("results", qs.order_by(*keys), serialize)
+        return JsonResponse({"results": [serialize(o) for o in qs.order_by(*keys)]})
+    rows, next_cursor = paginate(qs, keys, limit, cursor)
+    return JsonResponse({"results": [serialize(o) for o in rows], "next": next_cursor})
 
 
 # ---------- helpers d’autorisation ----------
@@ -70,21 +94,12 @@ def role_required(*allowed_roles):
 # ---------------------------
 
 def index(request):
-    # Préfetch images + ordre pour éviter N+1
-    colors_qs = (
-        Color.objects.order_by("position", "name")
-        .prefetch_related(Prefetch("images", queryset=ColorImage.objects.order_by("position", "id")))
-    )
+    # Snapshot versionné : reconstruit une fois par révision du catalogue et par worker
+    snapshot = get_snapshot()
     ctx = {}
-    for code, label in Section.choices:
-        groups = (
-            ColorGroup.objects
-            .filter(section=code)
-            .order_by("position", "name")
-            .prefetch_related(Prefetch("colors", queryset=colors_qs))
-        )
-        ctx[f"groups_{code}"] = groups
-        ctx[f"label_{code}"] = label
+    for section in snapshot["sections"]:
+        ctx[f"groups_{section['code']}"] = section["groups"]
+        ctx[f"label_{section['code']}"] = section["label"]
 
     return render(request, "index.html", ctx)
 
@@ -244,8 +259,12 @@ def reset_password_confirm(request, uidb64, token):
 # API UTILISATEURS (ADMIN)
 # ---------------------------
 
-def _user_dict(u):
-    return {
+USER_FIELDS = ("id", "email", "first_name", "last_name", "role", "is_active")
+USER_KEYSET = ("last_name", "first_name", "id")
+
+
+def _user_dict(u, fields=None):
+    d = {
         "id": u.id,
         "email": u.email,
         "first_name": u.first_name,
@@ -253,6 +272,9 @@ def _user_dict(u):
         "role": u.role,
         "is_active": u.is_active,
     }
+    if fields is not None:
+        d = {k: v for k, v in d.items() if k == "id" or k in fields}
+    return d
 
 
 @require_http_methods(["GET", "POST"])
@@ -260,14 +282,20 @@ def _user_dict(u):
 @role_required(getattr(Role, "ADMIN", "ADMIN"))
 def users_list_create(request):
     """
-    GET  -> liste des utilisateurs
+    GET  -> liste des utilisateurs (?limit, ?cursor, ?fields, ?stream=1)
     POST -> crée un utilisateur avec mdp temporaire et must_change_password=True
     """
     User = get_user_model()
 
     if request.method == "GET":
-        users = User.objects.order_by("last_name", "first_name").all()
-        return JsonResponse({"results": [_user_dict(u) for u in users]})
+        try:
+            fields = requested_fields(request, USER_FIELDS)
+            return _paginated(
+                request, User.objects.all(), USER_KEYSET,
+                lambda u: _user_dict(u, fields=fields),
+            )
+        except PaginationError as e:
+            return JsonResponse({"error": str(e)}, status=400)
 
     data = request.POST or _json_payload(request)
     email = (data.get("email") or "").strip().lower()
@@ -371,6 +399,59 @@ def user_detail(request, user_id: int):
     return JsonResponse(_user_dict(u))
 
 
+# ---------------------------
+# API Catalogue (bundle complet)
+# ---------------------------
+
+def _pick_encoding(accept_encoding: str) -> str:
+    """Choisit br/gzip selon Accept-Encoding (q=0 = refusé)."""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    for encoding in SUPPORTED_ENCODINGS:
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return "identity"
+
+
+@require_http_methods(["GET", "HEAD"])
+def catalog_bundle(request):
+    """
+    GET /api/catalog/ -> { "revision": n, "sections": { <code>: { "label", "groups": [...] } } }
+    Chaque couleur porte sa présentation et sa galerie complète.
+    ETag fort = révision du catalogue ; If-None-Match -> 304 sans corps.
+    """
+    bundle = get_bundle()
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        etags = [t.removeprefix("W/") for t in parse_etags(if_none_match)]
+        if "*" in etags or bundle.etag in etags:
+            response = HttpResponseNotModified()
+            response["ETag"] = bundle.etag
+            response["Cache-Control"] = "no-cache"
+            response["Vary"] = "Accept-Encoding"
+            return response
+
+    encoding = _pick_encoding(request.headers.get("Accept-Encoding", ""))
+    response = HttpResponse(bundle.body(encoding), content_type="application/json")
+    if encoding != "identity":
+        response["Content-Encoding"] = encoding
+    response["ETag"] = bundle.etag
+    # le navigateur garde le corps et revalide à chaque chargement (304 si inchangé)
+    response["Cache-Control"] = "no-cache"
+    response["Vary"] = "Accept-Encoding"
+    return response
+
+
 # ---------------------------
 # API Groupes
 # ---------------------------
@@ -380,13 +461,22 @@ def user_detail(request, user_id: int):
 def groups_list(request):
     """
     GET  -> liste des groupes de la section (?section=facades|plans|espaces|ambiances)
+            ?limit, ?cursor, ?fields (voir pagination.py ; sans "colors", pas de prefetch)
     POST -> crée un groupe {name, section?}
     """
     if request.method == "GET":
         section = _get_section(request)
-        groups = ColorGroup.objects.filter(section=section).order_by("position", "name")
-        data = [_group_dict(request, g) for g in groups]
-        return JsonResponse({"results": data})
+        try:
+            fields = requested_fields(request, GROUP_FIELDS)
+            groups = ColorGroup.objects.filter(section=section)
+            if fields is None or "colors" in fields:
+                groups = groups.prefetch_related(colors_prefetch())
+            return _paginated(
+                request, groups, GROUP_KEYSET,
+                lambda g: group_dict(request, g, fields=fields),
+            )
+        except PaginationError as e:
+            return JsonResponse({"error": str(e)}, status=400)
 
     # POST
     payload = _json_payload(request)
@@ -398,9 +488,9 @@ def groups_list(request):
     group = ColorGroup.objects.create(
         name=name,
         section=section,
-        position=_next_position(ColorGroup.objects.filter(section=section)),
+        position=next_position(ColorGroup.objects.filter(section=section)),
     )
-    return JsonResponse(_group_dict(request, group), status=201)
+    return JsonResponse(group_dict(request, group), status=201)
 
 
 @require_http_methods(["PATCH", "DELETE"])
@@ -421,7 +511,8 @@ def group_detail(request, slug):
             group.position = payload["position"]; changed = True
         if changed:
             group.save()
-        return JsonResponse(_group_dict(request, group))
+        prefetch_group_colors([group])
+        return JsonResponse(group_dict(request, group))
 
     group.delete()
     return JsonResponse({}, status=204)
@@ -444,9 +535,9 @@ def group_colors_create(request, slug):
     color = Color.objects.create(
         group=group,
         name=name,
-        position=_next_position(group.colors.all())
+        position=next_position(group.colors.all())
     )
-    return JsonResponse(_color_dict(request, color), status=201)
+    return JsonResponse(color_dict(request, color), status=201)
 
 
 @require_http_methods(["PATCH"])
@@ -467,12 +558,100 @@ def group_colors_reorder(request, slug):
     if len(colors) != len(order):
         return JsonResponse({"error": "some color ids do not belong to this group"}, status=400)
 
-    for pos, cid in enumerate(order):
-        Color.objects.filter(id=cid).update(position=pos)
+    renumber(group.colors.all(), order)  # un seul UPDATE … CASE
+    bump_revision()  # .update() ne déclenche pas les signaux
 
     return JsonResponse({"ok": True})
 
 
+def _move(siblings, ordering, item_id, before):
+    """
+    Place l'élément juste avant `before` (None : en dernier) ; une ligne écrite
+    tant qu'il reste de la place entre les voisins (voir ordering.py).
+    """
+    if before is not None and not isinstance(before, int):
+        return JsonResponse({"error": "before must be an id or null"}, status=400)
+    if before == item_id:
+        return JsonResponse({"ok": True, "updated": 0})
+    try:
+        updated = move_before(siblings, ordering, item_id, before)
+    except ValueError:
+        return JsonResponse({"error": "before is not in the same list"}, status=400)
+    bump_revision()  # .update() ne déclenche pas les signaux
+    return JsonResponse({"ok": True, "updated": updated})
+
+
+@require_http_methods(["POST"])
+@csrf_protect
+def group_move(request, slug):
+    """
+    POST /api/groups/<slug>/move/
+    Body: { "before": "<slug>" | null }  -> glisser-déposer d'un groupe dans sa section
+    """
+    group = get_object_or_404(ColorGroup, slug=slug)
+    siblings = ColorGroup.objects.filter(section=group.section)
+    before = _json_payload(request).get("before")
+    if before is not None:
+        before = siblings.filter(slug=before).values_list("pk", flat=True).first()
+        if before is None:
+            return JsonResponse({"error": "before is not a group of the same section"}, status=400)
+    return _move(siblings, GROUP_KEYSET, group.pk, before)
+
+
+@require_http_methods(["POST"])
+@csrf_protect
+def color_move(request, color_id: int):
+    """
+    POST /api/colors/<id>/move/
+    Body: { "before": <color_id> | null }  -> glisser-déposer d'une couleur dans son groupe
+    """
+    color = get_object_or_404(Color, pk=color_id)
+    siblings = Color.objects.filter(group_id=color.group_id)
+    return _move(siblings, ("position", "name", "id"), color.pk, _json_payload(request).get("before"))
+
+
+@require_http_methods(["POST"])
+@csrf_protect
+def color_image_move(request, color_id: int, image_id: int):
+    """
+    POST /api/colors/<id>/images/<image_id>/move/
+    Body: { "before": <image_id> | null }  -> glisser-déposer dans la galerie
+    """
+    color = get_object_or_404(Color, pk=color_id)
+    img = get_object_or_404(ColorImage, color=color, pk=image_id, is_presentation=False)
+    siblings = color.images.filter(is_presentation=False)
+    return _move(siblings, ("position", "id"), img.pk, _json_payload(request).get("before"))
+
+
+# ---------------------------
+# Recherche (index FTS5, voir search.py)
+# ---------------------------
+
+@require_http_methods(["GET"])
+def search_catalog(request):
+    """
+    GET /api/search/?q=ecru&section=facades&limit=20
+    -> { "colors": [...], "groups": [...] } classés par pertinence
+    Préfixes et accents ignorés : « ecr » trouve « Écru ».
+    """
+    q = (request.GET.get("q") or "").strip()
+    section = (request.GET.get("section") or "").strip().lower() or None
+    if section and section not in dict(Section.choices):
+        return JsonResponse({"error": "unknown section"}, status=400)
+    try:
+        limit = min(max(int(request.GET.get("limit") or 20), 1), 100)
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer"}, status=400)
+
+    color_ids, group_ids = search.search(q, section=section, limit=limit)
+    colors = color_queryset().in_bulk(color_ids)
+    groups = ColorGroup.objects.in_bulk(group_ids)
+    return JsonResponse({
+        "colors": [color_dict(request, colors[i]) for i in color_ids if i in colors],
+        "groups": [group_dict(request, groups[i], with_colors=False) for i in group_ids if i in groups],
+    })
+
+
 # ---------------------------
 # API Couleurs (PAR ID)
 # ---------------------------
@@ -481,9 +660,22 @@ def group_colors_reorder(request, slug):
 def colors_list(request):
     """
     GET /api/colors/ -> liste de toutes les couleurs (à plat)
+        ?stream=1 -> liste complète émise en flux (mémoire constante)
+        ?limit, ?cursor -> pagination keyset sur (group__position, position, name, id)
+        ?fields=id,name -> seuls ces champs ; presentation / group_slug non joints si absents
     """
-    colors = Color.objects.select_related("group").all().order_by("group__position", "position", "name")
-    return JsonResponse({"results": [_color_dict(request, c) for c in colors]})
+    try:
+        fields = requested_fields(request, COLOR_FIELDS)
+        # groupe absent -> -1 : même ordre que "group__position" (NULL en tête)
+        colors = color_queryset(fields).annotate(
+            group_pos=Coalesce("group__position", Value(-1), output_field=IntegerField()),
+        )
+        return _paginated(
+            request, colors, COLOR_KEYSET,
+            lambda c: color_dict(request, c, fields=fields),
+        )
+    except PaginationError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
 
 @require_http_methods(["PATCH", "DELETE"])
@@ -514,7 +706,7 @@ def color_detail(request, color_id: int):
 
         if fields:
             color.save(update_fields=fields)
-        return JsonResponse(_color_dict(request, color))
+        return JsonResponse(color_dict(request, color))
 
     # DELETE
     color.delete()
@@ -533,6 +725,8 @@ def color_images(request, color_id: int):
     POST /api/colors/<id>/images/ (multipart):
          - files=[...] (ou file=...)
          - is_presentation=true|false
+         -> images créées en status "pending" ; déclinaisons produites par
+            run_workers (jobs.py), suivi via GET .../images/status/
     PATCH /api/colors/<id>/images/ :
          { "order":[ids...] }  OU  { "presentation_id": id }
     """
@@ -542,9 +736,9 @@ def color_images(request, color_id: int):
         pres = color.presentation
         gallery = color.images.filter(is_presentation=False).order_by("position", "id")
         return JsonResponse({
-            "color": _color_dict(request, color, with_presentation=False),
-            "presentation": _image_dict(request, pres) if pres else None,
-            "gallery": [_image_dict(request, g) for g in gallery],
+            "color": color_dict(request, color, with_presentation=False),
+            "presentation": image_dict(request, pres) if pres else None,
+            "gallery": [image_dict(request, g) for g in gallery],
         })
 
     if request.method == "POST":
@@ -554,15 +748,19 @@ def color_images(request, color_id: int):
             return JsonResponse({"error": "no file provided"}, status=400)
 
         created = []
-        start_pos = color.images.filter(is_presentation=False).count()
+        start_pos = next_position(color.images.filter(is_presentation=False))
         for i, f in enumerate(files):
             img = ColorImage.objects.create(
                 color=color,
                 image=f,
                 is_presentation=is_presentation and i == 0,
-                position=0 if is_presentation else (start_pos + i),
+                position=0 if is_presentation else (start_pos + i * POSITION_GAP),
+                status=ImageStatus.PENDING,
             )
-            created.append(_image_dict(request, img))
+            job = jobs.enqueue("process_image", image_id=img.id)
+            if job.status != JobStatus.PENDING:  # JOBS_EAGER : déjà traitée
+                img.refresh_from_db(fields=["status", "width", "height", "variants"])
+            created.append(image_dict(request, img))
         return JsonResponse({"created": created}, status=201)
 
     # PATCH (order or presentation_id)
@@ -576,8 +774,8 @@ def color_images(request, color_id: int):
         if len(imgs) != len(order):
             return JsonResponse({"error": "some image ids do not belong to this color's gallery"}, status=400)
 
-        for pos, iid in enumerate(order):
-            ColorImage.objects.filter(id=iid).update(position=pos)
+        renumber(color.images.all(), order)  # un seul UPDATE … CASE
+        bump_revision()  # .update() ne déclenche pas les signaux
 
         return JsonResponse({"ok": True})
 
@@ -590,6 +788,31 @@ def color_images(request, color_id: int):
     return JsonResponse({"error": "Nothing to update."}, status=400)
 
 
+@require_http_methods(["GET"])
+def color_images_status(request, color_id: int):
+    """
+    GET /api/colors/<id>/images/status/[?ids=1,2,3]
+    -> { "pending": n, "images": [ {id, status, width, height, srcset, srcset_webp}, ... ] }
+    Interrogé par le dashboard après un téléversement, jusqu'à pending == 0.
+    """
+    color = get_object_or_404(Color, pk=color_id)
+    qs = color.images.order_by("position", "id")
+    raw_ids = request.GET.get("ids")
+    if raw_ids:
+        try:
+            qs = qs.filter(id__in=[int(i) for i in raw_ids.split(",") if i.strip()])
+        except ValueError:
+            return JsonResponse({"error": "ids must be a comma-separated list of integers"}, status=400)
+    images = []
+    for img in qs:
+        d = image_dict(request, img)
+        images.append({k: d[k] for k in ("id", "status", "width", "height", "srcset", "srcset_webp")})
+    return JsonResponse({
+        "pending": sum(1 for d in images if d["status"] == ImageStatus.PENDING),
+        "images": images,
+    })
+
+
 @require_http_methods(["PATCH", "DELETE"])
 @csrf_protect
 def color_image_detail(request, color_id: int, image_id: int):
@@ -612,59 +835,20 @@ def color_image_detail(request, color_id: int, image_id: int):
         img.is_presentation = bool(payload["is_presentation"]); fields.append("is_presentation")
     if fields:
         img.save(update_fields=fields)
-        return JsonResponse(_image_dict(request, img))
+        return JsonResponse(image_dict(request, img))
     return JsonResponse({"error": "No changes"}, status=400)
 
 
-# ---------------------------
-# Serializers utilitaires
-# ---------------------------
-
-def _image_dict(request, img: ColorImage):
-    return {
-        "id": img.id,
-        "url": request.build_absolute_uri(img.image.url),
-        "is_presentation": img.is_presentation,
-        "position": img.position,
-        "alt": img.alt or "",
-    }
-
-
-def _color_dict(request, color: Color, with_presentation=True):
-    d = {
-        "id": color.id,
-        "name": color.name,
-        "slug": color.slug,  # utile côté UI/affichage
-        "position": color.position,
-        "group_slug": color.group.slug if color.group else None,
-    }
-    if with_presentation:
-        pres = color.presentation
-        d["presentation"] = _image_dict(request, pres) if pres else None
-        d["gallery_count"] = color.images.filter(is_presentation=False).count()
-    return d
-
-
-def _group_dict(request, group: ColorGroup, with_colors=True):
-    d = {
-        "id": group.id,
-        "name": group.name,
-        "slug": group.slug,
-        "position": group.position,
-        "section": getattr(group, "section", None),
-    }
-    if with_colors:
-        colors = group.colors.order_by("position", "name").all()
-        d["colors"] = [_color_dict(request, c) for c in colors]
-    return d
-
-
 import json
+import uuid
+from collections import Counter
+
 from django.db.models import F, Sum, Count
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST, require_GET
 from django.http import JsonResponse, HttpResponseBadRequest
+from . import counters, rollups
 from .models import UsageSession, ClickEvent, Color, ColorGroup, Section
 
 def _ip(request):
@@ -731,7 +915,8 @@ def perf_session_stop(request):
     if s.ended_at is None:
         s.ended_at = timezone.now()
 
-    s.save(update_fields=["ended_at", "ended_at_client", "idle_ms"])
+    s.duration = s.measure_duration()
+    s.save(update_fields=["ended_at", "ended_at_client", "idle_ms", "duration"])
 
     return JsonResponse({"duration_seconds": s.duration_seconds})
 
@@ -765,24 +950,105 @@ def perf_track(request):
     if not session:
         return HttpResponseBadRequest("session invalide")
 
-    color = None
     color_id = data.get("color_id")
     if color_id:
-        color = Color.objects.filter(pk=color_id).first()
-        if color:
-            Color.objects.filter(pk=color.pk).update(clicks=F("clicks") + 1)
+        color_id = Color.objects.filter(pk=color_id).values_list("pk", flat=True).first()
 
     ClickEvent.objects.create(
         session=session,
         section=section,
-        color=color,
+        color_id=color_id or None,
         action=action,
         meta=data.get("meta") or {},
     )
-    UsageSession.objects.filter(pk=session.pk).update(clicks_count=F("clicks_count") + 1)
+    # compteurs en écriture différée (counters.py)
+    counters.add({color_id: 1} if color_id else None, {session.pk: 1})
     return JsonResponse({}, status=204)
 
+
+MAX_TRACK_BATCH = 500
+
+
+@csrf_exempt
+@require_POST
+def perf_track_batch(request):
+    """
+    Body: { "events": [ {session_id, action, section, color_id?, meta?}, ... ] }
+    (session_id peut être donné une fois à la racine). Envoyé par le tracker
+    de script.js à intervalle régulier ou par sendBeacon à la sortie de page.
+    -> { "accepted": n, "rejected": m } ; les événements invalides sont ignorés.
+    Deux lectures (sessions, couleurs), un bulk_create ; compteurs via counters.py.
+    """
+    try:
+        data = json.loads(request.body or "{}")
+    except json.JSONDecodeError:
+        return HttpResponseBadRequest("JSON invalide")
+    events = data.get("events") if isinstance(data, dict) else None
+    if not isinstance(events, list):
+        return HttpResponseBadRequest("events doit être une liste")
+    if len(events) > MAX_TRACK_BATCH:
+        return HttpResponseBadRequest(f"{MAX_TRACK_BATCH} événements maximum par lot")
+
+    sections = dict(Section.choices)
+    parsed = []
+    for e in events:
+        if not isinstance(e, dict):
+            continue
+        try:
+            sid = uuid.UUID(str(e.get("session_id") or data.get("session_id")))
+        except ValueError:
+            continue
+        action, section, color_id = e.get("action"), e.get("section"), e.get("color_id")
+        if not (isinstance(action, str) and action and section in sections):
+            continue
+        meta = e.get("meta")
+        parsed.append((
+            sid, action[:32], section,
+            color_id if isinstance(color_id, int) and color_id > 0 else None,
+            meta if isinstance(meta, dict) else {},
+        ))
+
+    session_ids = set(UsageSession.objects.filter(pk__in={p[0] for p in parsed}).values_list("pk", flat=True))
+    color_ids = set(Color.objects.filter(pk__in={p[3] for p in parsed if p[3]}).values_list("pk", flat=True))
+    rows = [
+        ClickEvent(
+            session_id=sid, action=action, section=section, meta=meta,
+            color_id=color_id if color_id in color_ids else None,
+        )
+        for sid, action, section, color_id, meta in parsed
+        if sid in session_ids
+    ]
+    if rows:
+        ClickEvent.objects.bulk_create(rows, batch_size=MAX_TRACK_BATCH)
+        counters.add(
+            Counter(r.color_id for r in rows if r.color_id),
+            Counter(r.session_id for r in rows),
+        )
+    return JsonResponse({"accepted": len(rows), "rejected": len(events) - len(rows)})
+
 # ---------- Stats pour le dashboard ----------
+def _day_range(request):
+    """?from=AAAA-MM-JJ&to=AAAA-MM-JJ (bornes incluses, chacune optionnelle) -> (date|None, date|None)."""
+    bounds = []
+    for key in ("from", "to"):
+        raw = request.GET.get(key)
+        try:
+            bounds.append(dt.date.fromisoformat(raw) if raw else None)
+        except ValueError:
+            raise ValueError(f"{key} : date AAAA-MM-JJ attendue")
+    if bounds[0] and bounds[1] and bounds[0] > bounds[1]:
+        raise ValueError("from postérieur à to")
+    return tuple(bounds)
+
+
+def _rollup_info(day_from, day_to):
+    return {
+        "from": day_from.isoformat() if day_from else None,
+        "to": day_to.isoformat() if day_to else None,
+        "rolled_up_at": rollups.state().updated_at,
+    }
+
+
 @require_GET
 def perf_stats(request):
     """
@@ -793,48 +1059,245 @@ def perf_stats(request):
       "avg_duration_seconds": 29,
       "sections": { ... }
     }
+    ?from=&to= -> mêmes clés calculées sur les agrégats quotidiens (rollups.py),
+    durées des seules sessions closes, + "range".
     """
-    # 1) Prendre TOUTES les sessions (terminées ou en cours)
-    sessions = list(UsageSession.objects.all())
-    sessions_count = len(sessions)
-
-    # 2) La propriété duration_seconds gère déjà le cas en cours (effective_end = now)
-    total_duration = sum(s.duration_seconds for s in sessions)
+    try:
+        day_from, day_to = _day_range(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if day_from or day_to:
+        return _perf_stats_range(day_from, day_to)
+
+    counters.flush()  # incréments en attente dans ce processus
+    # 1) Sessions closes : durée figée en base (UsageSession.duration), agrégée en SQL
+    closed = UsageSession.objects.filter(duration__isnull=False).aggregate(n=Count("pk"), total=Sum("duration"))
+    # 2) Sessions en cours (peu nombreuses : close_sessions ferme les abandonnées)
+    open_sessions = UsageSession.objects.filter(duration__isnull=True).only(
+        "started_at", "ended_at", "ended_at_client", "idle_ms", "duration",
+    )
+    open_durations = [s.duration_seconds for s in open_sessions]
+    sessions_count = closed["n"] + len(open_durations)
+    total_duration = (closed["total"] or 0) + sum(open_durations)
     avg_duration = int(total_duration / sessions_count) if sessions_count else 0
 
-    # 3) Stats par section (clics cumulés sur les Color)
-    out = {}
-    for sec_value, _sec_label in Section.choices:
-        elements = Color.objects.filter(group__section=sec_value).count()
-        clicks = (
-            Color.objects
-                 .filter(group__section=sec_value)
-                 .aggregate(n=Sum("clicks"))["n"] or 0
-        )
-        out[sec_value] = {"elements": elements, "clicks": clicks}
+    # 3) Stats par section (clics cumulés sur les Color) : une requête GROUP BY
+    out = {sec_value: {"elements": 0, "clicks": 0} for sec_value, _sec_label in Section.choices}
+    per_section = (
+        Color.objects
+        .values("group__section")
+        .annotate(elements=Count("pk"), clicks=Sum("clicks"))
+        .order_by()
+    )
+    for row in per_section:
+        if row["group__section"] in out:
+            out[row["group__section"]] = {"elements": row["elements"], "clicks": row["clicks"] or 0}
 
     return JsonResponse({
         "sessions": sessions_count,
         "total_duration_seconds": total_duration,
         "avg_duration_seconds": avg_duration,
         "sections": out,
+        "unflushed": counters.pending(),
+    })
+
+
+def _perf_stats_range(day_from, day_to):
+    totals = rollups.sessions_between(day_from, day_to)
+    clicks = rollups.clicks_by_section(day_from, day_to)
+    elements = dict(
+        Color.objects.values("group__section").annotate(n=Count("pk")).order_by()
+        .values_list("group__section", "n")
+    )
+    return JsonResponse({
+        "sessions": totals["sessions"],
+        "total_duration_seconds": totals["duration_total"],
+        "avg_duration_seconds": int(totals["duration_total"] / totals["closed"]) if totals["closed"] else 0,
+        "sections": {
+            sec_value: {"elements": elements.get(sec_value, 0), "clicks": clicks.get(sec_value, 0)}
+            for sec_value, _sec_label in Section.choices
+        },
+        "range": _rollup_info(day_from, day_to),
     })
+
 @require_GET
 def perf_breakdown(request, section: str):
     """
     Détail des clics par élément pour une section.
     -> [{ "id": 1, "name": "...", "group": "...", "clicks": 12 }, ...]
+    ?stream=1 -> même JSON, émis en flux
+    ?from=&to= -> clics de la période (agrégats quotidiens, rollups.py)
     """
+    try:
+        day_from, day_to = _day_range(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if day_from or day_to:
+        return _perf_breakdown_range(request, section, day_from, day_to)
+
     colors = (
         Color.objects
         .filter(group__section=section)
-        .select_related("group")
         .order_by("-clicks", "group__position", "position", "name")
+        .values("id", "name", "group__name", "clicks")
+    )
+
+    def item(c):
+        return {
+            "id": c["id"],
+            "name": c["name"],
+            "group": c["group__name"] or "",
+            "clicks": c["clicks"],
+        }
+
+    if wants_stream(request):
+        return stream_queryset("items", colors, item)
+    return JsonResponse({"items": [item(c) for c in colors]})
+
+
+def _perf_breakdown_range(request, section, day_from, day_to):
+    # clics : base analytics ; noms : catalogue (bases distinctes, fusion ici)
+    clicks = rollups.clicks_by_color(section, day_from, day_to)
+    colors = (
+        Color.objects
+        .filter(group__section=section)
+        .order_by("group__position", "position", "name")
+        .values("id", "name", "group__name")
+    )
+    items = [
+        {"id": c["id"], "name": c["name"], "group": c["group__name"] or "", "clicks": clicks.get(c["id"], 0)}
+        for c in colors
+    ]
+    items.sort(key=lambda it: -it["clicks"])  # tri stable : l'ordre du catalogue départage
+    return JsonResponse({"items": items, "range": _rollup_info(day_from, day_to)})
+
+
+TIMESERIES_METRICS = ("clicks", "sessions", "duration")
+MAX_BUCKETS = {"day": 2 * 366, "hour": 31 * 24}
+DEFAULT_DAYS = {"day": 30, "hour": 2}
+
+
+@require_GET
+def perf_timeseries(request):
+    """
+    ?metric=clicks|sessions|duration&bucket=hour|day&section=…&from=…&to=…
+    -> {
+      "metric": "clicks", "bucket": "day",
+      "t": ["2026-01-01", "2026-01-02", …],
+      "series": {"facades": [3, 0, …], "plans": […], …}
+    }
+    Tableaux parallèles à "t" (un point par jour / heure, 0 si rien), lus
+    dans les agrégats (rollups.py). clicks : une série par section (ou la
+    seule ?section=) ; sessions, duration (secondes cumulées des sessions
+    closes) : une série "all". Par défaut : 30 derniers jours (2 en horaire).
+    """
+    metric = request.GET.get("metric", "clicks")
+    bucket = request.GET.get("bucket", "day")
+    section = request.GET.get("section") or None
+    if metric not in TIMESERIES_METRICS:
+        return HttpResponseBadRequest(f"metric : {'|'.join(TIMESERIES_METRICS)}")
+    if bucket not in MAX_BUCKETS:
+        return HttpResponseBadRequest("bucket : hour|day")
+    if section and section not in dict(Section.choices):
+        return HttpResponseBadRequest("section inconnue")
+    try:
+        day_from, day_to = _day_range(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    day_to = day_to or timezone.localdate()
+    day_from = day_from or day_to - dt.timedelta(days=DEFAULT_DAYS[bucket] - 1)
+    if day_from > day_to:
+        return HttpResponseBadRequest("from postérieur à to")
+
+    if bucket == "day":
+        points = [day_from + dt.timedelta(days=i) for i in range((day_to - day_from).days + 1)]
+    else:
+        # pas d'une heure en UTC (heures locales décalées au changement d'heure)
+        start, end = (
+            timezone.make_aware(dt.datetime.combine(day, dt.time.min)).astimezone(dt.timezone.utc)
+            for day in (day_from, day_to + dt.timedelta(days=1))
+        )
+        points = [start + dt.timedelta(hours=i) for i in range(int((end - start).total_seconds()) // 3600)]
+    if len(points) > MAX_BUCKETS[bucket]:
+        return HttpResponseBadRequest(f"période trop longue : {MAX_BUCKETS[bucket]} points maximum en bucket={bucket}")
+
+    if metric == "clicks":
+        data = rollups.click_series(bucket, points[0], points[-1], section)
+        keys = [section] if section else [sec_value for sec_value, _sec_label in Section.choices]
+        series = {key: [data.get((p, key), 0) for p in points] for key in keys}
+    else:
+        data = rollups.session_series(bucket, points[0], points[-1])
+        index = 0 if metric == "sessions" else 1
+        series = {"all": [data.get(p, (0, 0))[index] for p in points]}
+
+    if bucket == "day":
+        labels = [p.isoformat() for p in points]
+    else:
+        labels = [timezone.localtime(p).strftime("%Y-%m-%dT%H:%M") for p in points]
+    return JsonResponse({
+        "metric": metric,
+        "bucket": bucket,
+        "t": labels,
+        "series": series,
+        "rolled_up_at": rollups.state().updated_at,
+    })
+
+
+EXPORT_CHUNK = 2000  # lignes lues par aller-retour SQL
+
+
+def _csv_datetime(value):
+    return timezone.localtime(value).strftime("%Y-%m-%d %H:%M:%S") if value else ""
+
+
+@require_GET
+@user_passes_test(is_admin_or_manager, login_url="login")
+def perf_export_csv(request):
+    """
+    ?kind=events|sessions&from=AAAA-MM-JJ&to=AAAA-MM-JJ -> fichier CSV en flux.
+    Lecture par iterator(chunk_size) : mémoire constante quel que soit le
+    volume ; la base analytics est en WAL, l'export ne bloque pas les clics.
+    Noms de couleur / groupe : une seule requête sur le catalogue (dict id -> noms).
+    """
+    kind = request.GET.get("kind", "events")
+    if kind not in ("events", "sessions"):
+        return HttpResponseBadRequest("kind : events|sessions")
+    try:
+        day_from, day_to = _day_range(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    if kind == "events":
+        qs, date_field = ClickEvent.objects.all(), "created_at"
+    else:
+        qs, date_field = UsageSession.objects.all(), "started_at"
+    if day_from:
+        qs = qs.filter(**{f"{date_field}__gte": timezone.make_aware(dt.datetime.combine(day_from, dt.time.min))})
+    if day_to:
+        end = day_to + dt.timedelta(days=1)
+        qs = qs.filter(**{f"{date_field}__lt": timezone.make_aware(dt.datetime.combine(end, dt.time.min))})
+    qs = qs.order_by(date_field, "pk")
+    filename = f"{kind}_{day_from or 'debut'}_{day_to or timezone.localdate()}.csv"
+
+    if kind == "sessions":
+        fields = ("id", "started_at", "ended_at", "ended_at_client", "idle_ms", "duration",
+                  "clicks_count", "client_id", "user_agent", "remote_addr")
+        rows = (
+            (str(sid), _csv_datetime(started), _csv_datetime(ended), _csv_datetime(ended_client),
+             idle_ms, "" if duration is None else duration, clicks, client_id, user_agent, remote_addr or "")
+            for sid, started, ended, ended_client, idle_ms, duration, clicks, client_id, user_agent, remote_addr
+            in qs.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK)
+        )
+        return stream_csv(filename, fields, rows)
+
+    # couleurs supprimées depuis le clic : noms vides
+    names = {pk: (name, group or "") for pk, name, group in Color.objects.values_list("id", "name", "group__name")}
+    fields = ("id", "created_at", "session_id", "section", "action", "color_id", "meta")
+    rows = (
+        (pk, _csv_datetime(created), str(sid), section, action, color_id or "",
+         *names.get(color_id, ("", "")), json.dumps(meta, ensure_ascii=False) if meta else "")
+        for pk, created, sid, section, action, color_id, meta
+        in qs.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK)
     )
-    data = [{
-        "id": c.id,
-        "name": c.name,
-        "group": c.group.name if c.group_id else "",
-        "clicks": c.clicks,
-    } for c in colors]
-    return JsonResponse({"items": data})
+    header = ("id", "created_at", "session_id", "section", "action", "color_id", "color", "group", "meta")
+    return stream_csv(filename, header, rows)
@@ -0,0 +1,208 @@
+# schmidt_app/watcher.py
+"""
+Surveillance de l'arborescence couleurs/ pour `import_couleurs --watch`.
+
+    InotifyWatcher : inotify (Linux, via ctypes, sans dépendance)
+    PollingWatcher : repli, un stat() par dossier (jamais par fichier)
+
+Les deux retournent les dossiers touchés depuis l'appel précédent : le
+dossier parent pour un fichier ajouté / modifié / supprimé, le dossier
+lui-même pour un sous-dossier créé ou supprimé, la racine seulement si des
+événements ont été perdus (tout est alors à revoir).
+
+LeafIndex garde la liste des leaves de chaque section (mêmes règles que
+find_leaf_dirs_with_images) et ne reparcourt que les sous-arbres touchés.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+from .importer import find_leaf_dirs_with_images
+
+# inotify(7)
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class InotifyWatcher:
+    """Un watch par dossier ; les dossiers créés sont ajoutés au fil de l'eau."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._paths = {}  # wd -> dossier
+        try:
+            self._watch_tree(self.root)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch_tree(self, top: Path):
+        for root, dirs, files in os.walk(top):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(root), WATCH_MASK | IN_ONLYDIR)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                if errno == 28:  # ENOSPC : fs.inotify.max_user_watches atteint
+                    raise OSError(errno, "inotify_add_watch: limite de watches atteinte")
+                continue  # dossier supprimé entre-temps
+            self._paths[wd] = Path(root)
+
+    def changes(self, timeout: float) -> set:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        touched = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return touched
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    touched.add(self.root)  # événements perdus : tout est à revoir
+                    continue
+                if mask & IN_IGNORED:
+                    self._paths.pop(wd, None)
+                    continue
+                parent = self._paths.get(wd)
+                if parent is None:
+                    continue
+                if mask & IN_ISDIR:
+                    path = parent / os.fsdecode(name)
+                    touched.add(path)
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self._watch_tree(path)
+                elif parent != self.root:  # fichiers à la racine : hors sections
+                    touched.add(parent)
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """
+    Compare le mtime de chaque dossier (modifié à l'ajout, au retrait ou au
+    renommage d'une entrée) ; seuls les dossiers changés sont relistés.
+    Un fichier réécrit sur place sous le même nom n'est pas détecté.
+    """
+
+    def __init__(self, root: Path, interval: float = 2.0):
+        self.root = Path(root)
+        self.interval = interval
+        self._dirs = {}  # dossier -> (mtime_ns, sous-dossiers)
+        self._add_tree(self.root)
+
+    def _add_tree(self, top: Path):
+        for root, dirs, files in os.walk(top):
+            try:
+                self._dirs[Path(root)] = (os.stat(root).st_mtime_ns, frozenset(dirs))
+            except OSError:
+                continue
+
+    def changes(self, timeout: float) -> set:
+        time.sleep(min(timeout, self.interval))
+        touched = set()
+        for path, (mtime_ns, subdirs) in list(self._dirs.items()):
+            if path not in self._dirs:
+                continue  # retiré avec un parent pendant ce passage
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                current = None
+            if current == mtime_ns:
+                continue
+            if path != self.root:  # fichiers à la racine : hors sections
+                touched.add(path)
+            if current is None:
+                for known in [p for p in self._dirs if p == path or path in p.parents]:
+                    del self._dirs[known]
+                continue
+            with os.scandir(path) as entries:
+                now = frozenset(e.name for e in entries if e.is_dir(follow_symlinks=False))
+            self._dirs[path] = (current, now)
+            for name in now - subdirs:
+                touched.add(path / name)
+                self._add_tree(path / name)
+            for name in subdirs - now:
+                touched.add(path / name)
+        return touched
+
+    def close(self):
+        pass
+
+
+def make_watcher(root: Path, poll: float = 0):
+    """inotify si disponible (et poll non demandé), sinon polling."""
+    if not poll:
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError):  # AttributeError : pas d'inotify dans la libc
+            poll = 2.0
+    return PollingWatcher(root, poll)
+
+
+class LeafIndex:
+    """Leaves connus par section ; update() ne parcourt que les dossiers touchés."""
+
+    def __init__(self, base: Path, section_keys):
+        self.base = Path(base)
+        self.sections = {}
+        for key in section_keys:
+            root = self.base / key
+            self.sections[key] = set(find_leaf_dirs_with_images(root)) if root.is_dir() else set()
+
+    def update(self, touched):
+        """
+        Retourne (sections touchées, leaves à resynchroniser, chemins relatifs
+        des leaves disparus).
+        """
+        scopes = set()
+        for path in touched:
+            if path == self.base:
+                scopes.update(self.base / key for key in self.sections)
+            elif self.base in path.parents and path.relative_to(self.base).parts[0] in self.sections:
+                scopes.add(path)
+
+        sections, dirty, removed = set(), set(), set()
+        for scope in sorted(scopes, key=lambda p: len(p.parts)):
+            key = scope.relative_to(self.base).parts[0]
+            leaves = self.sections[key]
+            section_root = self.base / key
+            if any(parent in leaves for parent in scope.parents
+                   if parent == section_root or section_root in parent.parents):
+                continue  # sous-dossier d'un leaf : ignoré, comme find_leaf_dirs_with_images
+            old = {leaf for leaf in leaves if leaf == scope or scope in leaf.parents}
+            new = set(find_leaf_dirs_with_images(scope)) if scope.is_dir() else set()
+            leaves -= old
+            leaves |= new
+            sections.add(key)
+            dirty |= new
+            removed |= {leaf.relative_to(self.base).as_posix() for leaf in old - new}
+        dirty = {leaf for leaf in dirty if leaf in self.sections[leaf.relative_to(self.base).parts[0]]}
+        return sections, dirty, removed
+
+    def leaves(self, key) -> list:
+        return sorted(self.sections[key])
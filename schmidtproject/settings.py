@@ -90,13 +90,31 @@ WSGI_APPLICATION = 'schmidtproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# WAL : les lectures ne bloquent plus l'écrivain (ni l'inverse) ;
+# timeout : attente du verrou d'écriture (s) avant "database is locked" ;
+# IMMEDIATE : verrou pris dès BEGIN, l'attente (timeout) s'applique toujours.
+SQLITE_OPTIONS = {
+    "timeout": 20,
+    "transaction_mode": "IMMEDIATE",
+    "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;",
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+        "OPTIONS": SQLITE_OPTIONS,
+    },
+    # Statistiques (UsageSession, ClickEvent) : base séparée, voir schmidt_app/routers.py
+    "analytics": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "analytics.sqlite3",
+        "OPTIONS": SQLITE_OPTIONS,
+    },
 }
 
+DATABASE_ROUTERS = ["schmidt_app.routers.AnalyticsRouter"]
+
 
 
 # Password validation
@@ -137,6 +155,14 @@ MEDIA_URL  = '/media/'
 STATICFILES_DIRS = [ BASE_DIR / 'schmidt_app' / 'static' ]
 STATIC_ROOT = '/var/www/schmidt_app/static'
 MEDIA_ROOT  = '/var/www/schmidt_app/media'
+# Stockage des images par hash SHA-256 (schmidt_app/blobs.py) : déduplication
+# des fichiers identiques ; `manage.py dedupe_media` convertit l'existant.
+MEDIA_CONTENT_ADDRESSED = False
+# Compteurs de clics écrits en différé par lots (schmidt_app/counters.py) ;
+# 0 = écriture immédiate à chaque clic.
+COUNTERS_FLUSH_INTERVAL = 2.0
+# Segments des clics archivés par archive_events (schmidt_app/archive.py)
+ANALYTICS_ARCHIVE_DIR = BASE_DIR / "archives" / "events"
 
 
 # Default primary key field type